@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+asgi.py
+-------
+Optionele async servermodus voor lange downloads:
+
+  uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2 --no-proxy-headers
+
+Onder gunicorn (--workers=2 --threads=8) houdt elke lopende /zip een
+worker-thread plus een eigen prefetch-pool bezet, zo lang als de download duurt.
+Zestien trage ontvangers van een multi-GB zip en de site reageert voor niemand
+meer. In deze modus kost een lopende zip een coroutine en wat buffers.
+
+Alle routes blijven gewoon in de Flask-app en draaien via a2wsgi in een
+threadpool (ASGI_WSGI_THREADS). Dat geldt ook voor /zip: de view doet alle
+controles (tenant, pakketwachtwoord, ids/prefix, download-log) en zet de
+headers. Ziet hij de hand-off in de ASGI-scope (HANDOFF_EXTENSION), dan geeft
+hij alleen de bestandenlijst terug en streamt deze module de zip asynchroon
+(AsyncZipPipeline). De thread is dan meteen weer vrij. HTTP-latency,
+in-flight en trace van die request lopen net als onder gunicorn tot de
+laatste byte (app._when_sent).
+
+/file en /p houden geen thread vast: /file is een 302 naar een presigned URL
+(de bytes gaan direct van B2 naar de browser) en /p rendert een pagina. Die
+hoeven dus niet async.
+
+S3 zonder tweede SDK: aiobotocore vereist een nieuwere botocore dan de boto3-pin
+in requirements.txt. We presignen daarom GET's met de bestaande boto3-client
+(lokaal, maar ~1 ms CPU per URL, dus in de default-executor) en halen ze op met
+aiohttp: één ClientSession per worker. Dezelfde credentials en endpoint als
+de rest van de app; de calls tellen mee in s3_stats() als GetObject.
+
+Environment variabelen (allemaal optioneel):
+  ASGI_WSGI_THREADS    Threads voor de Flask-routes. Default: 8 (= --threads).
+  ASGI_S3_CONNECTIONS  Max. gelijktijdige S3-GET's per worker. Default: 100.
+                       Wie erop wacht, wacht zonder timeout: een slot komt vrij
+                       zodra een andere zip een bestand af heeft.
+  S3_CONNECT_TIMEOUT, S3_READ_TIMEOUT, S3_MAX_ATTEMPTS  zoals in s3_client.py.
+  ZIP_PREFETCH_WORKERS, ZIP_PREFETCH_QUEUE, ZIP_SMALL_FILE_BYTES,
+  ZIP_VERIFY_CHECKSUMS  zoals bij de sync-pipeline (zie app.py).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+
+import aiohttp
+from a2wsgi import WSGIMiddleware
+
+import s3_client
+from app import (
+    PRESIGN_GET_TTL, S3_BUCKET, ZIP_BYTES, ZIP_PREFETCH_QUEUE, ZIP_PREFETCH_WORKERS, ZIP_SMALL_FILE_BYTES,
+    ZIP_STREAMS, ZIP_VERIFY_CHECKSUMS, app as flask_app, log, s3,
+)
+from zip_pipeline import HANDOFF_EXTENSION, AsyncZipPipeline
+
+ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", "8"))
+ASGI_S3_CONNECTIONS = int(os.environ.get("ASGI_S3_CONNECTIONS", "100"))
+S3_MAX_ATTEMPTS = max(1, s3_client._env_int("S3_MAX_ATTEMPTS", 5))
+
+wsgi = WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS)
+
+# Headers van de hand-off-response die niet bij een foutmelding horen.
+_ZIP_ONLY_HEADERS = (b"content-length", b"content-type", b"content-disposition", b"x-filename")
+
+
+# ---------------- S3 via presigned GET's ----------------
+
+_session: aiohttp.ClientSession | None = None
+# Begrenzing van het aantal open GET's per worker. Niet via de connector-limit:
+# aiohttp telt het wachten op een vrije connectie mee in de connect-timeout,
+# en een grote body houdt zijn connectie vast zo lang als de download duurt.
+# Bij veel gelijktijdige zips zou een open() dan na S3_CONNECT_TIMEOUT
+# mislukken terwijl S3 niets mankeert.
+_s3_slots = asyncio.Semaphore(ASGI_S3_CONNECTIONS)
+
+
+def _http_session() -> aiohttp.ClientSession:
+    """Eén sessie (connection-pool) per worker, aangemaakt in de event loop."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0),  # begrensd via _s3_slots
+            timeout=aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=s3_client._env_float("S3_CONNECT_TIMEOUT", 5),
+                sock_read=s3_client._env_float("S3_READ_TIMEOUT", 60),
+            ),
+            auto_decompress=False,
+        )
+    return _session
+
+
+class _HTTPBody:
+    """aiohttp-response met de body-interface van AsyncZipPipeline."""
+
+    def __init__(self, resp: aiohttp.ClientResponse):
+        self.resp = resp
+        self.closed = False
+
+    async def read(self) -> bytes:
+        return await self.resp.read()
+
+    def iter_chunks(self, chunk_size: int):
+        return self.resp.content.iter_chunked(chunk_size)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.resp.release()
+            _s3_slots.release()
+
+
+class PresignedObjectSource:
+    """Objecten uit een S3-bucket: presigned URL via boto3, GET via aiohttp."""
+
+    def __init__(self, session: aiohttp.ClientSession, client, bucket: str):
+        self.session = session
+        self.client = client
+        self.bucket = bucket
+
+    def _presign(self, key: str) -> str:
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=PRESIGN_GET_TTL, HttpMethod="GET",
+        )
+
+    async def open(self, key: str):
+        url = await asyncio.to_thread(self._presign, key)
+        await _s3_slots.acquire()  # vrijgegeven door _HTTPBody.close()
+        try:
+            return await self._get(key, url)
+        except BaseException:
+            _s3_slots.release()
+            raise
+
+    async def _get(self, key: str, url: str):
+        error, retries = None, 0
+        t0 = time.perf_counter()
+        for attempt in range(1, S3_MAX_ATTEMPTS + 1):
+            retries = attempt - 1
+            try:
+                resp = await self.session.get(url)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = type(e).__name__
+            else:
+                if resp.status == 200:
+                    s3_client._record("GetObject", time.perf_counter() - t0, retries, None)
+                    return resp.content_length, _HTTPBody(resp)
+                error = {403: "AccessDenied", 404: "NoSuchKey"}.get(resp.status, str(resp.status))
+                resp.release()
+                if resp.status < 500 and resp.status != 429:
+                    break  # 403/404: opnieuw proberen helpt niet
+            if attempt < S3_MAX_ATTEMPTS:
+                await asyncio.sleep(min(2.0, 0.1 * 2 ** attempt))
+        s3_client._record("GetObject", time.perf_counter() - t0, retries, error)
+        raise IOError(f"GET {key} mislukt: {error}")
+
+
+# ---------------- /zip ----------------
+
+async def _until_disconnect(receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _stream_zip(scope, receive, send, start: dict, handoff: dict) -> None:
+    status = start["status"]
+    try:
+        status = await _send_zip(scope, receive, send, start, handoff["entries"])
+    finally:
+        # De Flask-response was al dicht vóór de eerste zip-byte. HTTP-latency,
+        # in-flight en de trace van deze request (app._when_sent) pas nu afsluiten.
+        for fn in handoff.get("on_sent", ()):
+            try:
+                fn(status)
+            except Exception:
+                log.exception("zip hand-off: on_sent failed")
+
+
+async def _send_zip(scope, receive, send, start: dict, entries) -> int:
+    """Stuur de zip (of bij HEAD alleen de headers). Geeft de verstuurde status."""
+    headers = [(k, v) for k, v in start["headers"] if k != b"content-length"]
+    if scope["method"] == "HEAD":
+        await send({**start, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
+        return start["status"]
+
+    if not s3.loaded:
+        await asyncio.to_thread(s3.warm)  # boto3 laden niet op de event loop
+    chunks = aiter(AsyncZipPipeline(
+        PresignedObjectSource(_http_session(), s3, S3_BUCKET),
+        entries,
+        prefetch_workers=ZIP_PREFETCH_WORKERS,
+        prefetch_queue=ZIP_PREFETCH_QUEUE,
+        small_file_bytes=ZIP_SMALL_FILE_BYTES,
+        chunk_bytes=256 * 1024,
+        verify_crc=ZIP_VERIFY_CHECKSUMS,
+    ))
+    sent, outcome = 0, "error"
+    try:
+        # Zoals in de sync-route: een fout op het eerste bestand (NoSuchKey,
+        # CRC) geeft nog een nette 500. Latere fouten breken de stream af.
+        try:
+            first = await anext(chunks, b"")
+        except Exception as e:
+            log.exception("stream_zip failed")
+            body = f"ZIP generatie mislukte. Err: {e}".encode()
+            await send({"type": "http.response.start", "status": 500, "headers": [
+                *((k, v) for k, v in start["headers"] if k not in _ZIP_ONLY_HEADERS),
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-error", b"zipstream_failed"),
+            ]})
+            await send({"type": "http.response.body", "body": body})
+            return 500
+
+        async def pump():
+            nonlocal sent
+            await send({**start, "headers": headers})
+            chunk = first
+            while chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                sent += len(chunk)
+                chunk = await anext(chunks, b"")
+            await send({"type": "http.response.body", "body": b""})
+
+        # De server meldt een weggevallen client alleen via receive(); send()
+        # gaat dan stil door. Zonder deze wacht zou de pipeline doorlopen.
+        streaming = asyncio.ensure_future(pump())
+        gone = asyncio.ensure_future(_until_disconnect(receive))
+        try:
+            await asyncio.wait((streaming, gone), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            gone.cancel()
+            if not streaming.done():
+                streaming.cancel()
+                outcome = "aborted"  # ontvanger haakte af
+                await asyncio.wait((streaming,))  # pas daarna mag aclose()
+        if outcome != "aborted":
+            streaming.result()  # fout midden in de stream: afbreken via de server
+            outcome = "ok"
+        return start["status"]
+    finally:
+        await chunks.aclose()  # stopt lopende fetches, sluit S3-bodies
+        ZIP_BYTES.inc(sent)
+        ZIP_STREAMS.inc(outcome=outcome)
+
+
+# ---------------- ASGI-app ----------------
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if _session is not None:
+                await _session.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send) -> None:
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http" or not scope["path"].startswith("/zip/"):
+        await wsgi(scope, receive, send)
+        return
+
+    # De /zip-view vult handoff["entries"] als hij het streamen overlaat
+    # (alleen bij een 200). Zijn (lege) WSGI-body negeren we dan en in plaats
+    # daarvan streamen we de zip, nog binnen de send-keten van a2wsgi; de
+    # WSGI-thread is op dat moment al klaar.
+    handoff: dict = {}
+    scope["extensions"] = {**(scope.get("extensions") or {}), HANDOFF_EXTENSION: handoff}
+    start = None
+
+    async def send_or_stream(message):
+        nonlocal start
+        if "entries" not in handoff:
+            await send(message)
+        elif message["type"] == "http.response.start":
+            start = message
+        elif not message.get("more_body"):
+            await _stream_zip(scope, receive, send, start, handoff)
+
+    await wsgi(scope, receive, send_or_stream)
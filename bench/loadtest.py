@@ -0,0 +1,590 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bench/loadtest.py
+-----------------
+Reproduceerbare load-test voor de kern-endpoints. Start de app onder
+gunicorn (dezelfde vorm als render.yaml) tegen een lokale S3-stand-in en een
+tijdelijke SQLite-database. Vult die via de gewone upload-API met een
+synthetische dataset en belast daarna per scenario met N gelijktijdige
+clients.
+
+  # Alles lokaal (vereist: pip install "moto[server]")
+  python3 bench/loadtest.py run --out base.json
+
+  # Na je wijziging, met dezelfde parameters
+  python3 bench/loadtest.py run --out new.json
+
+  # Verschillen tonen; exit 1 bij een regressie boven --threshold (%)
+  python3 bench/loadtest.py compare base.json new.json --threshold 10
+
+  # Eigen S3-stand-in (MinIO e.d.) in plaats van een moto-subproces
+  python3 bench/loadtest.py run --s3-endpoint http://127.0.0.1:9000 --bucket bench
+
+Scenario's (--scenarios, komma-gescheiden):
+  page     GET /p/<token>
+  file     GET /file/<token>/<id>          (de 302 naar S3 wordt niet gevolgd)
+  zip      GET /zip/<token>                (hele body gelezen)
+  uploads  GET /uploads                    (ingelogd)
+  put      /put-init -> PUT naar S3 -> /put-complete
+  mpu      /mpu-init -> per part /mpu-sign + PUT -> /mpu-complete
+
+Per scenario rapporteren we requests/s, MB/s, latency (p50/p95/p99/max,
+tot en met de laatste byte), TTFB (tot de response-headers) en de piek-RSS
+van gunicorn (master plus workers, uit /proc; alleen op Linux). Bij put/mpu
+telt één volledige upload-flow als één "request".
+
+De dataset is deterministisch (--seed). Runs met dezelfde parameters zijn
+dus vergelijkbaar. Draai base en new wel op dezelfde machine.
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+SCENARIOS = ("page", "file", "zip", "uploads", "put", "mpu")
+HOST = "localhost"
+EMAIL = "bench@example.com"
+PASSWORD = "bench-password-123"
+
+
+# ---------------- Hulpjes ----------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_http(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return
+        except urllib.error.HTTPError:
+            return  # server antwoordt
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} kwam niet op binnen {timeout:.0f}s")
+            time.sleep(0.2)
+
+
+def _percentile(sorted_vals: list, p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = max(0, min(len(sorted_vals) - 1, int(round(p / 100.0 * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[k]
+
+
+def _summary_ms(vals: list) -> dict:
+    s = sorted(vals)
+    return {
+        "p50": round(_percentile(s, 50) * 1000, 2),
+        "p95": round(_percentile(s, 95) * 1000, 2),
+        "p99": round(_percentile(s, 99) * 1000, 2),
+        "max": round((s[-1] if s else 0.0) * 1000, 2),
+        "mean": round((sum(s) / len(s) if s else 0.0) * 1000, 2),
+    }
+
+
+def _tree_rss_bytes(root_pid: int) -> int:
+    """Som van VmRSS van root_pid en zijn directe kinderen (gunicorn-workers)."""
+    pids = [root_pid]
+    try:
+        for name in os.listdir("/proc"):
+            if not name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{name}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            if ppid == root_pid:
+                pids.append(int(name))
+    except OSError:
+        return 0
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            pass
+    return total
+
+
+class _RssSampler:
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = _tree_rss_bytes(self.pid)
+
+        def loop():
+            while not self._stop.wait(self.interval):
+                self.peak = max(self.peak, _tree_rss_bytes(self.pid))
+
+        self._thread = threading.Thread(target=loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _tree_rss_bytes(self.pid))
+        return False
+
+
+# ---------------- HTTP-client ----------------
+
+class Client:
+    """
+    Eén keep-alive verbinding met de app, met eigen cookie-afhandeling. De
+    session-cookie is Secure en we praten plain HTTP met gunicorn; de app ziet
+    via X-Forwarded-Proto (ProxyFix) toch https.
+    """
+
+    def __init__(self, port: int):
+        self.port = port
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        self.cookies: dict = {}
+        self.csrf = ""
+
+    def request(self, method: str, path: str, body=None, headers=None, read: bool = True):
+        """-> (status, headers, body, ttfb_s, total_s, nbytes)"""
+        hdrs = {"Host": HOST, "X-Forwarded-Proto": "https", "X-Forwarded-For": "127.0.0.1"}
+        if self.cookies:
+            hdrs["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            hdrs["Content-Type"] = "application/json"
+        if method != "GET" and self.csrf:
+            hdrs["X-CSRF-Token"] = self.csrf
+        hdrs.update(headers or {})
+        t0 = time.perf_counter()
+        for attempt in (0, 1):
+            try:
+                self.conn.request(method, path, body=body, headers=hdrs)
+                resp = self.conn.getresponse()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # Keep-alive verbinding door gunicorn gesloten: één keer opnieuw.
+                self.conn.close()
+                if attempt:
+                    raise
+        ttfb = time.perf_counter() - t0
+        nbytes = 0
+        data = b""
+        if read:
+            chunks = []
+            while True:
+                chunk = resp.read(1024 * 1024)
+                if not chunk:
+                    break
+                nbytes += len(chunk)
+                if len(chunks) < 4:       # alleen het begin bewaren (JSON/HTML)
+                    chunks.append(chunk)
+            data = b"".join(chunks)
+        total = time.perf_counter() - t0
+        for k, v in resp.getheaders():
+            if k.lower() == "set-cookie":
+                name, _, rest = v.partition("=")
+                self.cookies[name.strip()] = rest.split(";", 1)[0]
+        return resp.status, resp, data, ttfb, total, nbytes
+
+    def json(self, method: str, path: str, body=None) -> dict:
+        status, _, data, *_ = self.request(method, path, body)
+        out = json.loads(data or b"{}")
+        if status != 200 or not out.get("ok", True):
+            raise RuntimeError(f"{method} {path} -> {status}: {out}")
+        return out
+
+    def login(self) -> None:
+        _, _, html, *_ = self.request("GET", "/login")
+        m = re.search(rb'name="_csrf" value="([^"]+)"', html)
+        if not m:
+            raise RuntimeError("geen CSRF-token op /login")
+        self.csrf = m.group(1).decode()
+        form = urllib.parse.urlencode({"email": EMAIL, "password": PASSWORD, "_csrf": self.csrf}).encode()
+        status, *_ = self.request("POST", "/login", form,
+                                  {"Content-Type": "application/x-www-form-urlencoded"})
+        if status not in (302, 303):
+            raise RuntimeError(f"login mislukt (status {status})")
+        # Login begint een nieuwe session (session.clear()): nieuw CSRF-token.
+        _, _, html, *_ = self.request("GET", "/")
+        m = re.search(rb'name="csrf-token" content="([^"]+)"', html)
+        if not m:
+            raise RuntimeError("geen CSRF-token na login")
+        self.csrf = m.group(1).decode()
+
+    def close(self):
+        self.conn.close()
+
+
+def _s3_put(url: str, data: bytes, headers: dict | None = None) -> str:
+    # put-init tekent ContentType mee (default application/octet-stream).
+    req = urllib.request.Request(url, data=data, method="PUT",
+                                 headers={"Content-Type": "application/octet-stream", **(headers or {})})
+    with urllib.request.urlopen(req, timeout=120) as r:
+        return (r.headers.get("ETag") or "").strip('"')
+
+
+# ---------------- Omgeving ----------------
+
+class Environment:
+    """Tijdelijke DATA_DIR, S3-stand-in en gunicorn; opruimen via close()."""
+
+    def __init__(self, args):
+        self.args = args
+        self.tmp = Path(tempfile.mkdtemp(prefix="mt-bench-"))
+        self.procs: list = []
+        self.s3_endpoint = args.s3_endpoint
+        self.port = _free_port()
+        self.gunicorn = None
+
+    def start(self):
+        from werkzeug.security import generate_password_hash
+
+        if not self.s3_endpoint:
+            if not shutil.which("moto_server"):
+                raise SystemExit('🚫 moto_server niet gevonden: pip install "moto[server]" of geef --s3-endpoint.')
+            port = _free_port()
+            self.procs.append(subprocess.Popen(["moto_server", "-p", str(port)],
+                                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            self.s3_endpoint = f"http://127.0.0.1:{port}"
+            _wait_http(self.s3_endpoint)
+        import boto3
+        s3 = boto3.client("s3", endpoint_url=self.s3_endpoint, region_name="us-east-1",
+                          aws_access_key_id=self.args.s3_key, aws_secret_access_key=self.args.s3_secret)
+        try:
+            s3.create_bucket(Bucket=self.args.bucket)
+        except s3.exceptions.BucketAlreadyOwnedByYou:
+            pass
+
+        env = {
+            **os.environ,
+            "SECRET_KEY": "bench", "DATA_DIR": str(self.tmp / "data"),
+            "CANONICAL_HOST": HOST, "AUTH_EMAIL": EMAIL,
+            "AUTH_PASSWORD_HASH": generate_password_hash(PASSWORD),
+            "S3_BUCKET": self.args.bucket, "S3_ENDPOINT_URL": self.s3_endpoint, "S3_REGION": "us-east-1",
+            "AWS_ACCESS_KEY_ID": self.args.s3_key, "AWS_SECRET_ACCESS_KEY": self.args.s3_secret,
+            "TASK_TOKEN": "bench", "METRICS_DIR": str(self.tmp / "metrics"),
+            "PKGVIEW_MAX_ATTEMPTS": "1000000", "LOGIN_MAX_ATTEMPTS": "1000000",
+            # Zoals bij een deploy (render.yaml): eerst migrate.py, de workers
+            # controleren alleen de schemaversie.
+            "SCHEMA_ON_START": "check",
+        }
+        subprocess.run([sys.executable, "migrate.py"], cwd=REPO_DIR, env={**env, "JOBS_ENABLED": "0"},
+                       check=True, stdout=subprocess.DEVNULL)
+        cmd = [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{self.port}",
+               f"--workers={self.args.workers}", f"--threads={self.args.threads}",
+               "--timeout=120", "--log-level=warning"]
+        log = open(self.tmp / "gunicorn.log", "wb")
+        self.gunicorn = subprocess.Popen(cmd, cwd=REPO_DIR, env=env, stdout=log, stderr=log)
+        self.procs.append(self.gunicorn)
+        _wait_http(f"http://127.0.0.1:{self.port}/health", timeout=60)
+
+    def close(self):
+        for p in reversed(self.procs):
+            if p.poll() is None:
+                p.send_signal(signal.SIGTERM)
+                try:
+                    p.wait(15)
+                except subprocess.TimeoutExpired:
+                    p.kill()
+        if self.args.keep:
+            print(f"ℹ️  Bewaard: {self.tmp}")
+        else:
+            shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+def seed(env: Environment, args) -> dict:
+    """Vult de app via de upload-API. Returnt {'packages': [(token, [item_ids])]}."""
+    rnd = random.Random(args.seed)
+    cl = Client(env.port)
+    cl.login()
+    packages = []
+    for p in range(args.packages):
+        tok = cl.json("POST", "/package-init", {"expiry_days": 30, "title": f"bench-{p}"})["token"]
+        for f in range(args.files):
+            size = max(1, int(rnd.lognormvariate(0, 1) * args.file_size))
+            init = cl.json("POST", "/put-init", {"token": tok, "filename": f"f{f:05d}.bin", "clientSize": size})
+            _s3_put(init["url"], rnd.randbytes(size), init.get("headers"))
+            cl.json("POST", "/put-complete", {"token": tok, "key": init["key"],
+                                              "name": f"f{f:05d}.bin", "path": f"map{f % 5}/f{f:05d}.bin"})
+        packages.append(tok)
+    c = sqlite3.connect(env.tmp / "data" / "files_multi.db")
+    try:
+        out = []
+        for tok in packages:
+            ids = [r[0] for r in c.execute("SELECT id FROM items WHERE token=? ORDER BY id", (tok,))]
+            out.append((tok, ids))
+    finally:
+        c.close()
+    cl.close()
+    return {"packages": out}
+
+
+# ---------------- Scenario's ----------------
+
+def _scenario_fn(name: str, dataset: dict, args, client: Client, rnd: random.Random):
+    pkgs = dataset["packages"]
+
+    if name == "page":
+        def run():
+            tok, _ = rnd.choice(pkgs)
+            return client.request("GET", f"/p/{tok}")
+    elif name == "file":
+        def run():
+            tok, ids = rnd.choice(pkgs)
+            return client.request("GET", f"/file/{tok}/{rnd.choice(ids)}")
+    elif name == "zip":
+        def run():
+            tok, _ = rnd.choice(pkgs)
+            return client.request("GET", f"/zip/{tok}")
+    elif name == "uploads":
+        def run():
+            return client.request("GET", "/uploads")
+    elif name == "put":
+        tok = client.json("POST", "/package-init", {"expiry_days": 1})["token"]
+        payload = rnd.randbytes(args.put_size)
+
+        def run():
+            t0 = time.perf_counter()
+            init = client.json("POST", "/put-init", {"token": tok, "filename": "put.bin",
+                                                    "clientSize": len(payload)})
+            ttfb = time.perf_counter() - t0
+            _s3_put(init["url"], payload, init.get("headers"))
+            status, resp, data, _, _, n = client.request(
+                "POST", "/put-complete", {"token": tok, "key": init["key"], "name": "put.bin"})
+            return status, resp, data, ttfb, time.perf_counter() - t0, len(payload)
+    elif name == "mpu":
+        tok = client.json("POST", "/package-init", {"expiry_days": 1})["token"]
+        parts_data = [rnd.randbytes(args.mpu_part_size) for _ in range(args.mpu_parts - 1)] + [b"x" * 1024]
+
+        def run():
+            t0 = time.perf_counter()
+            init = client.json("POST", "/mpu-init", {"token": tok, "filename": "mpu.bin"})
+            ttfb = time.perf_counter() - t0
+            parts = []
+            for i, data in enumerate(parts_data, start=1):
+                url = client.json("POST", "/mpu-sign", {"key": init["key"], "uploadId": init["uploadId"],
+                                                        "partNumber": i})["url"]
+                parts.append({"PartNumber": i, "ETag": _s3_put(url, data)})
+            status, resp, data, _, _, n = client.request(
+                "POST", "/mpu-complete", {"token": tok, "key": init["key"], "name": "mpu.bin",
+                                          "uploadId": init["uploadId"], "parts": parts})
+            return status, resp, data, ttfb, time.perf_counter() - t0, sum(map(len, parts_data))
+    else:
+        raise SystemExit(f"onbekend scenario: {name}")
+    return run
+
+
+def run_scenario(name: str, env: Environment, dataset: dict, args) -> dict:
+    lat, ttfb, errors, nbytes = [], [], [0], [0]
+    lock = threading.Lock()
+    deadline_box = [0.0]
+    ready = threading.Barrier(args.concurrency + 1)
+    ok_status = {"file": (302,)}.get(name, (200,))
+
+    def worker(i):
+        rnd = random.Random(args.seed * 1000 + i)
+        client = Client(env.port)
+        client.login()
+        fn = _scenario_fn(name, dataset, args, client, rnd)
+        my_lat, my_ttfb, my_err, my_bytes = [], [], 0, 0
+        ready.wait()
+        count = 0
+        while time.monotonic() < deadline_box[0] and (not args.requests or count < args.requests):
+            count += 1
+            try:
+                status, _, _, t_first, t_total, n = fn()
+            except Exception:
+                my_err += 1
+                continue
+            if status not in ok_status:
+                my_err += 1
+                continue
+            my_lat.append(t_total)
+            my_ttfb.append(t_first)
+            my_bytes += n
+        client.close()
+        with lock:
+            lat.extend(my_lat)
+            ttfb.extend(my_ttfb)
+            errors[0] += my_err
+            nbytes[0] += my_bytes
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    with _RssSampler(env.gunicorn.pid) as rss:
+        deadline_box[0] = time.monotonic() + args.duration
+        ready.wait()
+        t0 = time.monotonic()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - t0
+    return {
+        "requests": len(lat),
+        "errors": errors[0],
+        "rps": round(len(lat) / elapsed, 2) if elapsed else 0.0,
+        "mb_per_s": round(nbytes[0] / elapsed / 1e6, 2) if elapsed else 0.0,
+        "latency_ms": _summary_ms(lat),
+        "ttfb_ms": _summary_ms(ttfb),
+        "peak_rss_mb": round(rss.peak / 1e6, 1),
+    }
+
+
+def cmd_run(args) -> int:
+    names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    for n in names:
+        if n not in SCENARIOS:
+            raise SystemExit(f"onbekend scenario: {n} (kies uit {', '.join(SCENARIOS)})")
+    env = Environment(args)
+    try:
+        env.start()
+        print(f"⏳ Dataset: {args.packages} pakketten × {args.files} bestanden (~{args.file_size} B)…")
+        dataset = seed(env, args)
+        results = {}
+        for n in names:
+            print(f"▶️  {n}: {args.concurrency} clients, {args.duration:.0f}s…")
+            results[n] = r = run_scenario(n, env, dataset, args)
+            print(f"   {r['rps']:>8.1f} req/s  p50 {r['latency_ms']['p50']:.1f} ms  "
+                  f"p95 {r['latency_ms']['p95']:.1f} ms  p99 {r['latency_ms']['p99']:.1f} ms  "
+                  f"ttfb p95 {r['ttfb_ms']['p95']:.1f} ms  rss {r['peak_rss_mb']:.0f} MB  "
+                  f"fouten {r['errors']}")
+    finally:
+        env.close()
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                             capture_output=True, text=True).stdout.strip()
+    except OSError:
+        rev = ""
+    params = {k: v for k, v in vars(args).items() if k not in ("func", "out", "keep", "s3_secret")}
+    report = {"meta": {"git": rev, "at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                       "python": sys.version.split()[0], "params": params},
+              "scenarios": results}
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"✅ Resultaten: {args.out}")
+    return 0
+
+
+# ---------------- Vergelijken ----------------
+
+# (pad in het scenario-resultaat, label, hoger_is_beter)
+COMPARE_FIELDS = (
+    (("rps",), "req/s", True),
+    (("latency_ms", "p50"), "p50 ms", False),
+    (("latency_ms", "p95"), "p95 ms", False),
+    (("latency_ms", "p99"), "p99 ms", False),
+    (("ttfb_ms", "p95"), "ttfb p95", False),
+    (("peak_rss_mb",), "rss MB", False),
+)
+
+
+def cmd_compare(args) -> int:
+    base = json.loads(Path(args.base).read_text())
+    new = json.loads(Path(args.new).read_text())
+    if base["meta"].get("params") != new["meta"].get("params"):
+        print("⚠️  Let op: de runs gebruikten verschillende parameters.")
+    regressions = 0
+    print(f"{'scenario':<9} {'metric':<9} {'base':>10} {'new':>10} {'delta':>8}")
+    for name in sorted(set(base["scenarios"]) & set(new["scenarios"])):
+        for path, label, higher_better in COMPARE_FIELDS:
+            a, b = base["scenarios"][name], new["scenarios"][name]
+            for k in path:
+                a, b = a[k], b[k]
+            delta = (b - a) / a * 100 if a else 0.0
+            worse = -delta if higher_better else delta
+            flag = ""
+            if worse > args.threshold:
+                flag = "  ❌ regressie"
+                regressions += 1
+            elif worse < -args.threshold:
+                flag = "  ✅"
+            print(f"{name:<9} {label:<9} {a:>10.1f} {b:>10.1f} {delta:>+7.1f}%{flag}")
+        errs = new["scenarios"][name]["errors"]
+        if errs > base["scenarios"][name]["errors"]:
+            print(f"{name:<9} {'fouten':<9} {base['scenarios'][name]['errors']:>10} {errs:>10}           ❌ regressie")
+            regressions += 1
+    print(f"\n{regressions} regressie(s) boven {args.threshold:.0f}%.")
+    return 1 if regressions else 0
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(
+        description="Load-test en benchmark voor MiniTransfer.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("run", help="Start app + S3-stand-in, vul dataset, draai scenario's.")
+    r.add_argument("--scenarios", default=",".join(SCENARIOS))
+    r.add_argument("--concurrency", type=int, default=16, help="Gelijktijdige clients (default 16).")
+    r.add_argument("--duration", type=float, default=15.0, help="Seconden per scenario (default 15).")
+    r.add_argument("--requests", type=int, default=0, help="Max requests per client (0 = alleen duur).")
+    r.add_argument("--workers", type=int, default=2, help="gunicorn --workers (default 2, als render.yaml).")
+    r.add_argument("--threads", type=int, default=8, help="gunicorn --threads (default 8).")
+    r.add_argument("--packages", type=int, default=20, help="Pakketten in de dataset (default 20).")
+    r.add_argument("--files", type=int, default=25, help="Bestanden per pakket (default 25).")
+    r.add_argument("--file-size", type=int, default=64 * 1024,
+                   help="Mediane bestandsgrootte in bytes (log-normaal verdeeld, default 64 KiB).")
+    r.add_argument("--put-size", type=int, default=256 * 1024, help="Grootte per upload in 'put' (default 256 KiB).")
+    r.add_argument("--mpu-parts", type=int, default=2, help="Parts per upload in 'mpu' (default 2).")
+    r.add_argument("--mpu-part-size", type=int, default=5 * 1024 * 1024,
+                   help="Grootte van de niet-laatste parts (S3-minimum 5 MiB).")
+    r.add_argument("--seed", type=int, default=1)
+    r.add_argument("--s3-endpoint", default=None, help="Bestaande S3-stand-in i.p.v. moto_server.")
+    r.add_argument("--bucket", default="bench")
+    r.add_argument("--s3-key", default="bench")
+    r.add_argument("--s3-secret", default="bench-secret")
+    r.add_argument("--out", default=None, help="Schrijf resultaten als JSON.")
+    r.add_argument("--keep", action="store_true", help="Tijdelijke map (DB, logs) niet opruimen.")
+    r.set_defaults(func=cmd_run)
+
+    c = sub.add_parser("compare", help="Vergelijk twee JSON-resultaten.")
+    c.add_argument("base")
+    c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=10.0, help="Regressiedrempel in procent (default 10).")
+    c.set_defaults(func=cmd_compare)
+    return ap.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
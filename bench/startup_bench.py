@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bench/startup_bench.py
+----------------------
+Meet hoe snel een worker na een (her)start bruikbaar is. Relevant voor
+redeploys en autoscaling: zolang /health niet antwoordt, stuurt Render geen
+verkeer naar de instance.
+
+Twee metingen, elk --runs keer:
+  import   `python -X importtime -c "import app"` in een vers proces: de totale
+           importtijd van app.py plus de duurste imports (--top), en de
+           RSS van dat proces na de import
+  health   gunicorn starten (zelfde vorm als render.yaml) en /health elke paar
+           ms pollen: de tijd van het starten van het proces tot de eerste 200.
+           Daarna (na --settle s) de RSS per worker.
+
+  python3 bench/startup_bench.py
+  python3 bench/startup_bench.py --runs 10 --workers 2 --out startup.json
+  python3 bench/startup_bench.py --budget-ms 400    # exit 1 als de mediaan
+                                                    # van import erboven zit
+  python3 bench/startup_bench.py --blueprints downloads   # alleen de
+                                                    # download-blueprint (BLUEPRINTS)
+
+De database wordt vooraf gemigreerd met migrate.py, net als bij een deploy.
+Met --no-migrate start elke run op een lege DATA_DIR en migreert de worker
+zelf (SCHEMA_ON_START=migrate). S3 is niet nodig: de client wordt lazy
+gemaakt en /health raakt S3 niet.
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import re
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+HOST = "localhost"
+_IMPORT_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _env(data_dir: Path, migrate_on_start: bool, blueprints: str | None) -> dict:
+    from werkzeug.security import generate_password_hash
+
+    env = {
+        **os.environ,
+        "SECRET_KEY": "bench", "DATA_DIR": str(data_dir), "CANONICAL_HOST": HOST,
+        "AUTH_EMAIL": "bench@example.com", "AUTH_PASSWORD_HASH": generate_password_hash("bench-password-123"),
+        "S3_BUCKET": "bench", "S3_ENDPOINT_URL": "http://127.0.0.1:9", "S3_REGION": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "bench", "AWS_SECRET_ACCESS_KEY": "bench-secret",
+        "TASK_TOKEN": "bench", "METRICS_DIR": str(data_dir.parent / "metrics"),
+        "SCHEMA_ON_START": "migrate" if migrate_on_start else "check",
+    }
+    if blueprints is not None:
+        env["BLUEPRINTS"] = blueprints
+    return env
+
+
+def _rss_of(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _children(pid: int) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def _summary_mb(values: list) -> dict:
+    if not values:
+        return {"min": 0.0, "p50": 0.0, "max": 0.0}
+    mb = [v / 1e6 for v in values]
+    return {"min": round(min(mb), 1), "p50": round(statistics.median(mb), 1), "max": round(max(mb), 1)}
+
+
+def _summary_ms(values: list) -> dict:
+    if not values:
+        return {"min": 0.0, "p50": 0.0, "max": 0.0, "mean": 0.0}
+    ms = [v * 1000 for v in values]
+    return {"min": round(min(ms), 1), "p50": round(statistics.median(ms), 1),
+            "max": round(max(ms), 1), "mean": round(statistics.fmean(ms), 1)}
+
+
+# ---------------- Import ----------------
+
+# RSS na de import uit /proc (niet ru_maxrss: die erft op Linux de piek van
+# het ouderproces over de exec heen).
+_IMPORT_SNIPPET = ("import app\n"
+                   "print(next(int(l.split()[1]) for l in open('/proc/self/status') if l.startswith('VmRSS:')))")
+
+
+def measure_import(env: dict) -> tuple[float, list, int]:
+    """
+    Eén `import app` met -X importtime. Returnt (seconden, [(cumulatief_us, module)] direct onder app,
+    RSS na de import in bytes).
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _IMPORT_SNIPPET], cwd=REPO_DIR,
+                          env={**env, "JOBS_ENABLED": "0", "S3_WARMUP": "0"},
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"❌ import app mislukt:\n{proc.stderr[-2000:]}")
+    total, children = 0.0, []
+    for line in proc.stderr.splitlines():
+        m = _IMPORT_RE.match(line)
+        if not m:
+            continue
+        cumulative, indent, name = int(m.group(2)), len(m.group(3)), m.group(4)
+        if name == "app" and indent == 1:
+            total = cumulative / 1e6
+        elif indent == 3:
+            children.append((cumulative, name))
+    rss = int(proc.stdout.strip().splitlines()[-1]) * 1024  # VmRSS in KiB
+    return total, children, rss
+
+
+# ---------------- Health ----------------
+
+def _health_ok(port: int, path: str) -> bool:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+    try:
+        conn.request("GET", path, headers={"Host": HOST, "X-Forwarded-Proto": "https"})
+        resp = conn.getresponse()
+        resp.read()
+        return resp.status == 200
+    except OSError:
+        return False
+    finally:
+        conn.close()
+
+
+def measure_health(env: dict, args) -> tuple[float, list]:
+    """Returnt (seconden tot de eerste 200, [RSS per worker in bytes] na --settle)."""
+    port = _free_port()
+    cmd = [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{port}",
+           f"--workers={args.workers}", f"--threads={args.threads}", "--log-level=warning"]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        deadline = t0 + args.timeout
+        while time.perf_counter() < deadline:
+            if _health_ok(port, args.path):
+                elapsed = time.perf_counter() - t0
+                time.sleep(args.settle)
+                return elapsed, [r for r in map(_rss_of, _children(proc.pid)) if r]
+            if proc.poll() is not None:
+                raise SystemExit(f"❌ gunicorn stopte:\n{proc.stderr.read().decode(errors='replace')[-2000:]}")
+            time.sleep(args.poll_ms / 1000)
+        raise SystemExit(f"❌ geen 200 op {args.path} binnen {args.timeout:.0f}s")
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+# ---------------- Main ----------------
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(
+        description="Meet import- en opstarttijd (tot de eerste gezonde response) van een worker.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    ap.add_argument("--runs", type=int, default=5, help="Herhalingen per meting (default 5).")
+    ap.add_argument("--workers", type=int, default=2, help="gunicorn --workers (default 2, als render.yaml).")
+    ap.add_argument("--threads", type=int, default=8, help="gunicorn --threads (default 8).")
+    ap.add_argument("--path", default="/health", help="Health-pad (default /health).")
+    ap.add_argument("--poll-ms", type=float, default=5.0, help="Poll-interval in ms (default 5).")
+    ap.add_argument("--timeout", type=float, default=60.0, help="Max. seconden tot gezond (default 60).")
+    ap.add_argument("--top", type=int, default=15, help="Toon de N duurste imports (default 15).")
+    ap.add_argument("--settle", type=float, default=2.0,
+                    help="Seconden na de eerste 200 voordat de worker-RSS gemeten wordt (default 2).")
+    ap.add_argument("--blueprints", default=None,
+                    help="Zet BLUEPRINTS voor app en workers (bv. 'downloads'; default: env/alles).")
+    ap.add_argument("--budget-ms", type=float, default=None, help="Exit 1 als de mediaan van import erboven zit.")
+    ap.add_argument("--no-migrate", action="store_true", help="Niet vooraf migreren; lege DATA_DIR per run.")
+    ap.add_argument("--out", default=None, help="Schrijf resultaten als JSON.")
+    ap.add_argument("--keep", action="store_true", help="Tijdelijke map niet opruimen.")
+    return ap.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    tmp = Path(tempfile.mkdtemp(prefix="mt-startup-"))
+    try:
+        data_dir = tmp / "data"
+        env = _env(data_dir, migrate_on_start=args.no_migrate, blueprints=args.blueprints)
+        if not args.no_migrate:
+            subprocess.run([sys.executable, "migrate.py"], cwd=REPO_DIR, env={**env, "JOBS_ENABLED": "0"},
+                           check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        imports, import_rss, heavy = [], [], {}
+        for _ in range(args.runs):
+            total, children, rss = measure_import(env)
+            imports.append(total)
+            import_rss.append(rss)
+            for us, name in children:
+                heavy.setdefault(name, []).append(us / 1e6)
+        top = sorted(((statistics.median(v), n) for n, v in heavy.items()), reverse=True)[:args.top]
+
+        healthy, worker_rss = [], []
+        for i in range(args.runs):
+            if args.no_migrate:
+                shutil.rmtree(data_dir, ignore_errors=True)
+            seconds, rss = measure_health(env, args)
+            healthy.append(seconds)
+            worker_rss.extend(rss)
+    finally:
+        if args.keep:
+            print(f"ℹ️  Bewaard: {tmp}")
+        else:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    imp, hl = _summary_ms(imports), _summary_ms(healthy)
+    imp_rss, wrk_rss = _summary_mb(import_rss), _summary_mb(worker_rss)
+    print(f"import app       p50 {imp['p50']:>7.1f} ms   min {imp['min']:>7.1f}   max {imp['max']:>7.1f}")
+    print(f"eerste {args.path:<9} p50 {hl['p50']:>7.1f} ms   min {hl['min']:>7.1f}   max {hl['max']:>7.1f}")
+    print(f"RSS na import    p50 {imp_rss['p50']:>7.1f} MB   min {imp_rss['min']:>7.1f}   max {imp_rss['max']:>7.1f}")
+    print(f"RSS per worker   p50 {wrk_rss['p50']:>7.1f} MB   min {wrk_rss['min']:>7.1f}   max {wrk_rss['max']:>7.1f}")
+    print("\nDuurste imports (direct onder app, cumulatief, mediaan):")
+    for sec, name in top:
+        print(f"  {sec * 1000:>7.1f} ms  {name}")
+
+    if args.out:
+        try:
+            rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                 capture_output=True, text=True).stdout.strip()
+        except OSError:
+            rev = ""
+        params = {k: v for k, v in vars(args).items() if k not in ("out", "keep")}
+        report = {"meta": {"git": rev, "at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                           "python": sys.version.split()[0], "params": params},
+                  "import_ms": imp, "first_healthy_ms": hl,
+                  "import_rss_mb": imp_rss, "worker_rss_mb": wrk_rss,
+                  "top_imports_ms": {n: round(sec * 1000, 1) for sec, n in top}}
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"✅ Resultaten: {args.out}")
+
+    if args.budget_ms is not None and imp["p50"] > args.budget_ms:
+        print(f"❌ import app ({imp['p50']:.0f} ms) boven het budget van {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
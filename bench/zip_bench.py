@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bench/zip_bench.py
+------------------
+Benchmark van de /zip-pipeline (zip_pipeline.py) zonder S3 of Flask. Een
+synthetische objectbron levert de bestanden en simuleert de S3-latency per
+GET (--latency-ms, --jitter-ms) en optioneel een bandbreedte per stream
+(--bandwidth-mbps). Zo is het effect van de tunables
+ZIP_PREFETCH_WORKERS / ZIP_PREFETCH_QUEUE / ZIP_SMALL_FILE_BYTES te meten
+voor verschillende pakketvormen.
+
+--modes vergelijkt de threads-pipeline (sync, gunicorn) met AsyncZipPipeline
+(async, asgi.py). Met --streams lopen er N zips tegelijk, elk naar een trage
+ontvanger (--client-mbps): sync met een thread per stream zoals gunicorn, async
+als taken op één event loop. Daarbij telt vooral de piek van het aantal
+threads en de RSS.
+
+  # Standaard: alle datasets, workers 4/8/16, 20 ms latency
+  python3 bench/zip_bench.py
+
+  # Raster over meerdere waarden (komma-gescheiden; K/M/G-suffixen toegestaan)
+  python3 bench/zip_bench.py --datasets small --workers 4,8,16,32 \\
+      --queue 8,16,64 --small 1M,8M --latency-ms 5,20,50 --out zip.json
+
+  # Snelle rooktest: alle groottes × 0,01
+  python3 bench/zip_bench.py --scale 0.01
+
+  # 64 trage ontvangers (2 Mbit/s) van een medium-pakket, sync vs async
+  python3 bench/zip_bench.py --datasets medium --scale 0.05 --workers 8 \\
+      --modes sync,async --streams 64 --client-mbps 2
+
+Datasets (--datasets):
+  small    10.000 × 10 KB     (latency-gebonden: prefetch telt)
+  medium   100 × 100 MB       (mix van prefetch en streaming)
+  large    1 × 20 GB          (puur streaming; data wordt gegenereerd, niet in RAM)
+
+Elke combinatie draait in een eigen subproces. De piek-RSS (ru_maxrss) is
+daardoor per combinatie en wordt niet beïnvloed door eerdere runs. Per
+combinatie rapporteren we MB/s (zip-output, alle streams samen), TTFB (tot de
+eerste zip-byte), de totale duur, de piek-RSS (absoluut en de groei boven de
+basislijn na het importeren) en het piekaantal threads.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+DATASETS = {
+    "small": (10_000, 10 * 1000),
+    "medium": (100, 100 * 1000 * 1000),
+    "large": (1, 20 * 1000 * 1000 * 1000),
+}
+_BLOCK = 1024 * 1024
+
+
+def _parse_size(s: str) -> int:
+    s = s.strip().upper().removesuffix("B").removesuffix("I")
+    mult = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}.get(s[-1:], 1)
+    return int(float(s.rstrip("KMG")) * mult)
+
+
+def _csv(conv):
+    return lambda s: [conv(v) for v in s.split(",") if v.strip()]
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+# ---------------- Synthetische bron ----------------
+
+class _SyntheticBody:
+    """Body met read()/iter_chunks() als botocore's StreamingBody; inhoud is een herhaald blok."""
+
+    def __init__(self, size: int, block: bytes, bandwidth: float):
+        self.size = size
+        self.block = block
+        self.bandwidth = bandwidth  # bytes/s per stream, 0 = onbeperkt
+
+    def _throttle(self, n: int) -> None:
+        if self.bandwidth:
+            time.sleep(n / self.bandwidth)
+
+    def read(self) -> bytes:
+        self._throttle(self.size)
+        reps, rest = divmod(self.size, len(self.block))
+        return self.block * reps + self.block[:rest]
+
+    def iter_chunks(self, chunk_size: int = _BLOCK):
+        left = self.size
+        chunk = self.block[:chunk_size] if chunk_size <= len(self.block) else self.block
+        while left > 0:
+            out = chunk if left >= len(chunk) else chunk[:left]
+            self._throttle(len(out))
+            left -= len(out)
+            yield out
+
+    def close(self) -> None:
+        pass
+
+
+class SyntheticSource:
+    """Objectbron met gesimuleerde latency per open() (= S3 GetObject tot de headers)."""
+
+    def __init__(self, sizes: dict, latency: float = 0.0, jitter: float = 0.0,
+                 bandwidth: float = 0.0, seed: int = 1):
+        self.sizes = sizes
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.block = random.Random(seed).randbytes(_BLOCK)
+        self._rnd = random.Random(seed)
+
+    def open(self, key: str):
+        delay = self.latency + (self._rnd.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        size = self.sizes[key]
+        return size, _SyntheticBody(size, self.block, self.bandwidth)
+
+
+class _AsyncSyntheticBody(_SyntheticBody):
+    """Als _SyntheticBody, maar met de async body-interface van AsyncZipPipeline."""
+
+    async def read(self) -> bytes:
+        if self.bandwidth:
+            await asyncio.sleep(self.size / self.bandwidth)
+        reps, rest = divmod(self.size, len(self.block))
+        return self.block * reps + self.block[:rest]
+
+    async def iter_chunks(self, chunk_size: int = _BLOCK):
+        left = self.size
+        chunk = self.block[:chunk_size] if chunk_size <= len(self.block) else self.block
+        while left > 0:
+            out = chunk if left >= len(chunk) else chunk[:left]
+            # Ook zonder bandbreedtelimiet even de loop vrijgeven, zoals een socket.
+            await asyncio.sleep(len(out) / self.bandwidth if self.bandwidth else 0)
+            left -= len(out)
+            yield out
+
+
+class AsyncSyntheticSource(SyntheticSource):
+    async def open(self, key: str):
+        delay = self.latency + (self._rnd.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        size = self.sizes[key]
+        return size, _AsyncSyntheticBody(size, self.block, self.bandwidth)
+
+
+# ---------------- Eén combinatie (subproces) ----------------
+
+def run_one(params: dict) -> dict:
+    sys.path.insert(0, str(REPO_DIR))
+    from zip_pipeline import AsyncZipPipeline, ZipEntry, ZipPipeline
+
+    count, size = params["count"], params["size"]
+    sizes = {f"obj/{i:06d}": size for i in range(count)}
+    is_async = params["mode"] == "async"
+    source = (AsyncSyntheticSource if is_async else SyntheticSource)(
+        sizes, latency=params["latency_ms"] / 1000, jitter=params["jitter_ms"] / 1000,
+        bandwidth=params["bandwidth_mbps"] * 1e6 / 8, seed=params["seed"])
+    entries = [ZipEntry(f"map/bestand-{i:06d}.bin", key, size=sizes[key]) for i, key in enumerate(sizes)]
+    opts = dict(prefetch_workers=params["workers"], prefetch_queue=params["queue"],
+                small_file_bytes=params["small"], verify_crc=False)
+    client_bw = params["client_mbps"] * 1e6 / 8  # bytes/s per ontvanger, 0 = onbeperkt
+
+    lock = threading.Lock()
+    state = {"out": 0, "ttfb": None, "threads": threading.active_count()}
+    done = threading.Event()
+
+    def sample_threads():
+        while not done.wait(0.05):
+            state["threads"] = max(state["threads"], threading.active_count() - 1)  # zonder deze thread
+    threading.Thread(target=sample_threads, daemon=True).start()
+
+    def got(n: int) -> None:
+        with lock:
+            if state["ttfb"] is None:
+                state["ttfb"] = time.perf_counter() - t0
+            state["out"] += n
+
+    def consume():
+        for chunk in ZipPipeline(source, entries, **opts):
+            got(len(chunk))
+            if client_bw:
+                time.sleep(len(chunk) / client_bw)
+
+    async def consume_async():
+        async for chunk in AsyncZipPipeline(source, entries, **opts):
+            got(len(chunk))
+            await asyncio.sleep(len(chunk) / client_bw if client_bw else 0)
+
+    async def consume_all():
+        await asyncio.gather(*(consume_async() for _ in range(params["streams"])))
+
+    base_rss = _rss_bytes()
+    t0 = time.perf_counter()
+    if is_async:
+        asyncio.run(consume_all())
+    else:
+        # Eén thread per stream, zoals een gunicorn-thread per request.
+        threads = [threading.Thread(target=consume) for _ in range(params["streams"])]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    elapsed = time.perf_counter() - t0
+    done.set()
+    out = state["out"]
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Linux: KiB
+    return {
+        "zip_bytes": out,
+        "seconds": round(elapsed, 3),
+        "mb_per_s": round(out / elapsed / 1e6, 1) if elapsed else 0.0,
+        "ttfb_ms": round((state["ttfb"] or 0.0) * 1000, 1),
+        "peak_rss_mb": round(peak / 1e6, 1),
+        "rss_growth_mb": round(max(0, peak - base_rss) / 1e6, 1),
+        "peak_threads": state["threads"],
+    }
+
+
+# ---------------- Raster ----------------
+
+def cmd_grid(args) -> int:
+    names = [n.strip() for n in args.datasets.split(",") if n.strip()]
+    for n in names:
+        if n not in DATASETS:
+            raise SystemExit(f"onbekende dataset: {n} (kies uit {', '.join(DATASETS)})")
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    for m in modes:
+        if m not in ("sync", "async"):
+            raise SystemExit(f"onbekende modus: {m} (kies uit sync, async)")
+
+    results = []
+    print(f"{'dataset':<8} {'modus':<5} {'streams':>7} {'workers':>7} {'queue':>5} {'small':>7} {'lat ms':>6} "
+          f"{'MB/s':>8} {'ttfb ms':>8} {'duur s':>8} {'rss MB':>7} {'+rss MB':>7} {'threads':>7}")
+    for name in names:
+        count, size = DATASETS[name]
+        size = max(1, int(size * args.scale))
+        for mode, workers, queue, small, latency in itertools.product(modes, args.workers, args.queue,
+                                                                      args.small, args.latency_ms):
+            params = {"dataset": name, "mode": mode, "streams": args.streams, "count": count, "size": size,
+                      "workers": workers, "queue": queue, "small": small, "latency_ms": latency,
+                      "jitter_ms": args.jitter_ms, "bandwidth_mbps": args.bandwidth_mbps,
+                      "client_mbps": args.client_mbps, "seed": args.seed}
+            proc = subprocess.run([sys.executable, __file__, "_one", json.dumps(params)],
+                                  capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"{name:<8} {mode:<5} {args.streams:>7} {workers:>7} {queue:>5} {small:>7} {latency:>6g}  "
+                      f"❌ mislukt:\n{proc.stderr}")
+                continue
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append({"params": params, **r})
+            print(f"{name:<8} {mode:<5} {args.streams:>7} {workers:>7} {queue:>5} {small >> 10:>6}K {latency:>6g} "
+                  f"{r['mb_per_s']:>8.1f} {r['ttfb_ms']:>8.1f} {r['seconds']:>8.2f} "
+                  f"{r['peak_rss_mb']:>7.0f} {r['rss_growth_mb']:>7.0f} {r['peak_threads']:>7}")
+
+    if args.out:
+        try:
+            rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                 capture_output=True, text=True).stdout.strip()
+        except OSError:
+            rev = ""
+        report = {"meta": {"git": rev, "at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                           "python": sys.version.split()[0], "cpus": os.cpu_count()},
+                  "results": results}
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"✅ Resultaten: {args.out}")
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(
+        description="Benchmark van de /zip-pipeline met een synthetische objectbron.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    ap.add_argument("--datasets", default=",".join(DATASETS))
+    ap.add_argument("--scale", type=float, default=1.0, help="Factor op de bestandsgroottes (default 1).")
+    ap.add_argument("--workers", type=_csv(int), default=[4, 8, 16], help="ZIP_PREFETCH_WORKERS (default 4,8,16).")
+    ap.add_argument("--queue", type=_csv(int), default=[16], help="ZIP_PREFETCH_QUEUE (default 16).")
+    ap.add_argument("--small", type=_csv(_parse_size), default=[8 * 1024 * 1024],
+                    help="ZIP_SMALL_FILE_BYTES (default 8M).")
+    ap.add_argument("--latency-ms", type=_csv(float), default=[20.0], help="Latency per GET (default 20).")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="Extra willekeurige latency 0..N ms per GET.")
+    ap.add_argument("--bandwidth-mbps", type=float, default=0.0,
+                    help="Bandbreedte per stream in Mbit/s (default 0 = onbeperkt).")
+    ap.add_argument("--modes", default="sync", help="sync (threads) en/of async (asyncio), komma-gescheiden.")
+    ap.add_argument("--streams", type=int, default=1, help="Aantal zips tegelijk (default 1).")
+    ap.add_argument("--client-mbps", type=float, default=0.0,
+                    help="Leessnelheid per ontvanger in Mbit/s (default 0 = onbeperkt).")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default=None, help="Schrijf resultaten als JSON.")
+    return ap.parse_args()
+
+
+def main() -> None:
+    if len(sys.argv) == 3 and sys.argv[1] == "_one":
+        print(json.dumps(run_one(json.loads(sys.argv[2]))))
+        return
+    sys.exit(cmd_grid(parse_args()))
+
+
+if __name__ == "__main__":
+    main()
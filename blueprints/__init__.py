@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+blueprints
+----------
+De routes van MiniTransfer per onderdeel, als Flask-blueprints:
+
+  uploads    upload-API (/package-init, /put-*, /mpu-*, ...) en /uploads
+  downloads  /p/<token>, /file, /manifest, /tree, /zip en de oude alias-URL's
+  admin      /admin/users, /admin/queries
+  billing    /contact, /billing/store, /webhook/paypal
+  trial      /trial/signup, /trial/verify
+  arcade     /arcade en de leaderboard-API
+
+app.py houdt de kern: config, database en migraties, login, "/", health,
+/internal/*, /metrics, errorhandlers, de job-infrastructuur en de helpers die
+meerdere blueprints delen. De modules hier importeren die uit app; app.py
+registreert ze daarom pas onderaan, als alles gedefinieerd is.
+
+Welke blueprints een worker laadt, komt uit BLUEPRINTS (komma-gescheiden,
+default 'all'; 'none' = alleen de kern). Een uitgeschakelde blueprint wordt
+niet geïmporteerd: zijn code, templates en job-types kosten de worker dan
+niets. Zo draait bv. een aparte download-service met BLUEPRINTS=downloads.
+
+Links (url_for) naar een uitgeschakelde blueprint wijzen naar "/" in plaats
+van een BuildError te geven; zie _disabled_endpoint_handler().
+"""
+
+from __future__ import annotations
+
+import importlib
+import logging
+
+AVAILABLE = ("uploads", "downloads", "admin", "billing", "trial", "arcade")
+
+log = logging.getLogger("blueprints")
+
+
+def parse(value: str | None) -> list:
+    """BLUEPRINTS-waarde -> namen in vaste volgorde. Onbekende namen zijn een configfout."""
+    raw = (value or "all").strip().lower()
+    if raw in ("all", "*"):
+        return list(AVAILABLE)
+    if raw == "none":
+        return []
+    names = {n.strip() for n in raw.split(",") if n.strip()}
+    unknown = sorted(names - set(AVAILABLE))
+    if unknown:
+        raise RuntimeError(
+            f"❌ Onbekende blueprint(s) in BLUEPRINTS: {', '.join(unknown)} "
+            f"(kies uit {', '.join(AVAILABLE)}, 'all' of 'none')."
+        )
+    return [n for n in AVAILABLE if n in names]
+
+
+def _disabled_endpoint_handler(app):
+    warned = set()
+
+    def handler(error, endpoint, values):
+        name, dot, _ = endpoint.partition(".")
+        if not dot or name not in AVAILABLE or name in app.blueprints:
+            return None  # echte fout: Flask gooit de BuildError alsnog
+        if endpoint not in warned:
+            warned.add(endpoint)
+            log.warning("url_for(%r): blueprint '%s' staat uit (BLUEPRINTS), link wijst naar /", endpoint, name)
+        return "/"
+    return handler
+
+
+def register(app, names) -> None:
+    """Importeer en registreer de gegeven blueprints; de rest wordt niet geladen."""
+    for name in names:
+        module = importlib.import_module(f"{__name__}.{name}")
+        app.register_blueprint(module.bp)
+    app.url_build_error_handlers.append(_disabled_endpoint_handler(app))
+    log.info("Blueprints: %s", ", ".join(names) or "(alleen kern)")
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+blueprints/admin.py
+-------------------
+Gebruikersbeheer (/admin/users) en het query-rapport (/admin/queries).
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+
+from flask import Blueprint, abort, jsonify, redirect, request, url_for
+from werkzeug.security import generate_password_hash
+
+from queryprofile import SORT_KEYS as QUERY_SORT_KEYS
+from app import (
+    AUTH_EMAIL, BASE_CSS, BG_DIV, HTML_HEAD_ICON, QUERY_PROFILE, _flash, _invalidate_user, _pop_flash,
+    current_user, db, is_admin, logged_in, query_profile, render_template,
+)
+
+bp = Blueprint("admin", __name__)
+
+
+# ============================================================
+# ADMIN: User management
+# ============================================================
+EMAIL_SIMPLE_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+def _require_admin():
+    if not logged_in():
+        abort(401)
+    if not is_admin():
+        abort(403)
+
+@bp.get("/admin/queries")
+def admin_queries():
+    """
+    Query-profiler over alle workers (zie queryprofile.py), als JSON:
+      ?sort=total|count|avg|max|rows|slow   (default total)
+      ?limit=20                             (max 200)
+    Alleen voor de hoofd-admin (AUTH_EMAIL): statements zijn niet per tenant.
+    """
+    _require_admin()
+    if current_user()["email"].lower() != AUTH_EMAIL:
+        abort(403)
+    sort = request.args.get("sort", "total")
+    if sort not in QUERY_SORT_KEYS:
+        return jsonify(ok=False, error="invalid_sort"), 400
+    try:
+        limit = max(1, min(int(request.args.get("limit", "20")), 200))
+    except ValueError:
+        return jsonify(ok=False, error="invalid_limit"), 400
+    return jsonify(ok=True, enabled=QUERY_PROFILE, **query_profile.report(sort, limit))
+
+@bp.route("/admin/users")
+def admin_users():
+    _require_admin()
+    me = current_user()
+    # Root-admin (AUTH_EMAIL) ziet álle users en pending accounts over álle tenants.
+    # Dit voorkomt dat accounts die ooit op een andere tenant_id zijn beland
+    # (bv. via de trial-tenant) onzichtbaar blijven, terwijl de duplicaat-check
+    # in /admin/users/create wél globaal is en dus klaagt dat ze "bestaan".
+    is_root_admin = (me["email"].lower() == AUTH_EMAIL)
+    conn = db()
+    try:
+        if is_root_admin:
+            rows = conn.execute(
+                "SELECT id, email, is_admin, disabled, created_at, tenant_id "
+                "FROM users ORDER BY created_at ASC"
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT id, email, is_admin, disabled, created_at, tenant_id "
+                "FROM users WHERE tenant_id = ? ORDER BY created_at ASC",
+                (me["tenant_id"],)
+            ).fetchall()
+        # Toon pending accounts van laatste 30 dagen (afgehandeld en nog-open)
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
+        if is_root_admin:
+            pending_rows = conn.execute(
+                """SELECT id, email, company, plan_value, status, created_at,
+                          paypal_subscription_id, tenant_id
+                   FROM pending_accounts
+                   WHERE created_at >= ?
+                   ORDER BY created_at DESC
+                   LIMIT 100""",
+                (cutoff,)
+            ).fetchall()
+        else:
+            pending_rows = conn.execute(
+                """SELECT id, email, company, plan_value, status, created_at,
+                          paypal_subscription_id, tenant_id
+                   FROM pending_accounts
+                   WHERE tenant_id = ? AND created_at >= ?
+                   ORDER BY created_at DESC
+                   LIMIT 100""",
+                (me["tenant_id"], cutoff)
+            ).fetchall()
+    finally:
+        conn.close()
+    msg, err = _pop_flash()
+    return render_template(
+        "admin_users.html",
+        users=[dict(r) for r in rows],
+        pending_accounts=[dict(r) for r in pending_rows],
+        me=me["email"],
+        my_id=me["id"],
+        show_tenant_col=is_root_admin,
+        msg=msg, error=err,
+        base_css=BASE_CSS, bg=BG_DIV, head_icon=HTML_HEAD_ICON
+    )
+
+@bp.route("/admin/users/create", methods=["POST"])
+def admin_users_create():
+    _require_admin()
+    me = current_user()
+    email = (request.form.get("email") or "").strip().lower()
+    pw = (request.form.get("password") or "").strip()
+    mk_admin = (request.form.get("is_admin") == "1")
+
+    if not EMAIL_SIMPLE_RE.match(email):
+        _flash(error="Ongeldig e-mailadres.")
+        return redirect(url_for("admin.admin_users"))
+    if len(pw) < 10:
+        _flash(error="Wachtwoord moet minimaal 10 tekens zijn.")
+        return redirect(url_for("admin.admin_users"))
+
+    conn = db()
+    try:
+        # Consistent met admin_users(): root-admin checkt globaal, anderen
+        # binnen hun eigen tenant. Zo wordt geen account geblokkeerd door een
+        # onzichtbare collision in een andere tenant.
+        if me["email"].lower() == AUTH_EMAIL:
+            exists = conn.execute("SELECT 1 FROM users WHERE email = ?", (email,)).fetchone()
+        else:
+            exists = conn.execute(
+                "SELECT 1 FROM users WHERE email = ? AND tenant_id = ?",
+                (email, me["tenant_id"])
+            ).fetchone()
+        if exists:
+            _flash(error=f"Gebruiker {email} bestaat al.")
+            return redirect(url_for("admin.admin_users"))
+        conn.execute(
+            "INSERT INTO users(email, password_hash, is_admin, tenant_id, created_at, disabled) VALUES(?,?,?,?,?,0)",
+            (email, generate_password_hash(pw), 1 if mk_admin else 0, me["tenant_id"], datetime.now(timezone.utc).isoformat())
+        )
+        conn.commit()
+        _flash(msg=f"Gebruiker {email} aangemaakt.")
+    finally:
+        conn.close()
+    return redirect(url_for("admin.admin_users"))
+
+@bp.route("/admin/users/create-from-hash", methods=["POST"])
+def admin_users_create_from_hash():
+    """
+    Account aanmaken via een reeds gehashed wachtwoord. Bedoeld voor de flow
+    waarbij een klant op /contact zijn eigen wachtwoord invult: de server hasht
+    het meteen en mailt de hash naar de admin. De admin plakt hier de hash,
+    zonder ooit het plaintext wachtwoord te kennen.
+    """
+    _require_admin()
+    me = current_user()
+    email = (request.form.get("email") or "").strip().lower()
+    pw_hash = (request.form.get("password_hash") or "").strip()
+    mk_admin = (request.form.get("is_admin") == "1")
+
+    if not EMAIL_SIMPLE_RE.match(email):
+        _flash(error="Ongeldig e-mailadres.")
+        return redirect(url_for("admin.admin_users"))
+
+    # Basis-validatie op hash-format. Werkzeug-hashes beginnen met het scheme,
+    # bijv. 'pbkdf2:sha256:600000$salt$hexdigest' of 'scrypt:...'.
+    # We accepteren alles wat lijkt op een werkzeug hash: bevat ':' en '$'.
+    if not pw_hash or ":" not in pw_hash or "$" not in pw_hash or len(pw_hash) < 40:
+        _flash(error="Ongeldige wachtwoord-hash. Verwacht een werkzeug pbkdf2/scrypt hash.")
+        return redirect(url_for("admin.admin_users"))
+
+    conn = db()
+    try:
+        # Consistent met admin_users(): root-admin checkt globaal, anderen
+        # binnen hun eigen tenant.
+        if me["email"].lower() == AUTH_EMAIL:
+            exists = conn.execute("SELECT 1 FROM users WHERE email = ?", (email,)).fetchone()
+        else:
+            exists = conn.execute(
+                "SELECT 1 FROM users WHERE email = ? AND tenant_id = ?",
+                (email, me["tenant_id"])
+            ).fetchone()
+        if exists:
+            _flash(error=f"Gebruiker {email} bestaat al.")
+            return redirect(url_for("admin.admin_users"))
+        conn.execute(
+            "INSERT INTO users(email, password_hash, is_admin, tenant_id, created_at, disabled) VALUES(?,?,?,?,?,0)",
+            (email, pw_hash, 1 if mk_admin else 0, me["tenant_id"], datetime.now(timezone.utc).isoformat())
+        )
+        conn.commit()
+        _flash(msg=f"Gebruiker {email} aangemaakt via hash. Klant kan inloggen met het wachtwoord van het contactformulier.")
+    finally:
+        conn.close()
+    return redirect(url_for("admin.admin_users"))
+
+@bp.route("/admin/users/<int:user_id>/toggle", methods=["POST"])
+def admin_users_toggle(user_id):
+    _require_admin()
+    me = current_user()
+    if user_id == me["id"]:
+        _flash(error="Je kunt je eigen account niet uitschakelen.")
+        return redirect(url_for("admin.admin_users"))
+    is_root_admin = (me["email"].lower() == AUTH_EMAIL)
+    conn = db()
+    try:
+        if is_root_admin:
+            row = conn.execute("SELECT disabled FROM users WHERE id = ?", (user_id,)).fetchone()
+        else:
+            row = conn.execute("SELECT disabled FROM users WHERE id = ? AND tenant_id = ?", (user_id, me["tenant_id"])).fetchone()
+        if not row:
+            abort(404)
+        new_val = 0 if row["disabled"] else 1
+        conn.execute("UPDATE users SET disabled = ? WHERE id = ?", (new_val, user_id))
+        conn.commit()
+        _invalidate_user(user_id)
+        _flash(msg="Status gewijzigd.")
+    finally:
+        conn.close()
+    return redirect(url_for("admin.admin_users"))
+
+@bp.route("/admin/users/<int:user_id>/reset", methods=["POST"])
+def admin_users_reset(user_id):
+    _require_admin()
+    me = current_user()
+    pw = (request.form.get("password") or "").strip()
+    if len(pw) < 8:
+        _flash(error="Wachtwoord moet minimaal 8 tekens zijn.")
+        return redirect(url_for("admin.admin_users"))
+    is_root_admin = (me["email"].lower() == AUTH_EMAIL)
+    conn = db()
+    try:
+        if is_root_admin:
+            row = conn.execute("SELECT id FROM users WHERE id = ?", (user_id,)).fetchone()
+        else:
+            row = conn.execute("SELECT id FROM users WHERE id = ? AND tenant_id = ?", (user_id, me["tenant_id"])).fetchone()
+        if not row:
+            abort(404)
+        conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (generate_password_hash(pw), user_id))
+        conn.commit()
+        _invalidate_user(user_id)
+        _flash(msg="Wachtwoord gereset.")
+    finally:
+        conn.close()
+    return redirect(url_for("admin.admin_users"))
+
+@bp.route("/admin/users/<int:user_id>/delete", methods=["POST"])
+def admin_users_delete(user_id):
+    _require_admin()
+    me = current_user()
+    if user_id == me["id"]:
+        _flash(error="Je kunt je eigen account niet verwijderen.")
+        return redirect(url_for("admin.admin_users"))
+    is_root_admin = (me["email"].lower() == AUTH_EMAIL)
+    conn = db()
+    try:
+        if is_root_admin:
+            row = conn.execute("SELECT id FROM users WHERE id = ?", (user_id,)).fetchone()
+        else:
+            row = conn.execute("SELECT id FROM users WHERE id = ? AND tenant_id = ?", (user_id, me["tenant_id"])).fetchone()
+        if not row:
+            abort(404)
+        # We verwijderen alleen de user; packages blijven bestaan (owner_user_id wordt wees)
+        conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        conn.commit()
+        _invalidate_user(user_id)
+        _flash(msg="Gebruiker verwijderd.")
+    finally:
+        conn.close()
+    return redirect(url_for("admin.admin_users"))
+
+
+@bp.route("/admin/pending/<int:pending_id>/cancel", methods=["POST"])
+def admin_pending_cancel(pending_id):
+    """
+    Annuleer een pending account-aanvraag (verwijdert de rij uit pending_accounts).
+    Alleen toegestaan voor 'awaiting_payment' en 'payment_started'; reeds geactiveerde
+    aanvragen mogen hier niet weg, want daar hangt al een users-row aan vast.
+
+    Tenant-scoping: een gewone admin kan alleen aanvragen uit zijn eigen tenant
+    annuleren. De root-admin (AUTH_EMAIL) mag aanvragen uit alle tenants annuleren.
+    """
+    _require_admin()
+    me = current_user()
+    is_root_admin = (me["email"].lower() == AUTH_EMAIL)
+    conn = db()
+    try:
+        if is_root_admin:
+            row = conn.execute(
+                "SELECT id, email, status FROM pending_accounts WHERE id = ?",
+                (pending_id,)
+            ).fetchone()
+        else:
+            row = conn.execute(
+                "SELECT id, email, status FROM pending_accounts WHERE id = ? AND tenant_id = ?",
+                (pending_id, me["tenant_id"])
+            ).fetchone()
+        if not row:
+            abort(404)
+        if row["status"] == "activated":
+            _flash(error="Deze aanvraag is al geactiveerd en kan niet meer geannuleerd worden.")
+            return redirect(url_for("admin.admin_users"))
+        conn.execute("DELETE FROM pending_accounts WHERE id = ?", (pending_id,))
+        conn.commit()
+        _flash(msg=f"Aanvraag voor {row['email']} geannuleerd.")
+    finally:
+        conn.close()
+    return redirect(url_for("admin.admin_users"))
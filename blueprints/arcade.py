@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+blueprints/arcade.py
+--------------------
+De arcade-/minigamepagina (/arcade) en de online leaderboard-API. De
+pagina zelf is templates/expired.html, die ook als 'verlopen'-pagina van
+/p/<token> dient.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+
+from flask import Blueprint, jsonify, redirect, request
+
+from app import BASE_CSS, BG_DIV, HTML_HEAD_ICON, client_ip, db, render_template
+
+bp = Blueprint("arcade", __name__)
+
+
+@bp.route("/p/arcade")
+def arcade_redirect():
+    return redirect("/arcade", code=302)
+
+@bp.route("/arcade")
+def arcade():
+    # Rechtstreekse toegang tot de arcade/minigame-pagina (zelfde template
+    # als de "expired"-pagina). Bereikbaar zonder login via een kleine knop
+    # op het inlogscherm.
+    return render_template(
+        "expired.html",
+        base_css=BASE_CSS,
+        bg=BG_DIV,
+        head_icon=HTML_HEAD_ICON
+    )
+
+# =============================
+# ONLINE LEADERBOARD API
+# =============================
+
+LEADERBOARD_WINDOW_DAYS = 30
+LEADERBOARD_RATE_LIMIT_SECONDS = 20
+LEADERBOARD_MAX_LIMIT = 50
+PLAYER_NAME_RE = re.compile(r"[^A-Za-z0-9 _\-\.]+")
+
+
+def leaderboard_cutoff_iso(days=LEADERBOARD_WINDOW_DAYS):
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+def normalize_player_name(value):
+    value = (value or "Speler").strip()[:18]
+    value = PLAYER_NAME_RE.sub("", value).strip()
+    return value or "Speler"
+
+
+def safe_int(value, default=0, minimum=None, maximum=None):
+    try:
+        result = int(value)
+    except (TypeError, ValueError):
+        result = default
+    if minimum is not None:
+        result = max(minimum, result)
+    if maximum is not None:
+        result = min(maximum, result)
+    return result
+
+
+def cleanup_old_scores():
+    conn = db()
+    try:
+        conn.execute(
+            "DELETE FROM leaderboard_scores WHERE created_at < ?",
+            (leaderboard_cutoff_iso(LEADERBOARD_WINDOW_DAYS),)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def leaderboard_recent_submit_exists(conn, ip):
+    if not ip:
+        return False
+    recent_cutoff = (datetime.now(timezone.utc) - timedelta(seconds=LEADERBOARD_RATE_LIMIT_SECONDS)).isoformat()
+    row = conn.execute(
+        """
+        SELECT 1
+        FROM leaderboard_scores
+        WHERE ip = ? AND created_at >= ?
+        LIMIT 1
+        """,
+        (ip, recent_cutoff)
+    ).fetchone()
+    return row is not None
+
+
+@bp.route("/api/leaderboard/submit", methods=["POST"])
+def leaderboard_submit():
+    data = request.get_json(silent=True) or {}
+
+    name = normalize_player_name(data.get("name"))
+    score = safe_int(data.get("score"), default=0, minimum=0, maximum=10_000_000)
+    wave = safe_int(data.get("wave"), default=0, minimum=0, maximum=10_000)
+
+    if score <= 0:
+        return jsonify({"ok": False, "error": "invalid_score"}), 400
+
+    ip = client_ip()
+    user_agent = (request.headers.get("User-Agent", "") or "")[:200]
+    created_at = datetime.now(timezone.utc).isoformat()
+
+    conn = db()
+    try:
+        if leaderboard_recent_submit_exists(conn, ip):
+            return jsonify({"ok": False, "error": "rate_limited"}), 429
+
+        conn.execute(
+            """
+            INSERT INTO leaderboard_scores
+            (player_name, score, wave, created_at, ip, user_agent)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (name, score, wave, created_at, ip, user_agent)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    cleanup_old_scores()
+    return jsonify({"ok": True})
+
+
+@bp.route("/api/leaderboard/top")
+def leaderboard_top():
+    limit = safe_int(request.args.get("limit", 10), default=10, minimum=1, maximum=LEADERBOARD_MAX_LIMIT)
+    cutoff = leaderboard_cutoff_iso(LEADERBOARD_WINDOW_DAYS)
+
+    conn = db()
+    try:
+        rows = conn.execute(
+            """
+            SELECT player_name, score, wave
+            FROM leaderboard_scores
+            WHERE created_at >= ?
+            ORDER BY score DESC, wave DESC, created_at ASC
+            LIMIT ?
+            """,
+            (cutoff, limit)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    return jsonify({
+        "rows": [
+            {
+                "name": r["player_name"],
+                "score": r["score"],
+                "wave": r["wave"]
+            }
+            for r in rows
+        ]
+    })
@@ -0,0 +1,753 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+blueprints/billing.py
+---------------------
+Contact-/aanvraagformulier met de PayPal-knop, het opslaan van een
+abonnement (/billing/store) en de PayPal-webhook. De verwerking van
+webhook-events loopt via de job 'paypal_webhook', die daarom ook hier
+geregistreerd wordt.
+"""
+
+import json, os, re, sqlite3
+from datetime import datetime, timedelta, timezone
+
+from flask import Blueprint, jsonify, request
+from werkzeug.security import generate_password_hash
+
+from app import (
+    AUTH_EMAIL, BASE_CSS, BG_DIV, HTML_HEAD_ICON, MAIL_TO, PAYPAL_API_BASE, PAYPAL_CLIENT_ID,
+    PAYPAL_PLAN_0_5, PAYPAL_PLAN_1, PAYPAL_PLAN_2, PAYPAL_PLAN_5, PAYPAL_WEBHOOK_ID, REVERSE_PLAN_MAP,
+    SMTP_HOST, SMTP_PASS, SMTP_USER, _brand_cache, _client_ip, _rate_is_blocked, _rate_register_failure,
+    current_tenant, db, get_base_host, jobs, log, parse_dt_utc, paypal_access_token, render_template,
+    send_email_async,
+)
+
+bp = Blueprint("billing", __name__)
+
+
+# -------------- Contact / Mail --------------
+# Iets strenger dan 'ooit een @ en een .' — valideert lengtes en voorkomt
+# meerdere @ of punt aan begin/eind van domein. Voor echte RFC-validatie zou
+# email-validator (pip) robuuster zijn, maar dit dekt 99% van de gevallen.
+EMAIL_RE = re.compile(
+    r"^(?=.{3,254}$)"
+    r"[A-Za-z0-9._%+\-]{1,64}"
+    r"@"
+    r"[A-Za-z0-9]([A-Za-z0-9\-]{0,62}[A-Za-z0-9])?"
+    r"(\.[A-Za-z0-9]([A-Za-z0-9\-]{0,62}[A-Za-z0-9])?)+$"
+)
+PHONE_RE  = re.compile(r"^[0-9+()\\s-]{8,20}$")
+ALLOWED_TB = {0.5, 1.0, 2.0, 5.0}
+PRICE_LABEL = {0.5:"€12/maand", 1.0:"€15/maand", 2.0:"€20/maand", 5.0:"€30/maand"}
+
+# Mapping van interne ref-codes naar leesbare bron-labels in de mailmelding.
+# Onbekende waarden worden doorgegeven zoals ze zijn (al gefilterd op alphanumeric).
+_REF_LABELS = {
+    "direct":    "rechtstreeks via /contact (geen ref)",
+    "p_postdl":  "downloadpagina – kaart na succesvolle download",
+}
+
+def _describe_ref(ref: str) -> str:
+    return _REF_LABELS.get(ref, f"onbekende bron: {ref}")
+
+def _send_contact_email(form):
+    storage_val = form.get("storage_tb")
+    if storage_val in PRICE_LABEL:
+        price_label = PRICE_LABEL[storage_val]  # type: ignore[index]
+        storage_line = f"- Gewenste opslag: {storage_val} TB (indicatie {price_label})\n"
+    else:
+        storage_line = "- Gewenste opslag: meer opslag (op aanvraag)\n"
+
+    base_host = form.get("base_host") or get_base_host()
+    company_slug = form.get("company_slug") or ""
+    example_link  = f"{company_slug}.{base_host}" if company_slug else base_host
+
+    # Wachtwoord wordt server-side gehasht (pbkdf2) en er wordt een pending_account
+    # opgeslagen. Als de klant via PayPal betaalt, wordt het account automatisch
+    # aangemaakt bij de BILLING.SUBSCRIPTION.ACTIVATED webhook. De hash wordt ook
+    # in deze mail meegestuurd zodat je handmatig kunt aanmaken als de klant níet
+    # via PayPal betaalt (bijv. factuur-per-e-mail).
+    desired_pw = form.get("desired_password") or ""
+    if desired_pw:
+        pw_hash = generate_password_hash(desired_pw)
+        pw_block = (
+            "- Wachtwoord: ingesteld door klant (zie hash hieronder)\n"
+            f"- Wachtwoord-hash: {pw_hash}\n"
+        )
+        instructions = (
+            "\n"
+            "==== Activatie ====\n"
+            "Als de klant via PayPal betaalt: account wordt AUTOMATISCH aangemaakt\n"
+            "zodra de ACTIVATED-webhook binnenkomt. Je hoeft niets te doen.\n"
+            "\n"
+            "Als je het account handmatig wilt aanmaken (bijv. voor testing of\n"
+            "factuur-per-e-mail):\n"
+            "1. Log in op het admin-paneel (/admin/users)\n"
+            "2. Klap open: \"Aanmaken via wachtwoord-hash (uit contactmail)\"\n"
+            f"3. Vul in: e-mail = {form['login_email']}\n"
+            "4. Plak de bovenstaande Wachtwoord-hash in het hash-veld\n"
+            "5. Klik \"Aanmaken met hash\"\n"
+            "\n"
+            "De klant kan in beide gevallen direct inloggen met het wachtwoord\n"
+            "dat hij zelf heeft ingevuld op het contactformulier.\n"
+        )
+    else:
+        pw_block = "- Wachtwoord: (niet ingevuld)\n"
+        instructions = ""
+
+    body = (
+        "Er is een nieuwe aanvraag binnengekomen:\n\n"
+        f"- Gewenste inlog-e-mail: {form['login_email']}\n"
+        f"{storage_line}"
+        f"- Bedrijfsnaam: {form['company']}\n"
+        f"- Telefoonnummer: {form['phone']}\n"
+        f"{pw_block}"
+        f"- Subdomein voorbeeld: {example_link}\n"
+        f"- Opmerking: {form.get('notes') or '-'}\n"
+        f"- Bron: {_describe_ref(form.get('ref') or 'direct')}\n"
+        f"{instructions}\n"
+        "Livegang: doorgaans 1–2 dagen (langer bij maatwerk).\n"
+        "Facturatie: PayPal abonnement mogelijk via site; of incasso-link per e-mail na livegang.\n"
+    )
+
+    send_email_async(MAIL_TO, "Nieuwe aanvraag transfer-oplossing", body)
+
+@bp.route("/contact", methods=["GET","POST"])
+def contact():
+    base_host = get_base_host()
+    if request.method == "GET":
+        return render_template(
+            "contact.html", error=None,
+            form={"login_email":"", "storage_tb":"", "company":"", "phone":"", "notes":""},
+            base_css=BASE_CSS, bg=BG_DIV, head_icon=HTML_HEAD_ICON,
+            base_host=base_host,
+            paypal_client_id=PAYPAL_CLIENT_ID or "",
+            paypal_plan_0_5=PAYPAL_PLAN_0_5 or "",
+            paypal_plan_1=PAYPAL_PLAN_1 or "",
+            paypal_plan_2=PAYPAL_PLAN_2 or "",
+            paypal_plan_5=PAYPAL_PLAN_5 or ""
+        )
+
+    login_email   = (request.form.get("login_email") or "").strip()
+    storage_tb_raw= (request.form.get("storage_tb") or "").strip()
+    company       = (request.form.get("company") or "").strip()
+    phone         = (request.form.get("phone") or "").strip()
+    desired_pw    = (request.form.get("desired_password") or "").strip()
+    notes         = (request.form.get("notes") or "").strip()
+    # Bron-tracking: hidden field 'ref' meegestuurd vanuit het formulier (gevuld
+    # door JS uit de URL), of fallback uit de query. Whitelist op alphanumeric/_-
+    # om vrije input te voorkomen.
+    raw_ref       = (request.form.get("ref") or request.args.get("ref") or "").strip()[:32]
+    ref_clean     = re.sub(r"[^a-zA-Z0-9_\-]", "", raw_ref) or "direct"
+
+    errors = []
+    if not EMAIL_RE.match(login_email): errors.append("Vul een geldig e-mailadres in.")
+
+    is_more = (storage_tb_raw.lower() == "more")
+    storage_tb = None
+    if not storage_tb_raw:
+        errors.append("Kies een geldige opslaggrootte.")
+    elif not is_more:
+        try:
+            storage_tb = float(storage_tb_raw.replace(",", "."))
+        except Exception:
+            storage_tb = None
+        if storage_tb not in ALLOWED_TB:
+            errors.append("Kies een geldige opslaggrootte.")
+
+    if len(company) < 2 or len(company) > 100: errors.append("Vul een geldige bedrijfsnaam in (min. 2 tekens).")
+    if not PHONE_RE.match(phone): errors.append("Vul een geldig telefoonnummer in (8–20 tekens).")
+    if len(desired_pw) < 10: errors.append("Kies een wachtwoord van minimaal 10 tekens.")
+
+    form_back = {"login_email":login_email,"storage_tb":(storage_tb_raw or ""),
+                 "company":company,"phone":phone,"notes":notes}
+
+    if errors:
+        return render_template(
+            "contact.html", error=" ".join(errors),
+            form=form_back, base_css=BASE_CSS, bg=BG_DIV, head_icon=HTML_HEAD_ICON,
+            base_host=base_host,
+            paypal_client_id=PAYPAL_CLIENT_ID or "",
+            paypal_plan_0_5=PAYPAL_PLAN_0_5 or "",
+            paypal_plan_1=PAYPAL_PLAN_1 or "",
+            paypal_plan_2=PAYPAL_PLAN_2 or "",
+            paypal_plan_5=PAYPAL_PLAN_5 or ""
+        )
+
+    # Slug voor voorbeeld subdomein
+    def slugify_py(s: str) -> str:
+        import unicodedata, re as _re
+        s = unicodedata.normalize('NFKD', s)
+        s = "".join(ch for ch in s if not unicodedata.combining(ch))
+        s = s.lower().replace("&"," en ")
+        s = _re.sub(r"[^a-z0-9]+","-", s)
+        s = _re.sub(r"^-+|-+$","", s)
+        s = _re.sub(r"--+","-", s)
+        return s[:50] if s else ""
+    company_slug = slugify_py(company)
+
+    # Pending account bewaren: hash het wachtwoord en sla aanvraag op.
+    # Bij succesvolle PayPal-activatie wordt deze rij gebruikt om een
+    # users-row aan te maken (auto-provisioning).
+    pw_hash = generate_password_hash(desired_pw)
+    plan_value_str = str(storage_tb_raw) if not is_more else "more"
+    tenant_slug_now = current_tenant()["slug"]
+    try:
+        conn = db()
+        try:
+            # Verwijder oude awaiting_payment aanvragen van hetzelfde e-mailadres
+            # in dezelfde tenant om duplicaten te voorkomen bij herhaald invullen.
+            conn.execute(
+                "DELETE FROM pending_accounts WHERE email = ? AND tenant_id = ? AND status = 'awaiting_payment'",
+                (login_email.lower(), tenant_slug_now)
+            )
+            conn.execute(
+                """INSERT INTO pending_accounts
+                   (email, password_hash, tenant_id, plan_value, company, phone, notes, status, created_at)
+                   VALUES(?, ?, ?, ?, ?, ?, ?, 'awaiting_payment', ?)""",
+                (login_email.lower(), pw_hash, tenant_slug_now, plan_value_str,
+                 company, phone, notes, datetime.now(timezone.utc).isoformat())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception:
+        log.exception("pending_account insert failed")
+        # Ga verder — we willen nog steeds de mail versturen als pending insert faalt.
+
+    # E-mail naar beheerder
+    try:
+        if SMTP_HOST and SMTP_USER and SMTP_PASS:
+            _send_contact_email({
+                "login_email": login_email,
+                "storage_tb": (storage_tb if not is_more else "more"),
+                "company": company,
+                "phone": phone,
+                "desired_password": desired_pw,
+                "notes": notes,
+                "company_slug": company_slug,
+                "base_host": base_host,
+                "ref": ref_clean,
+            })
+            return render_template(
+                "contact_done.html", base_css=BASE_CSS, bg=BG_DIV, head_icon=HTML_HEAD_ICON
+            )
+    except Exception:
+        log.exception("contact mail failed")
+
+    # Fallback: mailto
+    if storage_tb in PRICE_LABEL:
+        price_label = PRICE_LABEL[storage_tb]  # type: ignore[index]
+        storage_line = f"- Gewenste opslag: {storage_tb} TB (indicatie {price_label})\\n"
+    else:
+        storage_line = "- Gewenste opslag: meer opslag (op aanvraag)\\n"
+
+    example_link = f"{company_slug}.{base_host}" if company_slug else base_host
+    # Wachtwoord NIET in plaintext mailen — alleen markeren of er één is ingesteld.
+    pw_marker = "ingesteld door klant" if desired_pw else "(niet ingevuld)"
+    body = (
+        "Er is een nieuwe aanvraag binnengekomen:\\n\\n"
+        f"- Gewenste inlog-e-mail: {login_email}\\n"
+        f"{storage_line}"
+        f"- Bedrijfsnaam: {company}\\n"
+        f"- Telefoonnummer: {phone}\\n"
+        f"- Wachtwoord: {pw_marker}\\n"
+        f"- Subdomein voorbeeld: {example_link}\\n"
+        f"- Opmerking: {notes or '-'}\\n\\n"
+        "Livegang: doorgaans 1–2 dagen (langer bij maatwerk).\\n"
+        "Facturatie: PayPal abonnement mogelijk via site; of incasso-link per e-mail na livegang.\\n"
+    )
+    from urllib.parse import quote
+    mailto = f"mailto:{MAIL_TO}?subject={quote('Nieuwe aanvraag transfer-oplossing')}&body={quote(body)}"
+    return render_template("contact_mail_fallback.html", mailto_link=mailto, base_css=BASE_CSS, bg=BG_DIV, head_icon=HTML_HEAD_ICON)
+
+# -------------- Abonnementbeheer (server) --------------
+@bp.route("/billing/store", methods=["POST"])
+def paypal_store_subscription():
+    data = request.get_json(force=True, silent=True) or {}
+    sub_id = (data.get("subscription_id") or "").strip()
+    plan_value = (data.get("plan_value") or "").strip()
+    # Klant-email uit het contactformulier (om sub_id aan pending_account te koppelen)
+    login_email = (data.get("login_email") or "").strip().lower()
+    if not sub_id or plan_value not in {"0.5","1","2","5"}:
+        return jsonify(ok=False, error="invalid_input"), 400
+    t = current_tenant()["slug"]
+
+    conn = db()
+    try:
+        # 1) Subscription bewaren (administratief; tenant-breed). Heeft een
+        #    webhook de status al gezet, dan blijft die staan.
+        conn.execute("""INSERT INTO subscriptions(login_email, plan_value, subscription_id, status, created_at, tenant_id)
+                     VALUES(?,?,?,?,?,?)
+                     ON CONFLICT(subscription_id) DO UPDATE SET
+                       login_email = excluded.login_email, plan_value = excluded.plan_value,
+                       created_at = excluded.created_at, tenant_id = excluded.tenant_id,
+                       status = CASE WHEN subscriptions.status_event_at IS NULL
+                                     THEN excluded.status ELSE subscriptions.status END""",
+                  (login_email or AUTH_EMAIL, plan_value, sub_id, "ACTIVE", datetime.now(timezone.utc).isoformat(), t))
+
+        # 2) Koppel sub_id aan pending_account zodat de webhook het account kan activeren.
+        if login_email and EMAIL_RE.match(login_email):
+            conn.execute(
+                """UPDATE pending_accounts
+                   SET paypal_subscription_id = ?, status = 'payment_started'
+                   WHERE email = ? AND tenant_id = ? AND status = 'awaiting_payment'""",
+                (sub_id, login_email, t)
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+    try:
+        plan_label = {"0.5":"0,5 TB","1":"1 TB","2":"2 TB","5":"5 TB"}.get(plan_value, plan_value+" TB")
+        body = (
+            "Er is zojuist een PayPal-abonnement gestart (via onApprove):\n\n"
+            f"- Subscription ID: {sub_id}\n"
+            f"- Plan: {plan_label}\n"
+            f"- Klant-e-mail: {login_email or '(niet doorgegeven)'}\n"
+            f"- Datum/tijd (UTC): {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+            "Zodra PayPal de webhook BILLING.SUBSCRIPTION.ACTIVATED stuurt, wordt\n"
+            "het account automatisch aangemaakt en kan de klant inloggen.\n"
+        )
+        send_email_async(MAIL_TO, "Nieuwe PayPal-abonnement gestart", body)
+    except Exception:
+        log.exception("Kon bevestigingsmail niet versturen")
+    return jsonify(ok=True)
+
+# -------------- PayPal Webhook --------------
+def _activate_pending_account_by_sub(sub_id: str):
+    """
+    Activeer een pending account o.b.v. subscription_id: maak een users-row aan
+    (als die nog niet bestaat) en markeer pending als 'activated'. Slaat ook
+    de bedrijfsnaam op in tenant_brand zodat de UI automatisch de juiste
+    branding kan tonen voor deze tenant.
+
+    Returns: dict met 'email','tenant_id','created' of None als niet gevonden.
+    """
+    if not sub_id:
+        return None
+    conn = db()
+    try:
+        row = conn.execute(
+            """SELECT id, email, password_hash, tenant_id, plan_value, status, company
+               FROM pending_accounts
+               WHERE paypal_subscription_id = ?
+               LIMIT 1""",
+            (sub_id,)
+        ).fetchone()
+        if not row:
+            return None
+        if row["status"] == "activated":
+            # Al eerder geactiveerd (idempotent: PayPal kan webhooks re-sturen)
+            return {"email": row["email"], "tenant_id": row["tenant_id"], "created": False, "already": True}
+
+        email = (row["email"] or "").lower()
+        tenant = row["tenant_id"]
+        # Bestaat er al een users-row? (bijv. admin die handmatig al aanmaakte)
+        existing = conn.execute(
+            "SELECT id FROM users WHERE email = ? AND tenant_id = ?",
+            (email, tenant)
+        ).fetchone()
+        created = False
+        if not existing:
+            conn.execute(
+                """INSERT INTO users(email, password_hash, is_admin, tenant_id, created_at, disabled)
+                   VALUES(?, ?, 0, ?, ?, 0)""",
+                (email, row["password_hash"], tenant, datetime.now(timezone.utc).isoformat())
+            )
+            created = True
+
+        conn.execute(
+            "UPDATE pending_accounts SET status = 'activated', activated_at = ? WHERE id = ?",
+            (datetime.now(timezone.utc).isoformat(), row["id"])
+        )
+
+        # Branding: cache de bedrijfsnaam zodat de UI 'm voor deze tenant kan tonen.
+        company = (row["company"] or "").strip()
+        if company and tenant:
+            conn.execute(
+                """INSERT INTO tenant_brand(tenant_id, company_name, updated_at)
+                   VALUES(?, ?, ?)
+                   ON CONFLICT(tenant_id) DO UPDATE SET
+                     company_name = excluded.company_name,
+                     updated_at   = excluded.updated_at""",
+                (tenant, company, datetime.now(timezone.utc).isoformat())
+            )
+
+        conn.commit()
+        if company and tenant:
+            _brand_cache.discard(tenant)
+        return {"email": email, "tenant_id": tenant, "created": created, "already": False}
+    except Exception:
+        log.exception("activate_pending failed for sub=%s", sub_id)
+        try: conn.rollback()
+        except Exception: pass
+        return None
+    finally:
+        conn.close()
+
+# Headers die PayPal's verify-webhook-signature nodig heeft.
+PAYPAL_SIG_HEADERS = (
+    "Paypal-Transmission-Id", "Paypal-Transmission-Time", "Paypal-Cert-Url",
+    "Paypal-Auth-Algo", "Paypal-Transmission-Sig",
+)
+
+# PayPal-events zijn een paar KB JSON. Alles wat groter is of in grote aantallen
+# van één IP komt, weigeren we vóór er iets in webhook_events belandt. Op een
+# 429 of 413 probeert PayPal het zelf later opnieuw.
+WEBHOOK_MAX_BYTES = int(os.environ.get("WEBHOOK_MAX_BYTES", str(64 * 1024)))
+WEBHOOK_MAX_PER_MINUTE = int(os.environ.get("WEBHOOK_MAX_PER_MINUTE", "120"))
+WEBHOOK_LOCKOUT_SECONDS = 300
+# Afgehandelde events (processed/rejected/duplicate) blijven zo lang staan
+# voor inspectie; daarna ruimt de job 'webhook_events_prune' ze op.
+WEBHOOK_EVENTS_KEEP_DAYS = int(os.environ.get("WEBHOOK_EVENTS_KEEP_DAYS", "30"))
+
+def _paypal_sig_headers(headers) -> dict:
+    return {h: (headers.get(h) or headers.get(h.replace("Paypal-", "PayPal-")) or "") for h in PAYPAL_SIG_HEADERS}
+
+def paypal_verify_webhook_sig(headers, body_text: str) -> bool:
+    """Verifieer webhook via /v1/notifications/verify-webhook-signature.
+
+    False bij een ongeldige handtekening of ontbrekende headers. Netwerk- en
+    API-fouten worden gelogd en gelden ook als False; gebruik
+    _paypal_verify_webhook_sig_strict om die als exception te krijgen.
+    """
+    try:
+        return _paypal_verify_webhook_sig_strict(headers, body_text)
+    except Exception:
+        log.exception("paypal_verify_webhook_sig failed")
+        return False
+
+def _paypal_verify_webhook_sig_strict(headers, body_text: str) -> bool:
+    """Als paypal_verify_webhook_sig, maar tijdelijke fouten (PayPal traag of
+    onbereikbaar, token-refresh faalt) gooien een exception — dan kan de
+    webhook-job het later opnieuw proberen in plaats van het event te weigeren."""
+    if not PAYPAL_WEBHOOK_ID:
+        raise RuntimeError("PAYPAL_WEBHOOK_ID ontbreekt; webhook niet te verifiëren")
+    sig = _paypal_sig_headers(headers)
+    transmission_id  = sig["Paypal-Transmission-Id"]
+    timestamp        = sig["Paypal-Transmission-Time"]
+    cert_url         = sig["Paypal-Cert-Url"]
+    auth_algo        = sig["Paypal-Auth-Algo"]
+    transmission_sig = sig["Paypal-Transmission-Sig"]
+    if not all([transmission_id, timestamp, cert_url, auth_algo, transmission_sig]):
+        log.warning("Webhook headers incompleet")
+        return False
+    try:
+        webhook_event = json.loads(body_text)
+    except ValueError:
+        return False
+    token = paypal_access_token()
+    payload = json.dumps({
+        "auth_algo": auth_algo,
+        "cert_url": cert_url,
+        "transmission_id": transmission_id,
+        "transmission_sig": transmission_sig,
+        "transmission_time": timestamp,
+        "webhook_id": PAYPAL_WEBHOOK_ID,
+        "webhook_event": webhook_event
+    }).encode()
+    import urllib.request
+    req = urllib.request.Request(PAYPAL_API_BASE + "/v1/notifications/verify-webhook-signature", method="POST")
+    req.add_header("Authorization", f"Bearer {token}")
+    req.add_header("Content-Type", "application/json")
+    with urllib.request.urlopen(req, data=payload, timeout=20) as resp:
+        v = json.loads(resp.read().decode())
+        return (v.get("verification_status","").upper() == "SUCCESS")
+
+@bp.route("/webhook/paypal", methods=["POST"])
+def paypal_webhook():
+    """
+    Neem een PayPal-webhook in ontvangst: opslaan en direct 200 antwoorden.
+
+    Verificatie (een uitgaande call naar PayPal, timeout 20s) en verwerking
+    gebeuren in de 'paypal_webhook'-job. Zo houdt een trage PayPal-API geen
+    gunicorn-threads vast en triggert hij geen PayPal-retries. Een herhaalde
+    aflevering met hetzelfde transmission-id wordt herkend en genegeerd.
+    """
+    ip = _client_ip()
+    if _rate_is_blocked("paypal_webhook", ip) > 0:
+        return jsonify(ok=False, error="rate_limited"), 429
+    _rate_register_failure("paypal_webhook", ip, WEBHOOK_MAX_PER_MINUTE, 60, WEBHOOK_LOCKOUT_SECONDS)
+
+    if (request.content_length or 0) > WEBHOOK_MAX_BYTES:
+        return jsonify(ok=False, error="payload_too_large", max_bytes=WEBHOOK_MAX_BYTES), 413
+    # Ook zonder Content-Length (chunked) nooit meer dan de limiet inlezen.
+    body = request.stream.read(WEBHOOK_MAX_BYTES + 1)
+    if len(body) > WEBHOOK_MAX_BYTES:
+        return jsonify(ok=False, error="payload_too_large", max_bytes=WEBHOOK_MAX_BYTES), 413
+    body_text = body.decode("utf-8", "replace")
+    if not body_text:
+        return jsonify(ok=False, error="empty_body"), 400
+    try:
+        event = json.loads(body_text)
+    except Exception:
+        return jsonify(ok=False, error="invalid_json"), 400
+    if not isinstance(event, dict):
+        return jsonify(ok=False, error="invalid_json"), 400
+
+    sig = _paypal_sig_headers(request.headers)
+    if not all(sig.values()):
+        # Zonder deze headers valt er later niets te verifiëren.
+        return jsonify(ok=False, error="verification_failed"), 400
+    transmission_id = sig["Paypal-Transmission-Id"].strip()[:200]
+
+    c = db()
+    try:
+        with c:
+            cur = c.execute("""INSERT OR IGNORE INTO webhook_events(
+                                   transmission_id, provider, event_id, event_type, headers, body,
+                                   tenant_id, status, received_at)
+                               VALUES(?, 'paypal', ?, ?, ?, ?, ?, 'received', ?)""",
+                            (transmission_id, str(event.get("id") or "")[:200] or None,
+                             str(event.get("event_type") or "").upper()[:200],
+                             json.dumps(sig), body_text, current_tenant()["slug"],
+                             datetime.now(timezone.utc).isoformat()))
+            duplicate = not cur.rowcount
+            if not duplicate:
+                jobs.enqueue("paypal_webhook", {"transmission_id": transmission_id}, conn=c)
+    except sqlite3.Error:
+        log.exception("webhook_events insert failed")
+        # 5xx: PayPal probeert het later opnieuw.
+        return jsonify(ok=False, error="processing_error"), 500
+    finally:
+        c.close()
+    return jsonify(ok=True, duplicate=duplicate)
+
+def _job_paypal_webhook(payload: dict) -> None:
+    """Verifieer en verwerk één opgeslagen webhook. Idempotent per event."""
+    tid = payload.get("transmission_id") or ""
+    c = db()
+    try:
+        ev = c.execute("SELECT * FROM webhook_events WHERE transmission_id = ?", (tid,)).fetchone()
+        if ev is None or ev["status"] != "received":
+            return
+        if ev["event_id"]:
+            # PayPal kan hetzelfde event opnieuw afleveren met een nieuw
+            # transmission-id; verwerk elk event-id maar één keer.
+            seen = c.execute("""SELECT 1 FROM webhook_events
+                                WHERE event_id = ? AND status = 'processed' AND transmission_id <> ? LIMIT 1""",
+                             (ev["event_id"], tid)).fetchone()
+            if seen:
+                c.execute("UPDATE webhook_events SET status='duplicate', processed_at=?, last_error=NULL WHERE transmission_id=?",
+                          (datetime.now(timezone.utc).isoformat(), tid))
+                c.commit()
+                return
+    finally:
+        c.close()
+
+    # Tijdelijke fouten (PayPal onbereikbaar) gooien hier → job-retry met backoff.
+    try:
+        verified = _paypal_verify_webhook_sig_strict(json.loads(ev["headers"]), ev["body"])
+    except Exception as e:
+        _webhook_event_error(tid, f"verify: {type(e).__name__}: {e}")
+        raise
+    if not verified:
+        log.warning("PayPal webhook %s: verificatie mislukt, event genegeerd", tid)
+        _webhook_event_status(tid, "rejected")
+        return
+
+    try:
+        _process_paypal_event(json.loads(ev["body"]), ev["tenant_id"])
+    except Exception as e:
+        _webhook_event_error(tid, f"process: {type(e).__name__}: {e}")
+        raise
+    _webhook_event_status(tid, "processed")
+
+def _webhook_event_status(transmission_id: str, status: str) -> None:
+    c = db()
+    try:
+        c.execute("UPDATE webhook_events SET status=?, processed_at=?, last_error=NULL WHERE transmission_id=?",
+                  (status, datetime.now(timezone.utc).isoformat(), transmission_id))
+        c.commit()
+    finally:
+        c.close()
+
+def _webhook_event_error(transmission_id: str, error: str) -> None:
+    try:
+        c = db()
+        try:
+            c.execute("UPDATE webhook_events SET last_error=? WHERE transmission_id=?",
+                      (error[:1000], transmission_id))
+            c.commit()
+        finally:
+            c.close()
+    except sqlite3.Error:
+        log.exception("webhook_events update failed")
+
+def _prune_webhook_events() -> None:
+    """Verwijder afgehandelde webhook-events ouder dan WEBHOOK_EVENTS_KEEP_DAYS."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=WEBHOOK_EVENTS_KEEP_DAYS)).isoformat()
+    c = db()
+    try:
+        cur = c.execute("""DELETE FROM webhook_events
+                         WHERE status IN ('processed', 'rejected', 'duplicate') AND processed_at < ?""",
+                        (cutoff,))
+        c.commit()
+        if cur.rowcount:
+            log.info("webhook_events: %d oude events verwijderd", cur.rowcount)
+    finally:
+        c.close()
+
+jobs.register("webhook_events_prune", lambda payload: _prune_webhook_events(),
+              workers=1, priority=200, max_attempts=3, lease_seconds=120)
+jobs.schedule("webhook_events_prune", 6 * 3600)
+
+# Eén worker, maar de verwerkingsvolgorde is niet gegarandeerd: PayPal levert
+# niet op volgorde af en een event in retry-backoff wordt ingehaald. Statussen
+# per abonnement worden daarom op PayPal's create_time vergeleken.
+jobs.register("paypal_webhook", _job_paypal_webhook, workers=1, priority=50, max_attempts=10,
+              lease_seconds=180, backoff_base=30, backoff_max=3600)
+
+def _subscription_tenant(c, sub_id: str, default: str) -> str:
+    """Tenant van het pending_account dat aan deze sub_id hangt, anders `default`."""
+    pending = c.execute(
+        "SELECT tenant_id FROM pending_accounts WHERE paypal_subscription_id = ? LIMIT 1", (sub_id,)
+    ).fetchone()
+    return pending["tenant_id"] if pending else default
+
+def _process_paypal_event(event: dict, tenant_slug: str) -> None:
+    """Verwerk een geverifieerd PayPal-event. Fouten gooien (→ retry)."""
+    event_type = (event.get("event_type") or "").upper()
+    resource = event.get("resource") or {}
+    now_utc = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    # Tijdstip van het event zelf bij PayPal, niet van ontvangst of verwerking.
+    event_at = (parse_dt_utc(event.get("create_time")) or datetime.now(timezone.utc)).isoformat()
+
+    sub_id  = (resource.get("id") or "").strip() or (resource.get("billing_agreement_id") or "").strip()
+    plan_id = (resource.get("plan_id") or "").strip()
+    plan_value = REVERSE_PLAN_MAP.get(plan_id)
+
+    try:
+        if event_type == "BILLING.SUBSCRIPTION.ACTIVATED":
+            status = (resource.get("status") or "ACTIVE").upper()
+            activation = None
+            if sub_id:
+                c = db()
+                try:
+                    # Een nieuwer status-event (bv. CANCELLED dat eerder verwerkt
+                    # werd) houdt zijn status; de rest van de rij wordt bijgewerkt.
+                    c.execute("""INSERT INTO subscriptions(login_email, plan_value, subscription_id, status, created_at,
+                                                           tenant_id, status_event_at)
+                                 VALUES(?,?,?,?,?,?,?)
+                                 ON CONFLICT(subscription_id) DO UPDATE SET
+                                   login_email = excluded.login_email, plan_value = excluded.plan_value,
+                                   created_at = excluded.created_at, tenant_id = excluded.tenant_id,
+                                   status = CASE WHEN subscriptions.status_event_at > excluded.status_event_at
+                                                 THEN subscriptions.status ELSE excluded.status END,
+                                   status_event_at = MAX(COALESCE(subscriptions.status_event_at, ''),
+                                                         excluded.status_event_at)""",
+                              (AUTH_EMAIL, plan_value or (plan_id or ""), sub_id, status, datetime.now(timezone.utc).isoformat(),
+                               _subscription_tenant(c, sub_id, tenant_slug), event_at))
+                    c.commit()
+                finally:
+                    c.close()
+                # Probeer het pending account te activeren (maakt users-row aan)
+                activation = _activate_pending_account_by_sub(sub_id)
+
+            try:
+                plan_label = {"0.5":"0,5 TB","1":"1 TB","2":"2 TB","5":"5 TB"}.get(plan_value, plan_id or "(onbekend plan)")
+                if activation and activation.get("created"):
+                    subject = "PayPal: abonnement + account geactiveerd"
+                    body = (
+                        "PayPal abonnement geactiveerd — account automatisch aangemaakt:\n\n"
+                        f"- Klant-e-mail: {activation['email']}\n"
+                        f"- Tenant: {activation['tenant_id']}\n"
+                        f"- Subscription ID: {sub_id or '-'}\n"
+                        f"- Plan: {plan_label}\n"
+                        f"- Datum/tijd (UTC): {now_utc}\n\n"
+                        "De klant kan direct inloggen met het wachtwoord dat hij op het\n"
+                        "contactformulier heeft ingevuld.\n"
+                    )
+                elif activation and activation.get("already"):
+                    subject = "PayPal: abonnement geactiveerd (herhaling)"
+                    body = (
+                        "PayPal-webhook ACTIVATED opnieuw ontvangen voor bestaand account.\n\n"
+                        f"- Klant-e-mail: {activation['email']}\n"
+                        f"- Subscription ID: {sub_id or '-'}\n"
+                        f"- Datum/tijd (UTC): {now_utc}\n"
+                    )
+                elif activation and not activation.get("created"):
+                    subject = "PayPal: abonnement geactiveerd (user bestond al)"
+                    body = (
+                        "PayPal abonnement geactiveerd. De users-row bestond al — geen nieuw account\n"
+                        "aangemaakt, maar de pending_account-status is bijgewerkt.\n\n"
+                        f"- Klant-e-mail: {activation['email']}\n"
+                        f"- Subscription ID: {sub_id or '-'}\n"
+                        f"- Plan: {plan_label}\n"
+                        f"- Datum/tijd (UTC): {now_utc}\n"
+                    )
+                else:
+                    subject = "PayPal: abonnement geactiveerd (geen pending gevonden)"
+                    body = (
+                        "PayPal abonnement geactiveerd, maar er is geen pending_account\n"
+                        "gekoppeld aan deze subscription_id. Maak het account handmatig aan\n"
+                        "via /admin/users.\n\n"
+                        f"- Event: {event_type}\n"
+                        f"- Subscription ID: {sub_id or '-'}\n"
+                        f"- Plan: {plan_label}\n"
+                        f"- Datum/tijd (UTC): {now_utc}\n"
+                    )
+                send_email_async(MAIL_TO, subject, body)
+            except Exception:
+                log.exception("Webhook mail (activated) failed")
+
+        elif event_type in {"BILLING.SUBSCRIPTION.CANCELLED", "BILLING.SUBSCRIPTION.SUSPENDED", "BILLING.SUBSCRIPTION.RE-ACTIVATED"}:
+            new_status = "ACTIVE" if event_type.endswith("RE-ACTIVATED") else event_type.split(".")[-1]
+            if sub_id:
+                c = db()
+                try:
+                    # Onbekend abonnement (ACTIVATED nog niet verwerkt): rij alvast
+                    # aanmaken, zodat een later verwerkte ACTIVATED deze status niet
+                    # overschrijft. Een ouder event dan de huidige status: overslaan.
+                    cur = c.execute("""INSERT INTO subscriptions(login_email, plan_value, subscription_id, status, created_at,
+                                                                 tenant_id, status_event_at)
+                                       VALUES(?,?,?,?,?,?,?)
+                                       ON CONFLICT(subscription_id) DO UPDATE SET
+                                         status = excluded.status, status_event_at = excluded.status_event_at
+                                       WHERE subscriptions.status_event_at IS NULL
+                                          OR subscriptions.status_event_at <= excluded.status_event_at""",
+                                    (AUTH_EMAIL, plan_value or (plan_id or ""), sub_id, new_status,
+                                     datetime.now(timezone.utc).isoformat(), _subscription_tenant(c, sub_id, tenant_slug),
+                                     event_at))
+                    c.commit()
+                finally:
+                    c.close()
+                if not cur.rowcount:
+                    log.info("PayPal webhook: %s voor %s is ouder dan de huidige status, overgeslagen", event_type, sub_id)
+                    return
+            try:
+                body = (
+                    "PayPal abonnementsstatus gewijzigd:\n\n"
+                    f"- Event: {event_type}\n"
+                    f"- Subscription ID: {sub_id or '-'}\n"
+                    f"- Plan ID: {plan_id or '-'}\n"
+                    f"- Datum/tijd (UTC): {now_utc}\n"
+                )
+                send_email_async(MAIL_TO, f"PayPal: {event_type}", body)
+            except Exception:
+                log.exception("Webhook mail (status change) failed")
+
+        elif event_type == "PAYMENT.CAPTURE.COMPLETED":
+            # Mail bij elke (terugkerende) betaling
+            amount = (resource.get("amount") or {}).get("value")
+            currency = (resource.get("amount") or {}).get("currency_code")
+            try:
+                body = (
+                    "PayPal betaling ontvangen:\n\n"
+                    f"- Event: {event_type}\n"
+                    f"- Bedrag: {amount or '-'} {currency or ''}\n"
+                    f"- Subscription (indien bekend): {sub_id or '-'}\n"
+                    f"- Datum/tijd (UTC): {now_utc}\n"
+                )
+                send_email_async(MAIL_TO, "PayPal: betaling ontvangen", body)
+            except Exception:
+                log.exception("Webhook mail (payment) failed")
+        else:
+            log.info("PayPal webhook: event %s genegeerd", event_type)
+
+    except Exception:
+        log.exception("Webhook processing error (event=%s)", event_type)
+        raise
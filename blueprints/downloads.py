@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+blueprints/downloads.py
+-----------------------
+Downloadkant: de pakketpagina (/p/<token>), losse bestanden (/file), het
+manifest, de mappenboom (/tree) en de ZIP-stream (/zip), plus de oude
+alias-URL's. Dit is de blueprint waar een download-only deployment mee
+volstaat (BLUEPRINTS=downloads).
+
+De caches en mappenboom-helpers die ook door uploads gebruikt worden
+(_pkg_item_cache, _build_package_tree, ...) staan in app.py.
+
+Onder asgi.py (async servermodus) doet /zip hier alleen de controles en de
+headers; het streamen zelf gebeurt daar, zie stream_zip().
+"""
+
+import os, sqlite3, time
+from datetime import datetime, timezone
+
+from flask import (
+    Blueprint, Response, abort, g, jsonify, redirect, request, session, stream_with_context, url_for,
+)
+from werkzeug.security import check_password_hash
+
+import tracing
+from zip_pipeline import HANDOFF_EXTENSION, S3ObjectSource, ZipEntry, ZipPipeline
+from app import (
+    BASE_CSS, BG_DIV, HTML_HEAD_ICON, PACKAGE_TREE_THRESHOLD, PKGVIEW_LOCKOUT_SECONDS,
+    PKGVIEW_MAX_ATTEMPTS, PKGVIEW_WINDOW_SECONDS, PRESIGN_GET_TTL, S3_BUCKET, TREE_PAGE_SIZE, ZIP_BYTES,
+    ZIP_PREFETCH_QUEUE, ZIP_PREFETCH_WORKERS, ZIP_SMALL_FILE_BYTES, ZIP_STREAMS, ZIP_VERIFY_CHECKSUMS,
+    _async_delete_s3_keys, _client_ip, _drop_package_tree, _ensure_package_tree, _invalidate_pkg_cache,
+    _is_pkg_expired, _pkg_item_cache, _presign_cache, _rate_is_blocked, _rate_register_failure,
+    _releasable_s3_keys, current_tenant, db, get_base_host, human, is_valid_token, log, log_download_event,
+    log_download_events, parse_dt_utc, render_template, s3,
+)
+
+bp = Blueprint("downloads", __name__)
+
+
+# -------------- Download Pages --------------
+
+# TTL voor pakket-wachtwoord sessies (seconden).
+PKG_ALLOW_TTL = int(os.environ.get("PKG_ALLOW_TTL", "3600"))  # 1 uur
+
+def _pkg_allow_is_valid(token: str) -> bool:
+    rec = session.get(f"allow_{token}")
+    if not rec:
+        return False
+    # Backwards-compat: oude sessies hadden gewoon True
+    if rec is True:
+        session.pop(f"allow_{token}", None)
+        return False
+    if not isinstance(rec, dict):
+        return False
+    return rec.get("ok") is True and float(rec.get("exp") or 0) > time.time()
+
+# Maximaal aantal pakket-toegang sleutels in de sessie. Voorkomt dat een
+# Flask-sessie cookie (max ~4KB) volloopt bij gebruikers die veel
+# password-protected pakketten openen.
+_PKG_ALLOW_MAX_KEYS = 25
+
+def _pkg_allow_set(token: str) -> None:
+    """Markeer pakket als ontgrendeld (voor het per-pakket wachtwoord).
+
+    Schoont in één pass verlopen entries op en hanteert een cap om te
+    voorkomen dat de session-cookie volloopt.
+    """
+    now_ts = time.time()
+    # Eén pass: verzamel geldige (niet-verlopen) allow_* entries met hun exp.
+    valid = []  # list of (exp, key)
+    for k in list(session.keys()):
+        if not isinstance(k, str) or not k.startswith("allow_"):
+            continue
+        rec = session.get(k)
+        if isinstance(rec, dict) and float(rec.get("exp") or 0) > now_ts:
+            valid.append((float(rec["exp"]), k))
+        else:
+            # Verlopen of corrupt: weg ermee.
+            session.pop(k, None)
+    # Als we de cap dreigen te overschrijden (we gaan zo +1 toevoegen), kap de
+    # oudste eraf. Met _PKG_ALLOW_MAX_KEYS=25 en doorgaans <5 actief is dit zelden raak.
+    if len(valid) >= _PKG_ALLOW_MAX_KEYS:
+        valid.sort()  # oudste (laagste exp) eerst
+        for _, k in valid[:len(valid) - _PKG_ALLOW_MAX_KEYS + 1]:
+            session.pop(k, None)
+    session[f"allow_{token}"] = {"ok": True, "exp": now_ts + PKG_ALLOW_TTL}
+
+def _tree_subdirs(conn, tenant: str, token: str, parent: str):
+    return conn.execute(
+        """SELECT dir, name, file_count, total_bytes FROM package_dirs
+           WHERE tenant_id=? AND token=? AND parent=? ORDER BY name""",
+        (tenant, token, parent),
+    ).fetchall()
+
+def _tree_files(conn, tenant: str, token: str, parent: str, offset: int, limit: int):
+    """Bestanden direct in map `parent` (niet in submappen), gepagineerd op path."""
+    if parent:
+        # Range op de index, daarna alleen directe kinderen (geen '/' meer na de prefix).
+        return conn.execute(
+            """SELECT id, name, path, size_bytes FROM items
+               WHERE token=? AND tenant_id=? AND path >= ? AND path < ?
+                 AND instr(substr(path, ?), '/') = 0
+               ORDER BY path LIMIT ? OFFSET ?""",
+            (token, tenant, parent + "/", parent + "0", len(parent) + 2, limit, offset),
+        ).fetchall()
+    return conn.execute(
+        """SELECT id, name, path, size_bytes FROM items
+           WHERE token=? AND tenant_id=? AND instr(path, '/') = 0
+           ORDER BY path LIMIT ? OFFSET ?""",
+        (token, tenant, limit, offset),
+    ).fetchall()
+
+def _item_view(r) -> dict:
+    size = int(r["size_bytes"])
+    return {"id": r["id"], "name": r["name"], "path": r["path"], "size": size, "size_h": human(size)}
+
+def _dir_view(r) -> dict:
+    return {"dir": r["dir"], "name": r["name"], "files": r["file_count"], "size_h": human(int(r["total_bytes"]))}
+
+def _pkg_json_guard(conn, token: str, tenant: str):
+    """Zelfde toegangschecks als /file, maar met JSON-fouten. Geeft (pkg, error_response)."""
+    pkg = conn.execute("SELECT * FROM packages WHERE token=? AND tenant_id=?", (token, tenant)).fetchone()
+    if not pkg:
+        return None, (jsonify(ok=False, error="not_found"), 404)
+    if _is_pkg_expired(pkg):
+        return None, (jsonify(ok=False, error="expired"), 410)
+    if pkg["password_hash"] and not _pkg_allow_is_valid(token):
+        return None, (jsonify(ok=False, error="forbidden"), 403)
+    return pkg, None
+
+@bp.route("/p/<token>", methods=["GET","POST"])
+def package_page(token):
+    token = (token or "").strip()
+    if not is_valid_token(token): abort(404)
+
+    # Rate limit op pakket-views per IP (voorkomt brute-force op tokens)
+    ip = _client_ip()
+    wait = _rate_is_blocked("pkgview", ip)
+    if wait > 0:
+        abort(429)
+
+    c = db()
+    try:
+        t = current_tenant()["slug"]
+        pkg = c.execute("SELECT * FROM packages WHERE token=? AND tenant_id=?", (token, t)).fetchone()
+        if not pkg:
+            _rate_register_failure("pkgview", ip, PKGVIEW_MAX_ATTEMPTS, PKGVIEW_WINDOW_SECONDS, PKGVIEW_LOCKOUT_SECONDS)
+            return render_template(
+                "expired.html",
+                base_css=BASE_CSS,
+                bg=BG_DIV,
+                head_icon=HTML_HEAD_ICON
+            ), 404
+
+        # Robuuste datetime-vergelijking: bij parse-fout behandelen we het pakket
+        # als verlopen (veiliger dan een 500). Onbeperkte pakketten (jaar 9999)
+        # blijven geldig omdat die ver in de toekomst staan.
+        now_utc = datetime.now(timezone.utc)
+        exp_dt = parse_dt_utc(pkg["expires_at"]) or now_utc
+        if exp_dt <= now_utc:
+            # Atomair: items + package in één transactie verwijderen, dan async
+            # de S3-keys opruimen. Voorkomt half-opgeruimde state bij crash.
+            # De S3-delete-jobs gaan mee in dezelfde transactie.
+            try:
+                rows = c.execute("SELECT s3_key FROM items WHERE token=? AND tenant_id=?", (token, t)).fetchall()
+                s3_keys = [r["s3_key"] for r in rows]
+                with c:  # commit/rollback transactie
+                    c.execute("DELETE FROM items WHERE token=? AND tenant_id=?", (token, t))
+                    _drop_package_tree(c, t, token)
+                    c.execute("DELETE FROM packages WHERE token=? AND tenant_id=?", (token, t))
+                    _async_delete_s3_keys(_releasable_s3_keys(c, s3_keys), conn=c)
+                _invalidate_pkg_cache(t, token)
+            except sqlite3.Error:
+                log.exception("expired package cleanup DB failed")
+            abort(410)
+
+        if pkg["password_hash"]:
+            if request.method == "GET" and not _pkg_allow_is_valid(token):
+                return render_template("pass_prompt.html", base_css=BASE_CSS, bg=BG_DIV, error=None, head_icon=HTML_HEAD_ICON)
+            if request.method == "POST":
+                if not check_password_hash(pkg["password_hash"], request.form.get("password","")):
+                    _rate_register_failure("pkgview", ip, PKGVIEW_MAX_ATTEMPTS, PKGVIEW_WINDOW_SECONDS, PKGVIEW_LOCKOUT_SECONDS)
+                    return render_template("pass_prompt.html", base_css=BASE_CSS, bg=BG_DIV, error="Onjuist wachtwoord. Probeer opnieuw.", head_icon=HTML_HEAD_ICON)
+                _pkg_allow_set(token)
+
+        root = _ensure_package_tree(c, t, token)
+        top_dirs = _tree_subdirs(c, t, token, "")
+        file_count = int(root["file_count"])
+        tree_mode = file_count > PACKAGE_TREE_THRESHOLD
+        if tree_mode:
+            # Alleen top-level: mappen + eerste pagina losse bestanden in de root.
+            items = _tree_files(c, t, token, "", 0, TREE_PAGE_SIZE)
+        else:
+            items = c.execute("""SELECT id,name,path,size_bytes FROM items
+                                 WHERE token=? AND tenant_id=?
+                                 ORDER BY path""", (token, t)).fetchall()
+    finally:
+        c.close()
+
+    total_h = human(int(root["total_bytes"]))
+    dt = (parse_dt_utc(pkg["expires_at"]) or datetime.now(timezone.utc)).replace(second=0, microsecond=0)
+    if dt.year >= 9000:
+        expires_h = "Onbeperkt geldig"
+    else:
+        expires_h = dt.strftime("%d-%m-%Y %H:%M")
+
+    its = [_item_view(r) for r in items]
+
+    # Top-level mappen: in boom-modus de uitklapbare knopen, anders de
+    # "map als ZIP"-knoppen (alleen zinvol als er naast die map nog meer is).
+    folder_list = [_dir_view(d) for d in top_dirs]
+    if not tree_mode and len(folder_list) == 1 and top_dirs[0]["file_count"] == file_count:
+        folder_list = []
+
+    return render_template(
+        "package.html",
+        token=token, title=pkg["title"],
+        items=its, folders=folder_list, file_count=file_count, tree_mode=tree_mode,
+        more_root_files=tree_mode and len(its) >= TREE_PAGE_SIZE, tree_page_size=TREE_PAGE_SIZE,
+        total_human=total_h,
+        expires_human=expires_h, base_css=BASE_CSS, bg=BG_DIV, head_icon=HTML_HEAD_ICON,
+        base_host=get_base_host()
+    )
+
+def _lookup_pkg_item(tenant: str, token: str, item_id: int):
+    """(package, item) als dicts, of (None, None)/(pkg, None). Gecachet."""
+    key = (tenant, token, item_id)
+    hit = _pkg_item_cache.get(key)
+    if hit is not None:
+        return hit
+    c = db()
+    try:
+        pkg = c.execute("SELECT * FROM packages WHERE token=? AND tenant_id=?", (token, tenant)).fetchone()
+        it = None
+        if pkg:
+            it = c.execute("SELECT * FROM items WHERE id=? AND token=? AND tenant_id=?", (item_id, token, tenant)).fetchone()
+    finally:
+        c.close()
+    result = (dict(pkg) if pkg else None, dict(it) if it else None)
+    # Alleen complete hits cachen; een 404 willen we niet 30s vasthouden
+    # (bijv. item dat net na een put-complete wordt opgevraagd).
+    if pkg and it:
+        _pkg_item_cache.set(key, result)
+    return result
+
+def _presigned_get_url(tenant: str, token: str, it) -> str:
+    key = (tenant, token, it["id"])
+    url = _presign_cache.get(key)
+    if url is None:
+        # RFC 6266-conforme Content-Disposition met UTF-8-fallback voor
+        # non-ASCII filenames (bijv. accenten, Arabisch, Chinees).
+        url = s3.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": S3_BUCKET,
+                "Key": it["s3_key"],
+                "ResponseContentDisposition": _safe_content_disposition(it["name"] or "download"),
+            },
+            ExpiresIn=PRESIGN_GET_TTL, HttpMethod="GET",
+        )
+        _presign_cache.set(key, url)
+    return url
+
+def _safe_content_disposition(filename: str) -> str:
+    """Bouw een RFC 6266-conforme Content-Disposition waarde.
+
+    - Strip CR/LF (defense-in-depth tegen response splitting)
+    - Strip quote-characters
+    - Geeft naast `filename=` ook `filename*=UTF-8''...` zodat browsers
+      non-ASCII titels (bijv. 'België-rapport.zip') correct tonen.
+    - ASCII-fallback met onleesbare bytes vervangen door '_'.
+    """
+    from urllib.parse import quote as _quote
+    raw = (filename or "download").replace("\r", "").replace("\n", "").replace('"', "").strip()
+    if not raw:
+        raw = "download"
+    # ASCII-fallback voor oude clients
+    ascii_name = raw.encode("ascii", "replace").decode("ascii").replace("?", "_")
+    # RFC 5987 percent-encoding voor de UTF-8-variant
+    utf8_name = _quote(raw, safe="")
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{utf8_name}"
+
+@bp.route("/file/<token>/<int:item_id>")
+def stream_file(token, item_id):
+    token = (token or "").strip()
+    if not is_valid_token(token): abort(404)
+    t = current_tenant()["slug"]
+    pkg, it = _lookup_pkg_item(t, token, item_id)
+    if not pkg: abort(404)
+    if _is_pkg_expired(pkg): abort(410)
+    if pkg["password_hash"] and not _pkg_allow_is_valid(token): abort(403)
+    if not it: abort(404)
+
+    log_download_event(
+        token=token,
+        tenant_id=t,
+        download_type="file",
+        item_id=it["id"]
+    )
+
+    # Presigned GET: browser praat direct met B2/S3. Scheelt bandbreedte en voorkomt
+    # dat request-tijd de Render-timeout raakt bij grote bestanden.
+    # TTL: 5 minuten — genoeg om de download te starten (browser begint direct na
+    # de 302), maar beperkt het risico als iemand de URL uit de netwerk-tab kopieert.
+    # De download zelf mag langer duren: zodra de transfer begonnen is, blijft hij
+    # gaan tot het einde, ongeacht de presigned-TTL.
+    try:
+        url = _presigned_get_url(t, token, it)
+        return redirect(url, code=302)
+    except Exception:
+        log.exception("stream_file presign failed")
+        abort(500)
+
+MANIFEST_MAX_IDS = 1000
+
+def _parse_item_ids(raw: str) -> list[int] | None:
+    """'3,7,12' -> [3, 7, 12] (uniek, volgorde behouden). None bij ongeldige input."""
+    ids, seen = [], set()
+    for part in (raw or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if not part.isdigit():
+            return None
+        n = int(part)
+        if n not in seen:
+            seen.add(n)
+            ids.append(n)
+    return ids
+
+@bp.route("/manifest/<token>")
+def download_manifest(token):
+    """
+    JSON-manifest met presigned GET-URLs, zodat de browser meerdere losse
+    bestanden rechtstreeks bij B2 ophaalt (zonder /file-redirect per klik).
+
+    Query: ?ids=3,7,12  -> alleen deze items (moeten bij het pakket horen).
+           zonder ids    -> alle items van het pakket.
+
+    De pakket-pagina vraagt het manifest in kleine batches op vlak voordat de
+    downloads starten, zodat elke URL nog ruim geldig is (zie PRESIGN_GET_TTL).
+    """
+    token = (token or "").strip()
+    if not is_valid_token(token):
+        return jsonify(ok=False, error="not_found"), 404
+    ids = _parse_item_ids(request.args.get("ids", ""))
+    if ids is None or len(ids) > MANIFEST_MAX_IDS:
+        return jsonify(ok=False, error="bad_ids"), 400
+
+    t = current_tenant()["slug"]
+    c = db()
+    try:
+        pkg, err = _pkg_json_guard(c, token, t)
+        if err:
+            return err
+        if ids:
+            marks = ",".join("?" * len(ids))
+            rows = c.execute(f"""SELECT id,name,path,size_bytes,s3_key FROM items
+                                 WHERE token=? AND tenant_id=? AND id IN ({marks})
+                                 ORDER BY path""", (token, t, *ids)).fetchall()
+            if len(rows) != len(ids):
+                return jsonify(ok=False, error="unknown_item"), 400
+        else:
+            rows = c.execute("""SELECT id,name,path,size_bytes,s3_key FROM items
+                                WHERE token=? AND tenant_id=?
+                                ORDER BY path""", (token, t)).fetchall()
+            if len(rows) > MANIFEST_MAX_IDS:
+                return jsonify(ok=False, error="too_many_items", max=MANIFEST_MAX_IDS), 400
+    finally:
+        c.close()
+
+    out = []
+    try:
+        for r in rows:
+            out.append({
+                "id": r["id"],
+                "name": r["name"],
+                "path": r["path"],
+                "size": int(r["size_bytes"]),
+                "url": _presigned_get_url(t, token, r),
+            })
+    except Exception:
+        log.exception("manifest presign failed")
+        return jsonify(ok=False, error="server_error"), 500
+
+    log_download_events(token, t, "file", [r["id"] for r in rows])
+
+    resp = jsonify(ok=True, items=out, expires_in=PRESIGN_GET_TTL // 2)
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+@bp.route("/tree/<token>")
+def package_tree(token):
+    """
+    Inhoud van één map voor de uitklapbare boom op grote pakket-pagina's.
+
+    Query: ?dir=map/sub (leeg = root), ?offset=N voor de volgende pagina bestanden.
+    Response: {"ok": true, "dir": "...", "dirs": [...], "files": [...], "next_offset": N|null}
+    Submappen komen alleen mee bij offset=0.
+    """
+    token = (token or "").strip()
+    if not is_valid_token(token):
+        return jsonify(ok=False, error="not_found"), 404
+    folder = _folder_prefix(request.args.get("dir", ""))
+    try:
+        offset = max(0, int(request.args.get("offset", "0")))
+    except ValueError:
+        return jsonify(ok=False, error="bad_offset"), 400
+
+    t = current_tenant()["slug"]
+    c = db()
+    try:
+        pkg, err = _pkg_json_guard(c, token, t)
+        if err:
+            return err
+        _ensure_package_tree(c, t, token)
+        node = c.execute("SELECT dir FROM package_dirs WHERE tenant_id=? AND token=? AND dir=?",
+                         (t, token, folder)).fetchone()
+        if node is None:
+            return jsonify(ok=False, error="not_found"), 404
+        dirs = _tree_subdirs(c, t, token, folder) if offset == 0 else []
+        files = _tree_files(c, t, token, folder, offset, TREE_PAGE_SIZE)
+    finally:
+        c.close()
+
+    return jsonify(
+        ok=True,
+        dir=folder,
+        dirs=[_dir_view(d) for d in dirs],
+        files=[_item_view(r) for r in files],
+        next_offset=offset + len(files) if len(files) >= TREE_PAGE_SIZE else None,
+    )
+
+def _folder_prefix(raw: str) -> str:
+    """Querystring-map -> genormaliseerde prefix zonder slashes ('' = geen filter)."""
+    raw = (raw or "").replace(chr(92), "/")
+    return "/".join(p for p in raw.split("/") if p not in {"", ".", ".."})
+
+@bp.route("/zip/<token>")
+def stream_zip(token):
+    """
+    Streamt het pakket als ZIP. Optioneel een deel ervan:
+      ?prefix=map/sub  -> alleen items onder die map (paden blijven intact)
+      ?ids=3,7,12      -> alleen deze items (moeten bij het pakket horen)
+    """
+    token = (token or "").strip()
+    if not is_valid_token(token): abort(404)
+    prefix = _folder_prefix(request.args.get("prefix", ""))
+    ids = _parse_item_ids(request.args.get("ids", ""))
+    if ids is None or len(ids) > MANIFEST_MAX_IDS: abort(400)
+    c = db()
+    try:
+        t = current_tenant()["slug"]
+        pkg = c.execute("SELECT * FROM packages WHERE token=? AND tenant_id=?", (token, t)).fetchone()
+        if not pkg: abort(404)
+        if _is_pkg_expired(pkg): abort(410)
+        if pkg["password_hash"] and not _pkg_allow_is_valid(token): abort(403)
+        if ids:
+            marks = ",".join("?" * len(ids))
+            rows = c.execute(f"""SELECT name,path,s3_key,crc32,size_bytes FROM items
+                                 WHERE token=? AND tenant_id=? AND id IN ({marks})
+                                 ORDER BY path""", (token, t, *ids)).fetchall()
+            if len(rows) != len(ids): abort(400)
+        elif prefix:
+            # Range i.p.v. LIKE: 'map/' <= path < 'map0' ('0' volgt direct op
+            # '/'), zodat een index op path bruikbaar blijft en '%'/'_' in
+            # mapnamen geen wildcards worden.
+            rows = c.execute("""SELECT name,path,s3_key,crc32,size_bytes FROM items
+                                WHERE token=? AND tenant_id=? AND path >= ? AND path < ?
+                                ORDER BY path""", (token, t, prefix + "/", prefix + "0")).fetchall()
+        else:
+            rows = c.execute("""SELECT name,path,s3_key,crc32,size_bytes FROM items
+                                WHERE token=? AND tenant_id=?
+                                ORDER BY path""", (token, t)).fetchall()
+    finally:
+        c.close()
+    if not rows: abort(404)
+
+    log_download_event(
+        token=token,
+        tenant_id=t,
+        download_type="zip",
+        item_id=None
+    )
+
+    entries = [ZipEntry(r["path"] or r["name"], r["s3_key"], r["crc32"], r["size_bytes"]) for r in rows]
+    filename = (pkg["title"] or f"onderwerp-{token}").strip()
+    if filename.lower().endswith(".zip"): filename = filename[:-4]
+    if prefix and not ids:
+        filename += "-" + prefix.rsplit("/", 1)[-1]
+    elif ids:
+        filename += "-selectie"
+    filename += ".zip"
+    # Strip CR/LF expliciet als extra safety net voor X-Filename header.
+    x_filename = filename.replace("\r", "").replace("\n", "").replace('"', "")
+
+    handoff = ((request.environ.get("asgi.scope") or {}).get("extensions") or {}).get(HANDOFF_EXTENSION)
+    if handoff is not None:
+        # Async servermodus (asgi.py): de server streamt de zip zelf met
+        # coroutines. Hier alleen de controles hierboven en de headers.
+        handoff["entries"] = entries
+        g.zip_handoff = handoff  # metrics en trace lopen door tot de laatste byte
+        resp = Response(mimetype="application/zip")
+        resp.headers["Content-Disposition"] = _safe_content_disposition(filename)
+        resp.headers["X-Filename"] = x_filename
+        return resp
+
+    # Geen aparte precheck: de pipeline streamt zodra het eerste object binnen
+    # is. Dat eerste stuk halen we hier al op, zodat een fout op het eerste
+    # bestand (NoSuchKey, CRC) nog een nette 500 geeft. Latere fouten breken de
+    # lopende stream af.
+    try:
+        pipeline = ZipPipeline(
+            S3ObjectSource(s3, S3_BUCKET),
+            entries,
+            prefetch_workers=ZIP_PREFETCH_WORKERS,
+            prefetch_queue=ZIP_PREFETCH_QUEUE,
+            small_file_bytes=ZIP_SMALL_FILE_BYTES,
+            verify_crc=ZIP_VERIFY_CHECKSUMS,
+        )
+        chunks = iter(pipeline)
+        with tracing.span("zip.first", files=len(rows)):
+            first = next(chunks, b"")
+
+        def generate():
+            sent, outcome = 0, "error"
+            t0 = time.perf_counter()
+            try:
+                sent += len(first)
+                yield first
+                for chunk in chunks:
+                    sent += len(chunk)
+                    yield chunk
+                outcome = "ok"
+            except GeneratorExit:
+                outcome = "aborted"  # ontvanger haakte af
+                raise
+            finally:
+                chunks.close()  # stopt prefetch- en read-ahead-threads
+                ZIP_BYTES.inc(sent)
+                ZIP_STREAMS.inc(outcome=outcome)
+                # Geen span-contextmanager rond yields: add_span achteraf.
+                tracing.add_span("zip.stream", time.perf_counter() - t0, bytes=sent, outcome=outcome)
+
+        resp = Response(stream_with_context(generate()), mimetype="application/zip")
+        resp.headers["Content-Disposition"] = _safe_content_disposition(filename)
+        resp.headers["X-Filename"] = x_filename
+        return resp
+    except Exception as e:
+        log.exception("stream_zip failed")
+        msg = f"ZIP generatie mislukte. Err: {e}"
+        resp = Response(msg, status=500, mimetype="text/plain")
+        resp.headers["X-Error"] = "zipstream_failed"
+        return resp
+
+@bp.route("/package/<token>")
+def package_alias(token): return redirect(url_for("downloads.package_page", token=token))
+@bp.route("/stream/<token>/<int:item_id>")
+def stream_file_alias(token, item_id): return redirect(url_for("downloads.stream_file", token=token, item_id=item_id))
+@bp.route("/streamzip/<token>")
+def stream_zip_alias(token): return redirect(url_for("downloads.stream_zip", token=token))
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+blueprints/trial.py
+-------------------
+Gratis variant: signup met e-mailverificatie. De restricties voor
+trial-gebruikers bij het uploaden (_enforce_trial_*) staan in app.py,
+zodat ze ook gelden als deze blueprint uit staat.
+"""
+
+import os, re, secrets
+from datetime import datetime, timedelta, timezone
+
+from flask import Blueprint, abort, request
+from werkzeug.security import generate_password_hash
+
+from app import (
+    BASE_CSS, BG_DIV, HTML_HEAD_ICON, TRIAL_ENABLED, TRIAL_MAX_ACTIVE_PACKAGES,
+    TRIAL_MAX_BYTES_PER_PACKAGE, TRIAL_MAX_TTL_DAYS, TRIAL_TENANT_SLUG, TRIAL_VERIFY_TOKEN_TTL_HRS,
+    _client_ip, _rate_is_blocked, _rate_register_failure, _tenant_host, _trial_host, db, get_base_host,
+    parse_dt_utc, render_template, send_email_async,
+)
+
+bp = Blueprint("trial", __name__)
+
+
+# ============================================================
+# TRIAL (gratis variant) — signup en e-mail-verificatie
+# ============================================================
+
+# Wegwerp-mailproviders die we niet accepteren voor trial-signups.
+# Een korte lijst is genoeg — dekt 90% van de gevallen, en kost geen externe
+# afhankelijkheid. Uitbreidbaar via env var TRIAL_DISPOSABLE_DOMAINS (komma-gescheiden).
+_DISPOSABLE_DOMAINS_BUILTIN = {
+    "mailinator.com", "guerrillamail.com", "guerrillamail.info", "guerrillamail.biz",
+    "10minutemail.com", "10minutemail.net", "20minutemail.com", "30minutemail.com",
+    "tempmail.com", "temp-mail.org", "tempmailo.com", "tempmail.net", "tmpmail.org",
+    "yopmail.com", "trashmail.com", "trashmail.de", "throwawaymail.com",
+    "maildrop.cc", "sharklasers.com", "getnada.com", "getairmail.com",
+    "dispostable.com", "fakeinbox.com", "mintemail.com", "mailnesia.com",
+    "spambox.us", "spamgourmet.com", "spam4.me", "mohmal.com",
+    "emailondeck.com", "tempinbox.com", "tempmailaddress.com",
+}
+_disposable_extra = os.environ.get("TRIAL_DISPOSABLE_DOMAINS", "").lower().strip()
+DISPOSABLE_DOMAINS = _DISPOSABLE_DOMAINS_BUILTIN | {
+    d.strip() for d in _disposable_extra.split(",") if d.strip()
+}
+
+# E-mail format-check: simpel maar adequaat. Voor trial-signup is een snelle
+# format-check + DNS-checks via de SMTP-server zelf voldoende.
+_EMAIL_RE_TRIAL = re.compile(r"^[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}$")
+
+# Rate-limit scopes (sluit aan op bestaand rate_limits-systeem)
+TRIAL_SIGNUP_MAX_PER_DAY = int(os.environ.get("TRIAL_SIGNUP_MAX_PER_DAY", "1"))
+TRIAL_SIGNUP_WINDOW = 24 * 3600
+TRIAL_SIGNUP_LOCKOUT = 24 * 3600
+
+def _is_disposable_email(email: str) -> bool:
+    parts = (email or "").lower().rsplit("@", 1)
+    if len(parts) != 2:
+        return True
+    return parts[1] in DISPOSABLE_DOMAINS
+
+def _email_already_in_use(email: str) -> bool:
+    """Bestaat er al een (verified) user met dit e-mailadres?"""
+    conn = db()
+    try:
+        row = conn.execute(
+            "SELECT id FROM users WHERE email = ? LIMIT 1", (email,)
+        ).fetchone()
+        return row is not None
+    finally:
+        conn.close()
+
+def _send_verify_email(to_addr: str, verify_url: str):
+    """Stuurt de verificatiemail asynchroon (multipart: plain-text + HTML)."""
+    # Bepaal de host voor links in de footer (voorwaarden, privacy, home).
+    # Gebruikt het canonieke domein van deze server (oldehanter.downloadlink.nl
+    # of downloadlink.nl, afhankelijk van waar de signup vandaan kwam).
+    site_host = _trial_host or _tenant_host
+    site_url = f"https://{site_host}"
+    terms_url = f"{site_url}/terms"
+    privacy_url = f"{site_url}/privacy"
+
+    subject = "Bevestig je e-mailadres voor downloadlink.nl"
+
+    # Plain-text fallback (voor mailclients zonder HTML-ondersteuning).
+    body = (
+        "Hallo,\n\n"
+        "Bedankt voor je aanmelding bij downloadlink.nl. Klik op de onderstaande "
+        "link om je e-mailadres te bevestigen en je gratis account te activeren:\n\n"
+        f"{verify_url}\n\n"
+        f"Deze link is {TRIAL_VERIFY_TOKEN_TTL_HRS} uur geldig.\n\n"
+        "Heb je je niet aangemeld? Negeer deze e-mail dan; er gebeurt verder niets.\n\n"
+        "—\n"
+        "downloadlink.nl • Bestandentransfer\n"
+        f"{site_url}\n"
+        f"Algemene voorwaarden: {terms_url}\n"
+        f"Privacyverklaring:    {privacy_url}\n"
+    )
+
+    # HTML-variant. Tabel-layout en inline styles want externe CSS wordt door
+    # veel mailclients (Outlook, Gmail) genegeerd of gestript. Compatibel met
+    # Outlook 2007-2024, Gmail, Apple Mail, Teams, mobiel.
+    html = f"""\
+<!doctype html>
+<html lang="nl"><head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width,initial-scale=1">
+<title>Bevestig je e-mailadres</title>
+</head>
+<body style="margin:0;padding:0;background:#f1f5f9;font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Arial,sans-serif;color:#0f172a">
+  <table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0" style="background:#f1f5f9">
+    <tr><td align="center" style="padding:32px 16px">
+
+      <table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0" style="max-width:560px;background:#ffffff;border-radius:14px;overflow:hidden;border:1px solid #e2e8f0">
+
+        <tr><td style="background:#0f4c98;padding:22px 28px">
+          <table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0">
+            <tr>
+              <td style="font-size:20px;font-weight:700;color:#ffffff;letter-spacing:.2px">
+                downloadlink<span style="color:#9ec5ff">.nl</span>
+              </td>
+              <td align="right" style="font-size:12px;color:#cfe0fa;text-transform:uppercase;letter-spacing:1px">
+                Bestandentransfer
+              </td>
+            </tr>
+          </table>
+        </td></tr>
+
+        <tr><td style="padding:32px 28px 8px 28px">
+          <h1 style="margin:0 0 14px 0;font-size:22px;font-weight:600;color:#0f172a;line-height:1.3">
+            Bevestig je e-mailadres
+          </h1>
+          <p style="margin:0 0 12px 0;font-size:15px;line-height:1.6;color:#334155">
+            Bedankt voor je aanmelding bij <strong>downloadlink.nl</strong>.
+            Klik op de knop hieronder om je e-mailadres te bevestigen en je
+            gratis account te activeren.
+          </p>
+        </td></tr>
+
+        <tr><td style="padding:18px 28px 8px 28px" align="left">
+          <table role="presentation" cellpadding="0" cellspacing="0" border="0">
+            <tr><td style="background:#1c62d2;border-radius:10px">
+              <a href="{verify_url}"
+                 style="display:inline-block;padding:13px 26px;font-size:15px;font-weight:600;
+                        color:#ffffff;text-decoration:none;border-radius:10px;
+                        font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Arial,sans-serif">
+                Bevestig e-mailadres
+              </a>
+            </td></tr>
+          </table>
+        </td></tr>
+
+        <tr><td style="padding:14px 28px 4px 28px">
+          <p style="margin:14px 0 6px 0;font-size:13px;color:#64748b;line-height:1.5">
+            Werkt de knop niet? Kopieer dan deze link naar je browser:
+          </p>
+          <p style="margin:0 0 12px 0;font-size:13px;word-break:break-all;line-height:1.5">
+            <a href="{verify_url}" style="color:#0f4c98;text-decoration:underline">{verify_url}</a>
+          </p>
+          <p style="margin:0 0 4px 0;font-size:13px;color:#64748b;line-height:1.5">
+            Deze link is <strong>{TRIAL_VERIFY_TOKEN_TTL_HRS} uur</strong> geldig.
+          </p>
+        </td></tr>
+
+        <tr><td style="padding:18px 28px 24px 28px;border-top:1px solid #e2e8f0">
+          <p style="margin:14px 0 0 0;font-size:12px;color:#94a3b8;line-height:1.5">
+            Heb je je niet aangemeld? Negeer deze e-mail dan; er gebeurt
+            verder niets en het account wordt niet geactiveerd.
+          </p>
+        </td></tr>
+
+        <tr><td style="padding:16px 28px 22px 28px;background:#f8fafc;border-top:1px solid #e2e8f0">
+          <p style="margin:0 0 6px 0;font-size:12px;color:#475569;line-height:1.5">
+            <strong style="color:#0f172a">downloadlink.nl</strong> &middot; Bestandentransfer
+          </p>
+          <p style="margin:0;font-size:12px;color:#64748b;line-height:1.6">
+            <a href="{site_url}" style="color:#475569;text-decoration:underline">Website</a>
+            &nbsp;&middot;&nbsp;
+            <a href="{terms_url}" style="color:#475569;text-decoration:underline">Algemene voorwaarden</a>
+            &nbsp;&middot;&nbsp;
+            <a href="{privacy_url}" style="color:#475569;text-decoration:underline">Privacyverklaring</a>
+          </p>
+          <p style="margin:10px 0 0 0;font-size:11px;color:#94a3b8;line-height:1.5">
+            Je ontvangt deze e-mail omdat dit e-mailadres is gebruikt om een
+            account aan te maken op {site_host}. Reageer niet op dit bericht.
+          </p>
+        </td></tr>
+
+      </table>
+
+    </td></tr>
+  </table>
+</body></html>
+"""
+    send_email_async(to_addr, subject, body, html=html)
+
+# -------------------- Trial signup route --------------------
+
+@bp.route("/trial/signup", methods=["GET", "POST"])
+def trial_signup():
+    if not TRIAL_ENABLED:
+        abort(404)
+
+    base_host = get_base_host()
+    ctx = {
+        "base_css": BASE_CSS, "bg": BG_DIV, "head_icon": HTML_HEAD_ICON,
+        "base_host": base_host,
+        "max_gb": int(TRIAL_MAX_BYTES_PER_PACKAGE / (1024**3)),
+        "max_days": int(TRIAL_MAX_TTL_DAYS),
+        "max_active": TRIAL_MAX_ACTIVE_PACKAGES,
+    }
+
+    if request.method == "GET":
+        return render_template("trial_signup.html", error=None, info=None, email="", **ctx)
+
+    ip = _client_ip()
+    wait = _rate_is_blocked("trial_signup", ip)
+    if wait > 0:
+        hrs = max(1, int(wait // 3600))
+        return render_template(
+            "trial_signup.html",
+            error=f"Te veel aanmeldingen vanaf jouw netwerk. Probeer het over ~{hrs} uur opnieuw.",
+            info=None, email="", **ctx
+        ), 429
+
+    email = (request.form.get("email") or "").strip().lower()
+    pw    = request.form.get("password") or ""
+
+    # Validatie
+    if not _EMAIL_RE_TRIAL.match(email) or len(email) > 254:
+        return render_template("trial_signup.html", error="Vul een geldig e-mailadres in.", info=None, email=email, **ctx), 400
+    if _is_disposable_email(email):
+        return render_template("trial_signup.html", error="Wegwerp-e-mailadressen worden niet geaccepteerd. Gebruik je zakelijke of persoonlijke adres.", info=None, email=email, **ctx), 400
+    if len(pw) < 10:
+        return render_template("trial_signup.html", error="Wachtwoord moet minimaal 10 tekens zijn.", info=None, email=email, **ctx), 400
+    if _email_already_in_use(email):
+        # Geef een neutrale bevestigingspagina terug om e-mail-enumeratie te
+        # voorkomen. Geen feedback "bestaat al"; dat zou attackers helpen.
+        return render_template("trial_signup_done.html", email=email,
+                                      ttl_hours=TRIAL_VERIFY_TOKEN_TTL_HRS, **ctx)
+
+    # Genereer verificatie-token (128 bits) en sla pending verificatie op.
+    token = secrets.token_hex(16)
+    pw_hash = generate_password_hash(pw)
+    now_dt = datetime.now(timezone.utc)
+    exp_dt = now_dt + timedelta(hours=TRIAL_VERIFY_TOKEN_TTL_HRS)
+    conn = db()
+    try:
+        # Verwijder bestaande niet-geconsumeerde verifs voor dit e-mailadres
+        # zodat een tweede signup-poging gewoon werkt en oude tokens dood zijn.
+        conn.execute(
+            "DELETE FROM email_verifications WHERE email = ? AND consumed_at IS NULL",
+            (email,)
+        )
+        conn.execute(
+            """INSERT INTO email_verifications
+               (token, email, password_hash, tenant_id, created_at, expires_at, ip)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (token, email, pw_hash, TRIAL_TENANT_SLUG,
+             now_dt.isoformat(), exp_dt.isoformat(), ip)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    _rate_register_failure("trial_signup", ip,
+                           TRIAL_SIGNUP_MAX_PER_DAY, TRIAL_SIGNUP_WINDOW, TRIAL_SIGNUP_LOCKOUT)
+
+    # Stuur de verificatiemail. Gebruik TRIAL_HOST als die expliciet gezet is
+    # (legacy subdomein-setup), anders het canonieke domein van deze server.
+    # Scheme volgt de huidige request (https in productie achter ProxyFix, http lokaal).
+    _verify_host = _trial_host or _tenant_host
+    verify_url = f"{request.scheme}://{_verify_host}/trial/verify/{token}"
+    _send_verify_email(email, verify_url)
+
+    return render_template("trial_signup_done.html", email=email,
+                                  ttl_hours=TRIAL_VERIFY_TOKEN_TTL_HRS, **ctx)
+
+
+@bp.route("/trial/verify/<token>")
+def trial_verify(token):
+    if not TRIAL_ENABLED:
+        abort(404)
+
+    ctx = {
+        "base_css": BASE_CSS, "bg": BG_DIV, "head_icon": HTML_HEAD_ICON,
+    }
+
+    # Token-formaat valideren voordat we de DB raken
+    if not re.match(r"^[a-f0-9]{32}$", token or ""):
+        return render_template("trial_verify_fail.html",
+                                      reason="De verificatielink is ongeldig.", **ctx), 400
+
+    conn = db()
+    try:
+        row = conn.execute(
+            "SELECT id, email, password_hash, tenant_id, expires_at, consumed_at "
+            "FROM email_verifications WHERE token = ?",
+            (token,)
+        ).fetchone()
+        if row is None:
+            return render_template("trial_verify_fail.html",
+                                          reason="Deze verificatielink is niet (meer) geldig.", **ctx), 404
+        if row["consumed_at"]:
+            # Idempotent: al geactiveerd. Stuur door naar success-pagina, niet error.
+            return render_template("trial_verify_ok.html", **ctx)
+        exp_dt = parse_dt_utc(row["expires_at"])
+        if exp_dt is None or exp_dt <= datetime.now(timezone.utc):
+            return render_template("trial_verify_fail.html",
+                                          reason="Deze verificatielink is verlopen. Meld je opnieuw aan.", **ctx), 410
+
+        # Race-window: in de tussentijd kan een andere user met hetzelfde adres
+        # zijn aangemaakt (bijv. via betaalde flow). Check nogmaals.
+        if _email_already_in_use(row["email"]):
+            # Markeer als consumed zodat de token dood is.
+            conn.execute(
+                "UPDATE email_verifications SET consumed_at = ? WHERE id = ?",
+                (datetime.now(timezone.utc).isoformat(), row["id"])
+            )
+            conn.commit()
+            return render_template("trial_verify_fail.html",
+                                          reason="Voor dit e-mailadres bestaat al een account. Log in of vraag een wachtwoord-reset aan.", **ctx), 409
+
+        # Maak het user-account aan + markeer token als consumed in één transactie.
+        with conn:
+            conn.execute(
+                """INSERT INTO users (email, password_hash, is_admin, tenant_id,
+                                      created_at, disabled, is_trial, email_verified)
+                   VALUES (?, ?, 0, ?, ?, 0, 1, 1)""",
+                (row["email"], row["password_hash"], row["tenant_id"],
+                 datetime.now(timezone.utc).isoformat())
+            )
+            conn.execute(
+                "UPDATE email_verifications SET consumed_at = ? WHERE id = ?",
+                (datetime.now(timezone.utc).isoformat(), row["id"])
+            )
+    finally:
+        conn.close()
+
+    return render_template("trial_verify_ok.html", **ctx)
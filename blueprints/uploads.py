@@ -0,0 +1,899 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+blueprints/uploads.py
+---------------------
+Upload-API (package-init, put-*, mpu-*, package-finalize, package-clone) en
+de pagina 'Mijn uploads'. De upload-pagina zelf ("/") blijft in app.py.
+
+De job 'package_copy' hoort bij /package-clone en wordt daarom hier
+geregistreerd: een deployment zonder deze blueprint maakt die jobs niet aan
+en hoeft ze ook niet uit te voeren.
+"""
+
+import os, secrets, sqlite3, uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from flask import Blueprint, abort, jsonify, redirect, request, session, url_for
+from botocore.exceptions import BotoCoreError, ClientError
+from werkzeug.security import generate_password_hash
+from werkzeug.utils import secure_filename
+
+from checksums import crc32_from_b64, crc32_of_parts
+from app import (
+    BASE_CSS, BG_DIV, CONTENT_HASH_RE, DEDUP_MIN_BYTES, HTML_HEAD_ICON, MAX_TITLE_LENGTH,
+    MY_UPLOADS_PASSWORD, NEVER_EXPIRES_ISO, NEW_TOKEN_BYTES, S3_BUCKET, TRIAL_MAX_BYTES_PER_PACKAGE,
+    TRIAL_MAX_TTL_DAYS, UPLOAD_CHECKSUMS, UPLOAD_DEDUP, _async_delete_s3_keys, _build_package_tree,
+    _drop_package_tree, _enforce_storage_quota, _enforce_trial_active_count, _enforce_trial_ttl,
+    _ensure_package_tree, _flash, _invalidate_pkg_cache, _is_pkg_expired, _package_bytes, _pop_flash,
+    _releasable_s3_keys, clamp_expiry_days, current_tenant, current_user, current_user_id, db,
+    format_nl_datetime, human, is_valid_token, jobs, log, logged_in, normalize_rel_path, parse_dt_utc,
+    render_template, s3,
+)
+
+bp = Blueprint("uploads", __name__)
+
+
+# -------------- Upload API --------------
+def _package_settings(data: dict, is_trial_user: bool) -> tuple:
+    """
+    (expires_at, password_hash, title) voor een nieuw pakket uit de
+    request-data, of een (error, message)-tuple als een trial-restrictie
+    geschonden wordt. Gedeeld door /package-init en /package-clone.
+    """
+    raw_expiry = data.get("expiry_days")
+    is_never = isinstance(raw_expiry, str) and raw_expiry.strip().lower() == "never"
+
+    # Trial-restricties: geen 'never' (onbeperkt), TTL gecapped, geen wachtwoord.
+    if is_trial_user:
+        if is_never:
+            return None, ("trial_no_unlimited",
+                          f"Onbeperkt geldige links zitten in de betaalde variant. Trial-pakketten zijn maximaal {int(TRIAL_MAX_TTL_DAYS)} dagen geldig.")
+        days = clamp_expiry_days(raw_expiry or TRIAL_MAX_TTL_DAYS)
+        days = _enforce_trial_ttl(days)
+        expires_at = (datetime.now(timezone.utc) + timedelta(days=days)).isoformat()
+    elif is_never:
+        expires_at = NEVER_EXPIRES_ISO
+    else:
+        days = clamp_expiry_days(raw_expiry or 24)
+        expires_at = (datetime.now(timezone.utc) + timedelta(days=days)).isoformat()
+
+    pw   = (data.get("password") or "")[:200]
+    if is_trial_user and pw:
+        return None, ("trial_no_password", "Wachtwoord-bescherming op pakketten zit in de betaalde variant.")
+
+    title_raw = (data.get("title") or "").strip()
+    title = title_raw[:MAX_TITLE_LENGTH] if title_raw else None
+    pw_hash = generate_password_hash(pw) if pw else None
+    return (expires_at, pw_hash, title), None
+
+@bp.route("/package-init", methods=["POST"])
+def package_init():
+    if not logged_in(): abort(401)
+    uid = current_user_id()
+    if not uid: abort(401)
+    me = current_user()
+    is_trial_user = bool(me and me["is_trial"])
+    data = request.get_json(force=True, silent=True) or {}
+    settings, err = _package_settings(data, is_trial_user)
+    if err:
+        return jsonify(ok=False, error=err[0], message=err[1]), 403
+    expires_at, pw_hash, title = settings
+    token = secrets.token_hex(NEW_TOKEN_BYTES)  # 16 hex = 64 bits entropie
+    t = current_tenant()["slug"]
+    c = db()
+    try:
+        # Trial: max aantal actieve pakketten check (hier, in transactie-window).
+        if is_trial_user:
+            ok, msg = _enforce_trial_active_count(c, uid)
+            if not ok:
+                return jsonify(ok=False, error="trial_max_active", message=msg), 403
+        c.execute("""INSERT INTO packages(token,expires_at,password_hash,created_at,title,tenant_id,owner_user_id)
+                     VALUES(?,?,?,?,?,?,?)""",
+                  (token, expires_at, pw_hash, datetime.now(timezone.utc).isoformat(), title, t, uid))
+        c.commit()
+    finally:
+        c.close()
+    return jsonify(ok=True, token=token)
+    
+def _user_owns_package(conn, token: str, user_id: int, tenant_slug: str) -> bool:
+    """Return True als het pakket van deze user is (admin mag alles binnen tenant)."""
+    row = conn.execute(
+        "SELECT owner_user_id FROM packages WHERE token = ? AND tenant_id = ?",
+        (token, tenant_slug)
+    ).fetchone()
+    if row is None:
+        return False
+    if row["owner_user_id"] == user_id:
+        return True
+    # Admin-fallback: admin mag in eigen tenant alles
+    u = current_user()
+    if u and u["is_admin"] and u["tenant_id"] == tenant_slug:
+        return True
+    return False
+
+@bp.route("/put-init", methods=["POST"])
+def put_init():
+    if not logged_in(): abort(401)
+    uid = current_user_id()
+    if not uid: abort(401)
+    me = current_user()
+    is_trial_user = bool(me and me["is_trial"])
+    d = request.get_json(force=True, silent=True) or {}
+    token = (d.get("token") or "").strip(); filename = secure_filename(d.get("filename") or "")
+    content_type = (d.get("contentType") or "application/octet-stream").strip() or "application/octet-stream"
+    client_size = int(d.get("clientSize") or 0)
+    checksum = (d.get("checksum") or "").strip()
+    if not is_valid_token(token) or not filename:
+        return jsonify(ok=False, error="Onvolledige init (PUT)"), 400
+    t = current_tenant()["slug"]
+    # Verifieer ownership + trial-grootte-limiet (vooraf weigeren scheelt
+    # weggegooid uploadwerk én B2-kosten).
+    conn = db()
+    try:
+        if not _user_owns_package(conn, token, uid, t):
+            return jsonify(ok=False, error="forbidden"), 403
+        if is_trial_user and client_size > 0:
+            current_total = _package_bytes(conn, token, t)
+            if current_total + client_size > TRIAL_MAX_BYTES_PER_PACKAGE:
+                gb = TRIAL_MAX_BYTES_PER_PACKAGE / (1024**3)
+                return jsonify(ok=False, error="trial_size_limit",
+                               message=f"Pakket zou groter worden dan {gb:.0f} GB (trial-limiet). Upgrade voor grotere uploads."), 403
+        ok, msg = _enforce_storage_quota(conn, t, client_size)
+        if not ok:
+            return jsonify(ok=False, error="quota_exceeded", message=msg), 403
+    finally:
+        conn.close()
+    key = f"uploads/{t}/{token}/{uuid.uuid4().hex[:8]}__{filename}"
+    params = {"Bucket": S3_BUCKET, "Key": key, "ContentType": content_type}
+    headers = {}
+    if UPLOAD_CHECKSUMS and crc32_from_b64(checksum) is not None:
+        # Ondertekende header: de PUT moet hem meesturen en S3 controleert de data.
+        params["ChecksumCRC32"] = checksum
+        headers["x-amz-checksum-crc32"] = checksum
+    try:
+        url = s3.generate_presigned_url("put_object", Params=params, ExpiresIn=3600, HttpMethod="PUT")
+        return jsonify(ok=True, key=key, url=url, headers=headers)
+    except Exception:
+        log.exception("put_init failed")
+        return jsonify(ok=False, error="server_error"), 500
+
+@bp.route("/put-complete", methods=["POST"])
+def put_complete():
+    if not logged_in(): abort(401)
+    uid = current_user_id()
+    if not uid: abort(401)
+    d = request.get_json(force=True, silent=True) or {}
+    token = (d.get("token") or "").strip(); key = (d.get("key") or "").strip(); name = (d.get("name") or "").strip()
+    path  = normalize_rel_path(d.get("path") or name, name)
+    content_hash = (d.get("hash") or "").strip().lower()
+    checksum = crc32_from_b64((d.get("checksum") or "").strip())
+    if not (is_valid_token(token) and key and name):
+        return jsonify(ok=False, error="Onvolledig afronden (PUT)"), 400
+    t = current_tenant()["slug"]
+    # Verifieer ownership + key-prefix matcht
+    if not key.startswith(f"uploads/{t}/{token}/"):
+        return jsonify(ok=False, error="invalid_key"), 400
+
+    conn = db()
+    try:
+        if not _user_owns_package(conn, token, uid, t):
+            return jsonify(ok=False, error="forbidden"), 403
+
+        # Haal de echte size op via S3 HEAD. De client-side meegegeven size
+        # is niet te vertrouwen (kan gemanipuleerd zijn).
+        try:
+            if UPLOAD_CHECKSUMS:
+                head = s3.head_object(Bucket=S3_BUCKET, Key=key, ChecksumMode="ENABLED")
+            else:
+                head = s3.head_object(Bucket=S3_BUCKET, Key=key)
+        except (ClientError, BotoCoreError):
+            log.exception("put_complete HEAD failed: %s", key)
+            return jsonify(ok=False, error="server_error"), 500
+        size = int(head.get("ContentLength", 0))
+        # Alleen de CRC die S3 zelf rapporteert wordt opgeslagen; die van de
+        # client dient hier als controle.
+        crc32 = crc32_from_b64(head.get("ChecksumCRC32")) if UPLOAD_CHECKSUMS else None
+        if crc32 is not None and checksum is not None and crc32 != checksum:
+            log.warning("put_complete checksum mismatch: %s", key)
+            try:
+                s3.delete_object(Bucket=S3_BUCKET, Key=key)
+            except Exception:
+                log.exception("checksum mismatch cleanup failed: %s", key)
+            return jsonify(ok=False, error="checksum_mismatch",
+                           message="Het bestand is onderweg beschadigd geraakt. Probeer opnieuw."), 400
+
+        # Trial post-check: ondanks pre-check in put-init kan een gemanipuleerde
+        # clientSize een te grote upload doorlaten. Hier verifieren we tegen de
+        # ECHTE size en ruimen op als de limiet alsnog overschreden wordt.
+        me = current_user()
+        if me and me["is_trial"]:
+            current_total = _package_bytes(conn, token, t)
+            if current_total + size > TRIAL_MAX_BYTES_PER_PACKAGE:
+                gb = TRIAL_MAX_BYTES_PER_PACKAGE / (1024**3)
+                # Verwijder het zojuist geüploade S3-object — niet in DB inserten.
+                try:
+                    s3.delete_object(Bucket=S3_BUCKET, Key=key)
+                except Exception:
+                    log.exception("trial limit cleanup failed: %s", key)
+                return jsonify(ok=False, error="trial_size_limit",
+                               message=f"Pakket overschrijdt {gb:.0f} GB (trial-limiet). Upload geweigerd."), 403
+        # Quotum tegen de ECHTE grootte (clientSize in put-init is niet te vertrouwen).
+        ok, msg = _enforce_storage_quota(conn, t, size)
+        if not ok:
+            try:
+                s3.delete_object(Bucket=S3_BUCKET, Key=key)
+            except Exception:
+                log.exception("quota cleanup failed: %s", key)
+            return jsonify(ok=False, error="quota_exceeded", message=msg), 403
+
+        try:
+            new_blob = False
+            if UPLOAD_DEDUP and CONTENT_HASH_RE.match(content_hash) and size >= DEDUP_MIN_BYTES:
+                # Eerste object met deze inhoud wordt de blob; bestaat hij al
+                # (gelijktijdige upload), dan blijft dit item een los object.
+                new_blob = conn.execute(
+                    """INSERT OR IGNORE INTO blobs(tenant_id,hash,size_bytes,s3_key,created_at)
+                       VALUES(?,?,?,?,?)""",
+                    (t, content_hash, size, key, datetime.now(timezone.utc).isoformat())
+                ).rowcount == 1
+            conn.execute("""INSERT INTO items(token,s3_key,name,path,size_bytes,tenant_id,content_hash,crc32)
+                         VALUES(?,?,?,?,?,?,?,?)""",
+                      (token, key, name, path, size, t, content_hash if new_blob else None, crc32))
+            _drop_package_tree(conn, t, token)
+            if new_blob:
+                jobs.enqueue("blob_verify", {"tenant": t, "hash": content_hash}, conn=conn)
+            conn.commit()
+        except Exception:
+            # DB-insert gefaald: ruim S3-object op om wees-object te voorkomen.
+            log.exception("put_complete DB insert failed, deleting orphan S3 object: %s", key)
+            try:
+                s3.delete_object(Bucket=S3_BUCKET, Key=key)
+            except Exception:
+                log.exception("orphan delete failed: %s", key)
+            return jsonify(ok=False, error="server_error"), 500
+
+        return jsonify(ok=True)
+    finally:
+        conn.close()
+
+@bp.route("/put-dedup", methods=["POST"])
+def put_dedup():
+    """
+    Koppel een bestand aan een bestaande blob met dezelfde inhoud (zie
+    UPLOAD_DEDUP). Response {"ok": true, "linked": true|false}; bij false
+    uploadt de client gewoon via /put-init + /put-complete.
+    """
+    if not logged_in(): abort(401)
+    uid = current_user_id()
+    if not uid: abort(401)
+    d = request.get_json(force=True, silent=True) or {}
+    token = (d.get("token") or "").strip(); name = (d.get("name") or "").strip()
+    path  = normalize_rel_path(d.get("path") or name, name)
+    content_hash = (d.get("hash") or "").strip().lower()
+    try:
+        size = int(d.get("size") or 0)
+    except (TypeError, ValueError):
+        size = 0
+    if not (is_valid_token(token) and name and CONTENT_HASH_RE.match(content_hash)):
+        return jsonify(ok=False, error="Onvolledige dedup-aanvraag"), 400
+    if not UPLOAD_DEDUP or size < DEDUP_MIN_BYTES:
+        return jsonify(ok=True, linked=False)
+    t = current_tenant()["slug"]
+    me = current_user()
+    conn = db()
+    try:
+        if not _user_owns_package(conn, token, uid, t):
+            return jsonify(ok=False, error="forbidden"), 403
+        # Schrijf-lock vóór de lookup: een gelijktijdige delete van de laatste
+        # referentie kan de blob dan niet tussen lookup en insert weghalen.
+        conn.execute("BEGIN IMMEDIATE")
+        blob = conn.execute(
+            "SELECT s3_key FROM blobs WHERE tenant_id = ? AND hash = ? AND size_bytes = ? AND verified = 1",
+            (t, content_hash, size)
+        ).fetchone()
+        if not blob:
+            conn.rollback()
+            return jsonify(ok=True, linked=False)
+        if me and me["is_trial"] and _package_bytes(conn, token, t) + size > TRIAL_MAX_BYTES_PER_PACKAGE:
+            conn.rollback()
+            gb = TRIAL_MAX_BYTES_PER_PACKAGE / (1024**3)
+            return jsonify(ok=False, error="trial_size_limit",
+                           message=f"Pakket zou groter worden dan {gb:.0f} GB (trial-limiet). Upgrade voor grotere uploads."), 403
+        ok, msg = _enforce_storage_quota(conn, t, size)
+        if not ok:
+            conn.rollback()
+            return jsonify(ok=False, error="quota_exceeded", message=msg), 403
+        conn.execute("""INSERT INTO items(token,s3_key,name,path,size_bytes,tenant_id,content_hash,crc32)
+                     VALUES(?,?,?,?,?,?,?,(SELECT crc32 FROM items WHERE s3_key = ? LIMIT 1))""",
+                  (token, blob["s3_key"], name, path, size, t, content_hash, blob["s3_key"]))
+        _drop_package_tree(conn, t, token)
+        conn.commit()
+    finally:
+        conn.close()
+    return jsonify(ok=True, linked=True)
+
+@bp.route("/mpu-init", methods=["POST"])
+def mpu_init():
+    if not logged_in(): abort(401)
+    uid = current_user_id()
+    if not uid: abort(401)
+    me = current_user()
+    is_trial_user = bool(me and me["is_trial"])
+    data = request.get_json(force=True, silent=True) or {}
+    token = (data.get("token") or "").strip()
+    filename = secure_filename(data.get("filename") or "")
+    content_type = (data.get("contentType") or "application/octet-stream").strip() or "application/octet-stream"
+    client_size = int(data.get("clientSize") or 0)
+    checksum = UPLOAD_CHECKSUMS and bool(data.get("checksum"))
+    if not is_valid_token(token) or not filename:
+        return jsonify(ok=False, error="Onvolledige init (MPU)"), 400
+    t = current_tenant()["slug"]
+    conn = db()
+    try:
+        if not _user_owns_package(conn, token, uid, t):
+            return jsonify(ok=False, error="forbidden"), 403
+        if is_trial_user and client_size > 0:
+            current_total = _package_bytes(conn, token, t)
+            if current_total + client_size > TRIAL_MAX_BYTES_PER_PACKAGE:
+                gb = TRIAL_MAX_BYTES_PER_PACKAGE / (1024**3)
+                return jsonify(ok=False, error="trial_size_limit",
+                               message=f"Pakket zou groter worden dan {gb:.0f} GB (trial-limiet). Upgrade voor grotere uploads."), 403
+        ok, msg = _enforce_storage_quota(conn, t, client_size)
+        if not ok:
+            return jsonify(ok=False, error="quota_exceeded", message=msg), 403
+    finally:
+        conn.close()
+    key = f"uploads/{t}/{token}/{uuid.uuid4().hex[:8]}__{filename}"
+    try:
+        extra = {"ChecksumAlgorithm": "CRC32"} if checksum else {}
+        init = s3.create_multipart_upload(Bucket=S3_BUCKET, Key=key, ContentType=content_type, **extra)
+        # checksum=true: elke part moet bij /mpu-sign zijn CRC32 meegeven.
+        return jsonify(ok=True, key=key, uploadId=init["UploadId"], checksum=checksum)
+    except Exception:
+        log.exception("mpu_init failed")
+        return jsonify(ok=False, error="server_error"), 500
+
+@bp.route("/mpu-sign", methods=["POST"])
+def mpu_sign():
+    if not logged_in(): abort(401)
+    uid = current_user_id()
+    if not uid: abort(401)
+    data = request.get_json(force=True, silent=True) or {}
+    key = data.get("key"); upload_id = data.get("uploadId")
+    part_no = int(data.get("partNumber") or 0)
+    checksum = (data.get("checksum") or "").strip()
+    if not key or not upload_id or part_no<=0:
+        return jsonify(ok=False, error="Onvolledig sign"), 400
+    # Key moet binnen tenant zijn en token eruit halen om ownership te checken
+    t = current_tenant()["slug"]
+    prefix = f"uploads/{t}/"
+    if not key.startswith(prefix):
+        return jsonify(ok=False, error="invalid_key"), 400
+    rest = key[len(prefix):]
+    token_from_key = rest.split("/", 1)[0] if "/" in rest else ""
+    if not is_valid_token(token_from_key):
+        return jsonify(ok=False, error="invalid_key"), 400
+    conn = db()
+    try:
+        if not _user_owns_package(conn, token_from_key, uid, t):
+            return jsonify(ok=False, error="forbidden"), 403
+    finally:
+        conn.close()
+    params = {"Bucket": S3_BUCKET, "Key": key, "UploadId": upload_id, "PartNumber": part_no}
+    headers = {}
+    if UPLOAD_CHECKSUMS and crc32_from_b64(checksum) is not None:
+        params["ChecksumCRC32"] = checksum
+        headers["x-amz-checksum-crc32"] = checksum
+    try:
+        url = s3.generate_presigned_url("upload_part", Params=params, ExpiresIn=3600, HttpMethod="PUT")
+        return jsonify(ok=True, url=url, headers=headers)
+    except Exception:
+        log.exception("mpu_sign failed")
+        return jsonify(ok=False, error="server_error"), 500
+
+@bp.route("/mpu-complete", methods=["POST"])
+def mpu_complete():
+    if not logged_in(): abort(401)
+    uid = current_user_id()
+    if not uid: abort(401)
+    data      = request.get_json(force=True, silent=True) or {}
+    token     = (data.get("token") or "").strip(); key = (data.get("key") or "").strip()
+    name      = (data.get("name") or "").strip();  path = normalize_rel_path(data.get("path") or name, name)
+    parts_in  = data.get("parts") or []; upload_id = data.get("uploadId")
+    client_size = int(data.get("clientSize") or 0)
+    if not (is_valid_token(token) and key and name and parts_in and upload_id):
+        return jsonify(ok=False, error="Onvolledig afronden (ontbrekende velden)"), 400
+    t = current_tenant()["slug"]
+    if not key.startswith(f"uploads/{t}/{token}/"):
+        return jsonify(ok=False, error="invalid_key"), 400
+    conn = db()
+    try:
+        if not _user_owns_package(conn, token, uid, t):
+            conn.close()
+            return jsonify(ok=False, error="forbidden"), 403
+    except Exception:
+        conn.close()
+        raise
+    # Stap 1: de parts zoals S3 ze heeft ontvangen. De ETags van de client
+    # moeten daarmee kloppen; ETag en CRC32 voor de complete komen van S3.
+    try:
+        stored = {}
+        for page in s3.get_paginator("list_parts").paginate(Bucket=S3_BUCKET, Key=key, UploadId=upload_id):
+            for sp in page.get("Parts") or []:
+                stored[sp["PartNumber"]] = sp
+    except (ClientError, BotoCoreError):
+        log.exception("mpu_complete list_parts failed: %s", key)
+        conn.close()
+        return jsonify(ok=False, error="mpu_complete_failed"), 500
+    parts, used = [], []
+    for p in sorted(parts_in, key=lambda p: int(p.get("PartNumber") or 0) if isinstance(p, dict) else 0):
+        sp = stored.get(int(p.get("PartNumber") or 0)) if isinstance(p, dict) else None
+        if sp is None or sp["ETag"].strip('"') != str(p.get("ETag") or "").strip('"'):
+            conn.close()
+            return jsonify(ok=False, error="part_mismatch",
+                           message="Een deel van de upload ontbreekt of is beschadigd. Probeer opnieuw."), 400
+        part = {"PartNumber": sp["PartNumber"], "ETag": sp["ETag"]}
+        if sp.get("ChecksumCRC32"):
+            part["ChecksumCRC32"] = sp["ChecksumCRC32"]
+        parts.append(part)
+        used.append(sp)
+    # CRC32 van het hele object uit de (door S3 gecontroleerde) part-CRC's.
+    crc32 = crc32_of_parts((crc32_from_b64(sp.get("ChecksumCRC32")), int(sp["Size"])) for sp in used) \
+        if UPLOAD_CHECKSUMS else None
+    # Stap 2: MPU afronden. Als dit faalt, abort de MPU zodat er geen weeszones overblijven.
+    try:
+        s3.complete_multipart_upload(
+            Bucket=S3_BUCKET, Key=key,
+            MultipartUpload={"Parts": parts},
+            UploadId=upload_id
+        )
+    except (ClientError, BotoCoreError):
+        log.exception("mpu_complete failed")
+        try:
+            s3.abort_multipart_upload(Bucket=S3_BUCKET, Key=key, UploadId=upload_id)
+        except Exception:
+            log.exception("mpu abort after complete-fail failed: %s", key)
+        conn.close()
+        return jsonify(ok=False, error="mpu_complete_failed"), 500
+    # Stap 3: head_object voor groottebepaling.
+    try:
+        size = 0
+        try:
+            head = s3.head_object(Bucket=S3_BUCKET, Key=key)
+            size = int(head.get("ContentLength", 0))
+        except Exception:
+            if client_size>0: size = client_size
+            else: raise
+        # Trial post-check: zie put_complete. Bij overschrijding ruim de
+        # zojuist gemerge-de MPU op via delete_object.
+        me = current_user()
+        if me and me["is_trial"]:
+            current_total = _package_bytes(conn, token, t)
+            if current_total + size > TRIAL_MAX_BYTES_PER_PACKAGE:
+                gb = TRIAL_MAX_BYTES_PER_PACKAGE / (1024**3)
+                try:
+                    s3.delete_object(Bucket=S3_BUCKET, Key=key)
+                except Exception:
+                    log.exception("trial limit cleanup failed: %s", key)
+                conn.close()
+                return jsonify(ok=False, error="trial_size_limit",
+                               message=f"Pakket overschrijdt {gb:.0f} GB (trial-limiet). Upload geweigerd."), 403
+        ok, msg = _enforce_storage_quota(conn, t, size)
+        if not ok:
+            try:
+                s3.delete_object(Bucket=S3_BUCKET, Key=key)
+            except Exception:
+                log.exception("quota cleanup failed: %s", key)
+            conn.close()
+            return jsonify(ok=False, error="quota_exceeded", message=msg), 403
+        # Stap 4: DB insert. Als deze faalt, ruim het S3-object op anders wees-object in B2.
+        try:
+            conn.execute("""INSERT INTO items(token,s3_key,name,path,size_bytes,tenant_id,crc32)
+                         VALUES(?,?,?,?,?,?,?)""",
+                      (token, key, name, path, size, t, crc32))
+            _drop_package_tree(conn, t, token)
+            conn.commit()
+        except Exception:
+            log.exception("mpu_complete DB insert failed, deleting orphan S3 object: %s", key)
+            try:
+                s3.delete_object(Bucket=S3_BUCKET, Key=key)
+            except Exception:
+                log.exception("orphan delete failed: %s", key)
+            raise
+        conn.close()
+        return jsonify(ok=True)
+    except Exception:
+        conn.close()
+        log.exception("mpu_complete failed (generic)")
+        return jsonify(ok=False, error="server_error"), 500
+        
+@bp.route("/package-finalize", methods=["POST"])
+def package_finalize():
+    """
+    Door de upload-pagina aangeroepen als alle bestanden binnen zijn: bouwt de
+    mappenboom vooraf op, zodat de eerste bezoeker van een groot pakket niet
+    op die berekening hoeft te wachten. Optioneel — zonder deze call wordt de
+    boom bij de eerste view alsnog opgebouwd.
+    """
+    if not logged_in(): abort(401)
+    uid = current_user_id()
+    if not uid: abort(401)
+    d = request.get_json(force=True, silent=True) or {}
+    token = (d.get("token") or "").strip()
+    if not is_valid_token(token):
+        return jsonify(ok=False, error="bad_token"), 400
+    t = current_tenant()["slug"]
+    conn = db()
+    try:
+        if not _user_owns_package(conn, token, uid, t):
+            return jsonify(ok=False, error="forbidden"), 403
+        _build_package_tree(conn, t, token)
+        root = _ensure_package_tree(conn, t, token)
+        return jsonify(ok=True, files=root["file_count"], bytes=root["total_bytes"])
+    except sqlite3.Error:
+        log.exception("package_finalize failed")
+        return jsonify(ok=False, error="server_error"), 500
+    finally:
+        conn.close()
+
+# Server-side kopie bij /package-clone?copy=1. Objecten tot COPY_MULTIPART_
+# THRESHOLD via één copy_object, groter via upload_part_copy in delen.
+PACKAGE_COPY_PARALLEL = int(os.environ.get("PACKAGE_COPY_PARALLEL", "8"))
+_copy_transfer = None
+
+def _copy_transfer_config():
+    global _copy_transfer
+    if _copy_transfer is None:
+        from boto3.s3.transfer import TransferConfig  # lazy: trekt boto3 binnen
+        _copy_transfer = TransferConfig(
+            multipart_threshold=1024 * 1024 * 1024,
+            multipart_chunksize=256 * 1024 * 1024,
+            max_concurrency=4,
+        )
+    return _copy_transfer
+
+@bp.route("/package-clone", methods=["POST"])
+def package_clone():
+    """
+    Deel een bestaand pakket opnieuw: nieuw token met eigen vervaldatum,
+    wachtwoord en titel, zonder opnieuw te uploaden.
+
+    Body: {"token": bron, "expiry_days", "password", "title", "copy": false}
+    Standaard verwijzen de nieuwe items naar dezelfde S3-objecten (een object
+    wordt pas verwijderd als geen enkel item er nog naar verwijst). Met
+    "copy": true maakt job 'package_copy' daarna server-side kopieën, zodat
+    beide pakketten eigen objecten hebben; de link werkt meteen.
+    """
+    if not logged_in(): abort(401)
+    uid = current_user_id()
+    if not uid: abort(401)
+    me = current_user()
+    is_trial_user = bool(me and me["is_trial"])
+    data = request.get_json(force=True, silent=True) or {}
+    src = (data.get("token") or "").strip()
+    if not is_valid_token(src):
+        return jsonify(ok=False, error="bad_token"), 400
+    copy = bool(data.get("copy"))
+    settings, err = _package_settings(data, is_trial_user)
+    if err:
+        return jsonify(ok=False, error=err[0], message=err[1]), 403
+    expires_at, pw_hash, title = settings
+    token = secrets.token_hex(NEW_TOKEN_BYTES)
+    t = current_tenant()["slug"]
+    c = db()
+    try:
+        if not _user_owns_package(c, src, uid, t):
+            return jsonify(ok=False, error="forbidden"), 403
+        c.execute("BEGIN IMMEDIATE")
+        # Binnen de lock: cleanup_expired kan de bron niet meer tussendoor
+        # opruimen. Een verlopen bron wordt niet opnieuw gedeeld.
+        src_pkg = c.execute("SELECT expires_at FROM packages WHERE token = ? AND tenant_id = ?", (src, t)).fetchone()
+        if src_pkg is None:
+            c.rollback()
+            return jsonify(ok=False, error="not_found"), 404
+        if _is_pkg_expired(src_pkg):
+            c.rollback()
+            return jsonify(ok=False, error="expired"), 410
+        if is_trial_user:
+            ok, msg = _enforce_trial_active_count(c, uid)
+            if not ok:
+                c.rollback()
+                return jsonify(ok=False, error="trial_max_active", message=msg), 403
+        ok, msg = _enforce_storage_quota(c, t, _package_bytes(c, src, t))
+        if not ok:
+            c.rollback()
+            return jsonify(ok=False, error="quota_exceeded", message=msg), 403
+        c.execute("""INSERT INTO packages(token,expires_at,password_hash,created_at,title,tenant_id,owner_user_id)
+                     VALUES(?,?,?,?,?,?,?)""",
+                  (token, expires_at, pw_hash, datetime.now(timezone.utc).isoformat(), title, t, uid))
+        # Bij copy geen content_hash: die items krijgen straks een eigen object.
+        n = c.execute(
+            f"""INSERT INTO items(token,s3_key,name,path,size_bytes,tenant_id,content_hash,crc32)
+                SELECT ?, s3_key, name, path, size_bytes, tenant_id, {'NULL' if copy else 'content_hash'}, crc32
+                  FROM items WHERE token = ? AND tenant_id = ? ORDER BY id""",
+            (token, src, t)
+        ).rowcount
+        if not n:
+            # Niets te delen (bron leeg of al opgeschoond): geen lege link maken.
+            c.rollback()
+            return jsonify(ok=False, error="empty_package"), 409
+        if copy:
+            jobs.enqueue("package_copy", {"tenant": t, "token": token}, conn=c)
+        c.commit()
+    finally:
+        c.close()
+    return jsonify(ok=True, token=token, items=n, copy=copy)
+
+def _job_package_copy(payload: dict) -> None:
+    """
+    Kopieer de objecten van een gekloond pakket server-side naar het eigen
+    prefix (uploads/<tenant>/<token>/) en zet items.s3_key om. Niets verlaat
+    de storage-provider. Mislukte kopieën laten de job falen; een retry pakt
+    alleen de items op die nog naar een ander prefix wijzen.
+    """
+    t, token = payload["tenant"], payload["token"]
+    prefix = f"uploads/{t}/{token}/"
+    conn = db()
+    try:
+        rows = conn.execute(
+            "SELECT id, s3_key FROM items WHERE token = ? AND tenant_id = ? AND substr(s3_key, 1, ?) <> ?",
+            (token, t, len(prefix), prefix)
+        ).fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        return
+
+    def copy_one(row):
+        new_key = f"{prefix}{uuid.uuid4().hex[:8]}__{row['s3_key'].rsplit('__', 1)[-1]}"
+        try:
+            s3.copy({"Bucket": S3_BUCKET, "Key": row["s3_key"]}, S3_BUCKET, new_key, Config=_copy_transfer_config())
+        except (ClientError, BotoCoreError):
+            log.exception("package_copy failed: %s", row["s3_key"])
+            return None
+        return row["id"], row["s3_key"], new_key
+
+    with ThreadPoolExecutor(max_workers=min(PACKAGE_COPY_PARALLEL, len(rows))) as pool:
+        results = list(pool.map(copy_one, rows))
+    done = [r for r in results if r]
+
+    conn = db()
+    try:
+        with conn:
+            old_keys, stale = [], []
+            for item_id, old_key, new_key in done:
+                if conn.execute("UPDATE items SET s3_key = ? WHERE id = ? AND s3_key = ?",
+                                (new_key, item_id, old_key)).rowcount:
+                    old_keys.append(old_key)
+                else:
+                    stale.append(new_key)  # item intussen verwijderd: kopie is een wees
+            # Oude objecten alleen weg als ook het bronpakket er niet meer naar verwijst.
+            _async_delete_s3_keys(_releasable_s3_keys(conn, old_keys) + stale, conn=conn)
+    finally:
+        conn.close()
+    _invalidate_pkg_cache(t, token)
+    if len(done) < len(rows):
+        raise RuntimeError(f"{len(rows) - len(done)} van {len(rows)} kopieën mislukt")
+
+jobs.register("package_copy", _job_package_copy, workers=1, priority=80, max_attempts=5,
+              lease_seconds=3600, backoff_base=60)
+
+
+# ============================================================
+# MY UPLOADS: gebruiker ziet/beheert eigen uploads
+# ============================================================
+
+
+def _package_summary(rows, now):
+    """Bereken samenvatting van packagelijst."""
+    pkg_count = len(rows)
+    active = 0
+    expired = 0
+    total = 0
+    for r in rows:
+        total += int(r.get("size_bytes") or 0)
+        exp = parse_dt_utc(r["expires_at"])
+        if exp is None or exp <= now:
+            expired += 1
+        else:
+            active += 1
+    return {
+        "pkg_count": pkg_count,
+        "active": active,
+        "expired": expired,
+        "total_human": human(total),
+    }
+
+@bp.route("/uploads")
+def my_uploads():
+    if not logged_in():
+        return redirect(url_for("login"))
+    me = current_user()
+    if not me:
+        session.clear()
+        return redirect(url_for("login"))
+
+    show_all = bool(me["is_admin"]) and (request.args.get("scope") == "all")
+    tenant = me["tenant_id"]
+
+    conn = db()
+    try:
+        # Aantal bestanden en grootte staan al op packages (item_count /
+        # total_bytes, bijgehouden door triggers); alleen de downloads worden
+        # nog geaggregeerd, in één GROUP BY ipv een subquery per pakket.
+        if show_all:
+            rows = conn.execute("""
+                SELECT p.token, p.title, p.expires_at, p.created_at, p.password_hash,
+                       p.owner_user_id, u.email AS owner_email,
+                       p.item_count                  AS item_count,
+                       p.total_bytes                 AS size_bytes,
+                       COALESCE(d.download_count, 0) AS download_count,
+                       d.last_download_at            AS last_download_at
+                FROM packages p
+                LEFT JOIN users u ON u.id = p.owner_user_id
+                LEFT JOIN (
+                    SELECT token, tenant_id,
+                           COUNT(*)             AS download_count,
+                           MAX(downloaded_at)   AS last_download_at
+                    FROM download_events
+                    WHERE tenant_id = ?
+                    GROUP BY token, tenant_id
+                ) d ON d.token = p.token AND d.tenant_id = p.tenant_id
+                WHERE p.tenant_id = ?
+                ORDER BY p.created_at DESC
+            """, (tenant, tenant)).fetchall()
+        else:
+            rows = conn.execute("""
+                SELECT p.token, p.title, p.expires_at, p.created_at, p.password_hash,
+                       p.owner_user_id, ? AS owner_email,
+                       p.item_count                  AS item_count,
+                       p.total_bytes                 AS size_bytes,
+                       COALESCE(d.download_count, 0) AS download_count,
+                       d.last_download_at            AS last_download_at
+                FROM packages p
+                LEFT JOIN (
+                    SELECT token, tenant_id,
+                           COUNT(*)             AS download_count,
+                           MAX(downloaded_at)   AS last_download_at
+                    FROM download_events
+                    WHERE tenant_id = ?
+                    GROUP BY token, tenant_id
+                ) d ON d.token = p.token AND d.tenant_id = p.tenant_id
+                WHERE p.tenant_id = ? AND p.owner_user_id = ?
+                ORDER BY p.created_at DESC
+            """, (me["email"], tenant, tenant, me["id"])).fetchall()
+    finally:
+        conn.close()
+
+    now = datetime.now(timezone.utc)
+    packages = []
+    # Bescherming voor de openen-/kopieer-knoppen gebeurt nu client-side in de
+    # browser (prompt voor 1234 voor de knop iets doet). Geen server-side
+    # unlock-state meer; alle pakketten krijgen direct hun share-link mee.
+    for r in rows:
+        exp = parse_dt_utc(r["expires_at"]) or now
+        is_expired = exp <= now
+        # Onbeperkt geldig: vervaldatum staat ver in de toekomst (>= jaar 9000)
+        is_never = exp.year >= 9000
+        days_left = max(0, (exp - now).days) if not is_expired else 0
+        packages.append({
+            "token": r["token"],
+            "title": r["title"],
+            "expires_at": r["expires_at"],
+            "created_at": r["created_at"],
+            "item_count": int(r["item_count"] or 0),
+            "size_bytes": int(r["size_bytes"] or 0),
+            "size_human": human(int(r["size_bytes"] or 0)),
+            "has_password": bool(r["password_hash"]),
+            "is_expired": is_expired,
+            "is_never": is_never,
+            "days_left": days_left,
+            "owner_email": r["owner_email"],
+            "download_count": int(r["download_count"] or 0),
+            "last_download_at": format_nl_datetime(r["last_download_at"]),
+            "share_link": url_for("downloads.package_page", token=r["token"], _external=True),
+        })
+
+    summary = _package_summary([dict(r) for r in rows], now)
+    msg, err = _pop_flash()
+
+    return render_template(
+        "my_uploads.html",
+        packages=packages,
+        summary=summary,
+        show_all=show_all,
+        is_admin=bool(me["is_admin"]),
+        user=me["email"],
+        flash_msg=msg, flash_err=err,
+        base_css=BASE_CSS, bg=BG_DIV, head_icon=HTML_HEAD_ICON,
+        uploads_pw=MY_UPLOADS_PASSWORD,
+    )
+
+@bp.route("/uploads/<token>/delete", methods=["POST"])
+def my_uploads_delete(token):
+    if not logged_in(): abort(401)
+    me = current_user()
+    if not me: abort(401)
+    token = (token or "").strip()
+    if not is_valid_token(token):
+        _flash(error="Ongeldig token.")
+        return redirect(url_for("uploads.my_uploads"))
+
+    conn = db()
+    try:
+        pkg = conn.execute(
+            "SELECT token, owner_user_id, tenant_id FROM packages WHERE token = ? AND tenant_id = ?",
+            (token, me["tenant_id"])
+        ).fetchone()
+        if not pkg:
+            _flash(error="Pakket niet gevonden.")
+            return redirect(url_for("uploads.my_uploads"))
+        if pkg["owner_user_id"] != me["id"] and not me["is_admin"]:
+            _flash(error="Geen rechten om dit pakket te verwijderen.")
+            return redirect(url_for("uploads.my_uploads"))
+
+        items = conn.execute(
+            "SELECT s3_key FROM items WHERE token = ? AND tenant_id = ?",
+            (token, me["tenant_id"])
+        ).fetchall()
+        with conn:
+            conn.execute("DELETE FROM items WHERE token = ? AND tenant_id = ?", (token, me["tenant_id"]))
+            _drop_package_tree(conn, me["tenant_id"], token)
+            conn.execute("DELETE FROM packages WHERE token = ? AND tenant_id = ?", (token, me["tenant_id"]))
+            # S3-objects via de job-queue; gedeelde (dedup-)objecten blijven staan.
+            _async_delete_s3_keys(_releasable_s3_keys(conn, [it["s3_key"] for it in items]), conn=conn)
+        _invalidate_pkg_cache(me["tenant_id"], token)
+        _flash(msg=f"Pakket verwijderd ({len(items)} bestand(en) uit opslag).")
+    finally:
+        conn.close()
+    # Behoud scope-parameter
+    scope = request.args.get("scope") or request.referrer or ""
+    if "scope=all" in scope:
+        return redirect(url_for("uploads.my_uploads", scope="all"))
+    return redirect(url_for("uploads.my_uploads"))
+
+@bp.route("/uploads/<token>/extend", methods=["POST"])
+def my_uploads_extend(token):
+    if not logged_in(): abort(401)
+    me = current_user()
+    if not me: abort(401)
+    token = (token or "").strip()
+    if not is_valid_token(token):
+        _flash(error="Ongeldig token.")
+        return redirect(url_for("uploads.my_uploads"))
+
+    conn = db()
+    try:
+        pkg = conn.execute(
+            "SELECT token, owner_user_id, expires_at FROM packages WHERE token = ? AND tenant_id = ?",
+            (token, me["tenant_id"])
+        ).fetchone()
+        if not pkg:
+            _flash(error="Pakket niet gevonden.")
+            return redirect(url_for("uploads.my_uploads"))
+        if pkg["owner_user_id"] != me["id"] and not me["is_admin"]:
+            _flash(error="Geen rechten om dit pakket te verlengen.")
+            return redirect(url_for("uploads.my_uploads"))
+
+        current_exp = parse_dt_utc(pkg["expires_at"]) or datetime.now(timezone.utc)
+        # Onbeperkt geldige pakketten hoeven (en kunnen) niet verlengd worden:
+        # +7 dagen op een datum in jaar 9999 zou overflowen.
+        if current_exp.year >= 9000:
+            _flash(msg="Dit pakket is al onbeperkt geldig.")
+            return redirect(url_for("uploads.my_uploads"))
+        # Verleng met 7 dagen vanaf de huidige vervaldatum (of nu, als al verlopen)
+        base = max(current_exp, datetime.now(timezone.utc))
+        new_exp = base + timedelta(days=7)
+        conn.execute(
+            "UPDATE packages SET expires_at = ? WHERE token = ? AND tenant_id = ?",
+            (new_exp.isoformat(), token, me["tenant_id"])
+        )
+        conn.commit()
+        _invalidate_pkg_cache(me["tenant_id"], token)
+        _flash(msg=f"Pakket verlengd tot {new_exp.strftime('%d-%m-%Y %H:%M')}.")
+    finally:
+        conn.close()
+    return redirect(url_for("uploads.my_uploads"))
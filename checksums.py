@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+checksums.py
+------------
+CRC32-hulpjes voor upload-integriteit (UPLOAD_CHECKSUMS).
+
+We gebruiken CRC32 (IEEE, zlib-polynoom) omdat het zowel een S3 flexible
+checksum is (x-amz-checksum-crc32, door de provider gecontroleerd bij de PUT)
+als precies de CRC die een ZIP-entry draagt. Eén checksum volstaat dus voor
+de upload én voor de controle bij het zippen.
+
+S3 levert de CRC base64-gecodeerd (4 bytes big-endian). Bij een multipart-
+upload geeft S3 per part een CRC; crc32_combine() rekent daaruit de CRC van
+het hele object uit zonder de data opnieuw te lezen (zelfde algoritme als
+zlib's crc32_combine, dat Python's zlib-module niet exporteert).
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import re
+
+CRC32_B64_RE = re.compile(r"^[A-Za-z0-9+/]{6}==$")
+
+_CRC32_POLY = 0xEDB88320  # gereflecteerd IEEE-polynoom
+
+
+def crc32_from_b64(value: str | None) -> int | None:
+    """'2nlZSA==' -> int, of None bij een leeg/ongeldig formaat."""
+    if not value or not CRC32_B64_RE.match(value):
+        return None
+    try:
+        return int.from_bytes(base64.b64decode(value), "big")
+    except (binascii.Error, ValueError):
+        return None
+
+
+def crc32_to_b64(crc: int) -> str:
+    return base64.b64encode((crc & 0xFFFFFFFF).to_bytes(4, "big")).decode("ascii")
+
+
+def _gf2_times(mat: list, vec: int) -> int:
+    out = 0
+    i = 0
+    while vec:
+        if vec & 1:
+            out ^= mat[i]
+        vec >>= 1
+        i += 1
+    return out
+
+
+def _gf2_square(mat: list) -> list:
+    return [_gf2_times(mat, row) for row in mat]
+
+
+def crc32_combine(crc1: int, crc2: int, len2: int) -> int:
+    """CRC32 van A+B, gegeven crc(A), crc(B) en len(B). O(log len2)."""
+    if len2 <= 0:
+        return crc1
+    odd = [_CRC32_POLY] + [1 << i for i in range(31)]  # operator voor 1 nul-bit
+    even = _gf2_square(odd)   # 2 nul-bits
+    odd = _gf2_square(even)   # 4 nul-bits
+    while True:
+        even = _gf2_square(odd)
+        if len2 & 1:
+            crc1 = _gf2_times(even, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+        odd = _gf2_square(even)
+        if len2 & 1:
+            crc1 = _gf2_times(odd, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+    return crc1 ^ crc2
+
+
+def crc32_of_parts(parts) -> int | None:
+    """
+    CRC32 van het hele object uit (crc, size)-paren in partvolgorde, of None
+    als een part geen CRC heeft.
+    """
+    total = None
+    for crc, size in parts:
+        if crc is None:
+            return None
+        total = crc if total is None else crc32_combine(total, crc, size)
+    return total
@@ -144,7 +144,7 @@ def table_has_column(conn: sqlite3.Connection, table: str, col: str) -> bool:
 def make_s3_client():
     """Lazy: alleen importeren wanneer we daadwerkelijk lokaal opruimen."""
     try:
-        import boto3
+        from s3_client import make_s3_client as _make_client
     except ImportError as e:
         raise RuntimeError(
             "boto3 is niet geïnstalleerd. Voor remote-mode is dit niet nodig; "
@@ -154,11 +154,25 @@ def make_s3_client():
     bucket = os.environ["S3_BUCKET"]
     endpoint = os.environ["S3_ENDPOINT_URL"]
     region = os.environ.get("S3_REGION", "eu-central-003")
-    s3 = boto3.client("s3", region_name=region, endpoint_url=endpoint)
+    # Zelfde pool/retry/timeout-config als de webservice (zie s3_client.py).
+    s3 = _make_client(region=region, endpoint_url=endpoint)
     return s3, bucket
 
 # ---------- Local cleanup ----------
 
+def _package_items(cur, token: str, tenant: str | None) -> list:
+    if tenant is not None:
+        return cur.execute("SELECT id, s3_key FROM items WHERE token=? AND tenant_id=?", (token, tenant)).fetchall()
+    return cur.execute("SELECT id, s3_key FROM items WHERE token=?", (token,)).fetchall()
+
+
+def _releasable_keys(cur, keys: list) -> list:
+    """Keys waar na de DELETE's in de lopende transactie geen item meer naar
+    verwijst (zoals app._releasable_s3_keys; dit script importeert app niet)."""
+    return [k for k in dict.fromkeys(keys)
+            if k and not cur.execute("SELECT 1 FROM items WHERE s3_key=? LIMIT 1", (k,)).fetchone()]
+
+
 def cleanup_expired(
     db_path: Path,
     dry_run: bool = False,
@@ -179,6 +193,8 @@ def cleanup_expired(
 
     has_tenant_pkgs = table_has_column(conn, "packages", "tenant_id")
     has_tenant_items = table_has_column(conn, "items", "tenant_id")
+    # Afgeleide mappenboom (app.py); ontbreekt in oudere DB's.
+    has_tree = table_has_column(conn, "package_dirs", "token")
 
     where = "expires_at < ?"
     params: list = [now_iso]
@@ -201,20 +217,48 @@ def cleanup_expired(
     for row in pkgs:
         token = row["token"]
         tenant = row["tenant_id"] if has_tenant_pkgs else None
-
-        if has_tenant_items and tenant is not None:
-            it_rows = cur.execute(
-                "SELECT id, s3_key FROM items WHERE token=? AND tenant_id=?",
-                (token, tenant),
-            ).fetchall()
+        by_tenant = has_tenant_items and tenant is not None
+
+        if dry_run:
+            it_rows = _package_items(cur, token, tenant if by_tenant else None)
+            # Gedeeld object (dedup-blob): blijft staan zolang een ander
+            # pakket er nog naar verwijst.
+            keys = [k for k in dict.fromkeys(it["s3_key"] for it in it_rows)
+                    if k and not cur.execute("SELECT 1 FROM items WHERE s3_key=? AND token<>? LIMIT 1",
+                                             (k, token)).fetchone()]
         else:
-            it_rows = cur.execute(
-                "SELECT id, s3_key FROM items WHERE token=?",
-                (token,),
-            ).fetchall()
-
-        for it in it_rows:
-            key = it["s3_key"]
+            # Rijen verwijderen en vrijgekomen keys bepalen in één schrijf-
+            # transactie; pas na de commit uit S3. Een /put-dedup of
+            # /package-clone die tussendoor een item naar dezelfde key
+            # aanmaakt, wacht dan op de lock (of wint hem), en de key blijft.
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                it_rows = _package_items(cur, token, tenant if by_tenant else None)
+                if by_tenant:
+                    cur.execute("DELETE FROM items WHERE token=? AND tenant_id=?", (token, tenant))
+                else:
+                    cur.execute("DELETE FROM items WHERE token=?", (token,))
+
+                if has_tree:
+                    if tenant is not None:
+                        cur.execute("DELETE FROM package_dirs WHERE token=? AND tenant_id=?", (token, tenant))
+                    else:
+                        cur.execute("DELETE FROM package_dirs WHERE token=?", (token,))
+
+                if has_tenant_pkgs and tenant is not None:
+                    cur.execute("DELETE FROM packages WHERE token=? AND tenant_id=?", (token, tenant))
+                else:
+                    cur.execute("DELETE FROM packages WHERE token=?", (token,))
+                keys = _releasable_keys(cur, [it["s3_key"] for it in it_rows])
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+        for key in dict.fromkeys(it["s3_key"] for it in it_rows):
+            if key and key not in keys:
+                print(f"[SKIP] s3://{bucket}/{key} (nog in gebruik)")
+        for key in keys:
             print(f"[DEL] s3://{bucket}/{key}")
             total_deleted_objects += 1
             if not dry_run:
@@ -223,18 +267,6 @@ def cleanup_expired(
                 except (ClientError, BotoCoreError) as e:
                     print(f"  -> S3 delete failed: {e}")
 
-        if not dry_run:
-            if has_tenant_items and tenant is not None:
-                cur.execute("DELETE FROM items WHERE token=? AND tenant_id=?", (token, tenant))
-            else:
-                cur.execute("DELETE FROM items WHERE token=?", (token,))
-
-            if has_tenant_pkgs and tenant is not None:
-                cur.execute("DELETE FROM packages WHERE token=? AND tenant_id=?", (token, tenant))
-            else:
-                cur.execute("DELETE FROM packages WHERE token=?", (token,))
-            conn.commit()
-
         if verbose:
             tenant_label = f" (tenant {tenant})" if tenant else ""
             print(f"[i] Pakket {token}{tenant_label} opgeschoond — items: {len(it_rows)}")
@@ -19,6 +19,25 @@ om de cleanup-flow te kunnen testen.
   # Specifieke DB
   python3 insert_test_file.py --db /var/data/files_multi.db
 
+Bulk-modus (--bulk): synthetische dataset voor benchmarks van /uploads,
+cleanup_expired en de zip-pipeline. Genereert N tenants, M users per tenant
+en K pakketten, met:
+  * itemaantallen per pakket volgens een machtsverdeling (Pareto, --items-alpha;
+    de meeste pakketten klein, enkele met duizenden bestanden);
+  * log-normaal verdeelde bestandsgroottes (--size-median, --size-sigma);
+  * een mix van verlopen, actieve en onbeperkt geldige pakketten;
+  * download_events-historie tussen aanmaak en verloop.
+Inserts via executemany in transacties van --batch items. De bestaande
+triggers houden packages.total_bytes/item_count en tenant_usage bij.
+Met --s3-endpoint worden bijpassende objecten geüpload (groottes dan
+begrensd op --s3-max-bytes, zodat DB en bucket overeenkomen).
+
+  # 1 miljoen items over 20 tenants (deterministisch via --seed)
+  python3 insert_test_file.py --bulk --tenants 20 --users 10 --packages 50000
+
+  # Kleine set mét objecten in een lokale S3-stand-in
+  python3 insert_test_file.py --bulk --packages 200 --s3-endpoint http://127.0.0.1:5055 --bucket mtbucket
+
 Pad-resolutie:
   1) --db argument
   2) DATA_DIR env var → <DATA_DIR>/files_multi.db
@@ -28,9 +47,12 @@ Pad-resolutie:
 from __future__ import annotations
 
 import argparse
+import math
 import os
+import random
 import sqlite3
 import sys
+import time
 import uuid
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
@@ -68,9 +90,218 @@ def parse_args() -> argparse.Namespace:
     ap.add_argument("--expires-in-days", type=float, default=-1.0,
                     help="Vervaldatum in dagen vanaf nu. Negatief = in het verleden. "
                          "Default: -1 (1 dag geleden verlopen).")
+
+    b = ap.add_argument_group("bulk-generator (--bulk)")
+    b.add_argument("--bulk", action="store_true", help="Genereer een grote synthetische dataset.")
+    b.add_argument("--tenants", type=int, default=5, help="Aantal tenants (default 5). Namen: <tenant><n>.")
+    b.add_argument("--users", type=int, default=5, help="Users per tenant (default 5).")
+    b.add_argument("--packages", type=int, default=1000, help="Pakketten in totaal (default 1000).")
+    b.add_argument("--items-alpha", type=float, default=1.1,
+                   help="Pareto-exponent voor items per pakket; lager = zwaardere staart (default 1.1).")
+    b.add_argument("--max-items", type=int, default=20000, help="Maximum items per pakket (default 20000).")
+    b.add_argument("--size-median", type=int, default=256 * 1024,
+                   help="Mediane bestandsgrootte in bytes (default 256 KiB).")
+    b.add_argument("--size-sigma", type=float, default=2.0,
+                   help="Spreiding (sigma van de log-normale verdeling, default 2.0).")
+    b.add_argument("--expired-ratio", type=float, default=0.3, help="Aandeel verlopen pakketten (default 0.3).")
+    b.add_argument("--never-ratio", type=float, default=0.1,
+                   help="Aandeel onbeperkt geldige pakketten (default 0.1).")
+    b.add_argument("--history-days", type=float, default=365.0,
+                   help="Aanmaakdata verspreid over zoveel dagen terug (default 365).")
+    b.add_argument("--downloads", type=float, default=5.0,
+                   help="Gemiddeld aantal download_events per pakket (default 5).")
+    b.add_argument("--batch", type=int, default=50000, help="Items per transactie (default 50000).")
+    b.add_argument("--seed", type=int, default=1, help="Random seed (default 1).")
+    b.add_argument("--s3-endpoint", default=None, help="Upload bijpassende objecten naar deze S3-stand-in.")
+    b.add_argument("--bucket", default=os.environ.get("S3_BUCKET", ""), help="Bucket voor --s3-endpoint.")
+    b.add_argument("--s3-max-bytes", type=int, default=1024 * 1024,
+                   help="Maximale objectgrootte bij --s3-endpoint (default 1 MiB).")
+    b.add_argument("--s3-parallel", type=int, default=16, help="Gelijktijdige uploads (default 16).")
     return ap.parse_args()
 
 
+# ---------------- Bulk-generator ----------------
+
+NEVER_EXPIRES_ISO = "9999-12-31T23:59:59+00:00"  # zelfde sentinel als app.py
+BULK_TABLES = ("packages", "items", "users", "download_events", "tenant_usage")
+EXTENSIONS = ("pdf", "dwg", "jpg", "png", "docx", "xlsx", "zip", "mp4", "txt", "ifc")
+USER_AGENTS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/126.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_5) AppleWebKit/605.1.15 Version/17.5 Safari/605.1.15",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:127.0) Gecko/20100101 Firefox/127.0",
+)
+
+
+class _S3Uploader:
+    """Parallelle put_object's met de juiste grootte (inhoud: nullen)."""
+
+    def __init__(self, endpoint: str, bucket: str, max_bytes: int, parallel: int):
+        import boto3
+        from concurrent.futures import ThreadPoolExecutor
+        self.s3 = boto3.client("s3", endpoint_url=endpoint,
+                               region_name=os.environ.get("S3_REGION") or "us-east-1")
+        self.bucket = bucket
+        self.buf = bytes(max_bytes)
+        self.pool = ThreadPoolExecutor(max_workers=parallel)
+        self.pending: list = []
+        try:
+            self.s3.head_bucket(Bucket=bucket)
+        except Exception:
+            self.s3.create_bucket(Bucket=bucket)
+
+    def put(self, key: str, size: int) -> None:
+        self.pending.append(self.pool.submit(self.s3.put_object, Bucket=self.bucket, Key=key,
+                                             Body=self.buf[:size]))
+
+    def wait(self) -> None:
+        for fut in self.pending:
+            fut.result()
+        self.pending.clear()
+
+    def close(self) -> None:
+        self.wait()
+        self.pool.shutdown()
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def bulk_main(args: argparse.Namespace, conn: sqlite3.Connection) -> None:
+    missing = [t for t in BULK_TABLES if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (t,)).fetchone()]
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(packages)")}
+    if missing or not {"tenant_id", "owner_user_id", "total_bytes"} <= cols:
+        print(f"🚫 Schema is niet up-to-date (ontbreekt: {missing or 'kolommen in packages'}). "
+              f"Start de app één keer tegen deze DB.", file=sys.stderr)
+        sys.exit(4)
+    if args.s3_endpoint and not args.bucket:
+        print("🚫 --s3-endpoint vereist --bucket (of S3_BUCKET).", file=sys.stderr)
+        sys.exit(2)
+
+    rnd = random.Random(args.seed)
+    uploader = _S3Uploader(args.s3_endpoint, args.bucket, args.s3_max_bytes, args.s3_parallel) \
+        if args.s3_endpoint else None
+    max_size = args.s3_max_bytes if uploader else 20 * 1024 ** 3
+    mu = math.log(max(1, args.size_median))
+    now = time.time()
+    day = 86400.0
+
+    # Snellere bulk-load; het blijft testdata.
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")  # 256 MiB
+    conn.execute("PRAGMA foreign_keys = ON")
+
+    # Tenants + users. Een gedeeld wachtwoord ('bulk-test-1234') zodat je als
+    # willekeurige user kunt inloggen op een lokale instance.
+    from werkzeug.security import generate_password_hash
+    pw_hash = generate_password_hash("bulk-test-1234")
+    tenants = [args.tenant] if args.tenants <= 1 else [f"{args.tenant}{i}" for i in range(args.tenants)]
+    conn.executemany(
+        "INSERT OR IGNORE INTO users(email, password_hash, is_admin, tenant_id, created_at, disabled) "
+        "VALUES(?,?,0,?,?,0)",
+        [(f"user{j}@{t}.test", pw_hash, t, _iso(now - args.history_days * day))
+         for t in tenants for j in range(args.users)])
+    conn.commit()
+    owners = {}
+    for t in tenants:
+        ids = [r[0] for r in conn.execute("SELECT id FROM users WHERE tenant_id=? ORDER BY id", (t,))]
+        # Enkele users uploaden veel, de meesten weinig.
+        owners[t] = (ids, [rnd.paretovariate(1.5) for _ in ids])
+    # Ook de tenants zelf verschillen sterk in omvang.
+    tenant_weights = [rnd.paretovariate(1.2) for _ in tenants]
+
+    # Expliciete item-id's (AUTOINCREMENT-reeks vervolgen), zodat download_events
+    # naar bestaande items kunnen verwijzen zonder terug te lezen.
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='items'").fetchone()
+    next_id = max(int(row[0]) if row else 0,
+                  int(conn.execute("SELECT COALESCE(MAX(id), 0) FROM items").fetchone()[0])) + 1
+
+    pkgs, items, events = [], [], []
+    totals = {"packages": 0, "items": 0, "events": 0, "bytes": 0}
+    t_start = time.monotonic()
+
+    def flush():
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            "INSERT INTO packages(token, expires_at, password_hash, created_at, title, tenant_id, owner_user_id) "
+            "VALUES(?,?,NULL,?,?,?,?)", pkgs)
+        conn.executemany(
+            "INSERT INTO items(id, token, s3_key, name, path, size_bytes, tenant_id) VALUES(?,?,?,?,?,?,?)", items)
+        conn.executemany(
+            "INSERT INTO download_events(token, item_id, download_type, downloaded_at, ip, user_agent, tenant_id) "
+            "VALUES(?,?,?,?,?,?,?)", events)
+        conn.commit()
+        if uploader:
+            for it in items:
+                uploader.put(it[2], it[5])
+            uploader.wait()
+        totals["packages"] += len(pkgs)
+        totals["items"] += len(items)
+        totals["events"] += len(events)
+        pkgs.clear(); items.clear(); events.clear()
+        rate = totals["items"] / max(time.monotonic() - t_start, 1e-6)
+        print(f"  … {totals['packages']} pakketten, {totals['items']} items, "
+              f"{totals['events']} events ({rate:,.0f} items/s)")
+
+    for _ in range(args.packages):
+        t = rnd.choices(tenants, tenant_weights)[0]
+        ids, weights = owners[t]
+        owner = rnd.choices(ids, weights)[0] if ids else None
+        token = f"{rnd.getrandbits(64):016x}"
+        created = now - rnd.random() * args.history_days * day
+        r = rnd.random()
+        if r < args.expired_ratio:
+            expires = created + (now - created) * rnd.uniform(0.05, 0.95)
+            expires_iso = _iso(expires)
+        elif r < args.expired_ratio + args.never_ratio:
+            expires, expires_iso = None, NEVER_EXPIRES_ISO
+        else:
+            expires = now + rnd.uniform(1, 60) * day
+            expires_iso = _iso(expires)
+        pkgs.append((token, expires_iso, _iso(created), f"Bulk {token[:6]}", t, owner))
+
+        n_items = min(args.max_items, int(rnd.paretovariate(args.items_alpha)))
+        first_id = next_id
+        for n in range(n_items):
+            name = f"bestand_{n:05d}.{rnd.choice(EXTENSIONS)}"
+            depth = rnd.choice((0, 0, 1, 1, 2))
+            folder = "/".join(f"map{rnd.randrange(8)}" for _ in range(depth))
+            path = f"{folder}/{name}" if folder else name
+            size = max(1, min(max_size, int(rnd.lognormvariate(mu, args.size_sigma))))
+            key = f"uploads/{t}/{token}/{rnd.getrandbits(32):08x}__{name}"
+            items.append((next_id, token, key, name, path, size, t))
+            totals["bytes"] += size
+            next_id += 1
+
+        end = min(now, expires) if expires else now
+        for _ in range(int(rnd.expovariate(1.0 / args.downloads)) if args.downloads > 0 else 0):
+            is_zip = rnd.random() < 0.3
+            events.append((
+                token,
+                None if is_zip else rnd.randrange(first_id, next_id),
+                "zip" if is_zip else "file",
+                _iso(rnd.uniform(created, end)),
+                f"10.{rnd.randrange(256)}.{rnd.randrange(256)}.{rnd.randrange(1, 255)}",
+                rnd.choice(USER_AGENTS),
+                t,
+            ))
+        if len(items) >= args.batch:
+            flush()
+    if pkgs:
+        flush()
+    if uploader:
+        uploader.close()
+
+    print(f"✅ Bulk-dataset toegevoegd in {time.monotonic() - t_start:.1f}s")
+    print(f"Tenants    : {len(tenants)} ({', '.join(tenants[:5])}{', …' if len(tenants) > 5 else ''})")
+    print(f"Users      : {args.users} per tenant (wachtwoord: bulk-test-1234)")
+    print(f"Pakketten  : {totals['packages']}")
+    print(f"Items      : {totals['items']} ({totals['bytes'] / 1024 ** 3:.1f} GiB)")
+    print(f"Downloads  : {totals['events']}")
+
+
 def main() -> None:
     args = parse_args()
     db_path = resolve_db_path(args.db)
@@ -80,6 +311,12 @@ def main() -> None:
         sys.exit(3)
 
     conn = sqlite3.connect(db_path)
+    if args.bulk:
+        try:
+            bulk_main(args, conn)
+        finally:
+            conn.close()
+        return
     try:
         missing = required_tables_present(conn)
         if missing:
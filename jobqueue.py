@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+jobqueue.py
+-----------
+Kleine duurzame job-queue bovenop de bestaande SQLite-database.
+
+Waarom: de oude ThreadPoolExecutor (4 threads, fire-and-forget) verloor alles
+wat nog in de wachtrij stond bij een worker-restart of redeploy, en een
+burst aan S3-deletes kon e-mails minutenlang laten wachten.
+
+Eigenschappen:
+  * Jobs staan in de tabel `jobs` en overleven dus restarts.
+  * Per job-type een eigen pool worker-threads; typen hinderen elkaar niet.
+  * Prioriteit (lager = eerder) en `run_after` voor uitgestelde jobs.
+  * At-least-once: een geclaimde job krijgt een lease. Sterft het proces
+    tijdens de uitvoering, dan pakt een (andere) worker hem na afloop van de
+    lease opnieuw op. Handlers moeten dus idempotent zijn.
+  * Retries met exponentiële backoff; na `max_attempts` gaat de job naar
+    status 'dead' (blijft staan voor inspectie).
+  * Optionele dedupe_key: zolang er een wachtende job met die sleutel is,
+    wordt een nieuwe enqueue genegeerd. Bij het claimen komt de sleutel vrij,
+    zodat werk dat tijdens de uitvoering binnenkomt een nieuwe job krijgt.
+  * Periodieke jobs via schedule(): één scheduler-thread per proces zet ze met
+    een vaste dedupe_key in de queue, dus over alle workers heen hooguit één
+    wachtende job per type.
+
+Geslaagde jobs worden verwijderd; de tabel bevat dus alleen open en dode jobs.
+Elke gunicorn-worker draait zijn eigen threads; claimen gaat via
+BEGIN IMMEDIATE zodat twee processen nooit dezelfde job pakken.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+log = logging.getLogger("jobqueue")
+
+JOBS_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      type TEXT NOT NULL,
+      payload TEXT NOT NULL,
+      priority INTEGER NOT NULL DEFAULT 100,
+      status TEXT NOT NULL DEFAULT 'queued',   -- queued | running | dead
+      attempts INTEGER NOT NULL DEFAULT 0,
+      max_attempts INTEGER NOT NULL DEFAULT 5,
+      run_after REAL NOT NULL,
+      lease_until REAL,
+      locked_by TEXT,
+      dedupe_key TEXT,
+      last_error TEXT,
+      created_at REAL NOT NULL,
+      updated_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(type, status, priority, run_after)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs(dedupe_key) WHERE dedupe_key IS NOT NULL",
+)
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    for stmt in JOBS_DDL:
+        conn.execute(stmt)
+
+
+@dataclass
+class JobType:
+    name: str
+    handler: object
+    workers: int = 1
+    priority: int = 100
+    max_attempts: int = 5
+    lease_seconds: float = 300.0
+    backoff_base: float = 5.0
+    backoff_max: float = 3600.0
+
+
+class PermanentJobError(Exception):
+    """Gooi dit vanuit een handler als opnieuw proberen zinloos is."""
+
+
+class JobQueue:
+    def __init__(self, connect, poll_interval: float = 2.0):
+        """connect: callable die een sqlite3-connectie (row_factory=Row) geeft."""
+        self._connect = connect
+        self.poll_interval = poll_interval
+        self._types: dict[str, JobType] = {}
+        self._wake: dict[str, threading.Event] = {}
+        self._threads: list[threading.Thread] = []
+        self._stop = threading.Event()
+        self._started_pid = None
+        self._worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._counters_lock = threading.Lock()
+        self._counters: dict[str, dict[str, int]] = {}
+        self._schedules: dict[str, float] = {}
+
+    # ---------- Registratie ----------
+
+    def register(self, name: str, handler, **opts) -> None:
+        """Registreer handler(payload: dict) voor job-type `name`."""
+        self._types[name] = JobType(name=name, handler=handler, **opts)
+        self._wake[name] = threading.Event()
+        self._counters[name] = {"done": 0, "retried": 0, "dead": 0}
+
+    def schedule(self, job_type: str, interval: float) -> None:
+        """Zet `job_type` elke `interval` seconden in de queue (vanaf start())."""
+        if job_type not in self._types:
+            raise KeyError(f"onbekend job-type: {job_type}")
+        self._schedules[job_type] = float(interval)
+
+    # ---------- Producer-kant ----------
+
+    def enqueue(self, job_type: str, payload: dict | None = None, *, priority: int | None = None,
+                delay: float = 0.0, dedupe_key: str | None = None, conn=None) -> int | None:
+        """
+        Zet een job in de queue. Geeft het job-id, of None bij een dedupe-hit.
+
+        Met `conn` wordt de insert onderdeel van de lopende transactie van de
+        caller (commit doet de caller): handig om bv. een DB-delete en de
+        bijbehorende S3-delete-job atomair vast te leggen.
+        """
+        jt = self._types.get(job_type)
+        if jt is None:
+            raise KeyError(f"onbekend job-type: {job_type}")
+        now = time.time()
+        params = (
+            job_type, json.dumps(payload or {}, separators=(",", ":")),
+            jt.priority if priority is None else priority,
+            jt.max_attempts, now + max(0.0, delay), dedupe_key, now, now,
+        )
+        sql = """INSERT OR IGNORE INTO jobs(type, payload, priority, max_attempts, run_after,
+                                            dedupe_key, created_at, updated_at)
+                 VALUES(?,?,?,?,?,?,?,?)"""
+        if conn is not None:
+            cur = conn.execute(sql, params)
+        else:
+            own = self._connect()
+            try:
+                cur = own.execute(sql, params)
+                own.commit()
+            finally:
+                own.close()
+        job_id = cur.lastrowid if cur.rowcount else None
+        if job_id and delay <= 0:
+            self._wake[job_type].set()
+        return job_id
+
+    def expedite(self, dedupe_key: str) -> bool:
+        """Zet een wachtende (uitgestelde) job met deze sleutel op 'nu'."""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT type FROM jobs WHERE dedupe_key = ? AND status = 'queued'", (dedupe_key,)
+            ).fetchone()
+            if row is None:
+                return False
+            conn.execute(
+                "UPDATE jobs SET run_after = ?, updated_at = ? WHERE dedupe_key = ? AND status = 'queued'",
+                (time.time(), time.time(), dedupe_key),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        if row["type"] in self._wake:
+            self._wake[row["type"]].set()
+        return True
+
+    # ---------- Worker-kant ----------
+
+    def start(self) -> None:
+        """Start de worker-threads (idempotent per proces)."""
+        if self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+        self._worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop.clear()
+        for jt in self._types.values():
+            for i in range(max(1, jt.workers)):
+                t = threading.Thread(
+                    target=self._worker_loop, args=(jt,),
+                    name=f"job-{jt.name}-{i}", daemon=True,
+                )
+                t.start()
+                self._threads.append(t)
+        if self._schedules:
+            t = threading.Thread(target=self._scheduler_loop, name="job-scheduler", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        for ev in self._wake.values():
+            ev.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads.clear()
+        self._started_pid = None
+
+    def run_pending(self, job_type: str, limit: int = 100) -> int:
+        """Verwerk synchroon tot `limit` klare jobs (voor scripts/tests). Geeft aantal."""
+        jt = self._types[job_type]
+        n = 0
+        while n < limit:
+            job = self._claim(jt)
+            if job is None:
+                break
+            self._execute(jt, job)
+            n += 1
+        return n
+
+    def _worker_loop(self, jt: JobType) -> None:
+        wake = self._wake[jt.name]
+        while not self._stop.is_set():
+            try:
+                job = self._claim(jt)
+            except sqlite3.Error:
+                log.exception("job claim failed (type=%s)", jt.name)
+                job = None
+            if job is None:
+                # Wachten op een lokale enqueue of de volgende poll (jobs van
+                # andere processen, uitgestelde retries, verlopen leases).
+                wake.wait(self.poll_interval)
+                wake.clear()
+                continue
+            self._execute(jt, job)
+
+    def _scheduler_loop(self) -> None:
+        due = {name: time.monotonic() + interval for name, interval in self._schedules.items()}
+        while True:
+            now = time.monotonic()
+            for name, at in due.items():
+                if at > now:
+                    continue
+                due[name] = now + self._schedules[name]
+                try:
+                    self.enqueue(name, dedupe_key=f"schedule:{name}")
+                except sqlite3.Error:
+                    log.exception("scheduled enqueue failed (type=%s)", name)
+            if self._stop.wait(max(0.0, min(due.values()) - time.monotonic())):
+                return
+
+    def _claim(self, jt: JobType):
+        now = time.time()
+        conn = self._connect()
+        try:
+            # Goedkope check zonder write-lock; idle workers pollen dus alleen lezend.
+            cand = conn.execute(
+                """SELECT id FROM jobs
+                   WHERE type = ? AND (
+                         (status = 'queued' AND run_after <= ?)
+                      OR (status = 'running' AND lease_until < ?))
+                   ORDER BY priority, run_after, id LIMIT 1""",
+                (jt.name, now, now),
+            ).fetchone()
+            if cand is None:
+                return None
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """SELECT * FROM jobs
+                   WHERE type = ? AND (
+                         (status = 'queued' AND run_after <= ?)
+                      OR (status = 'running' AND lease_until < ?))
+                   ORDER BY priority, run_after, id LIMIT 1""",
+                (jt.name, now, now),
+            ).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            if row["status"] == "running":
+                log.warning("job %s (%s) lease verlopen bij %s — opnieuw oppakken",
+                            row["id"], jt.name, row["locked_by"])
+            conn.execute(
+                """UPDATE jobs SET status='running', attempts=attempts+1, lease_until=?,
+                                  locked_by=?, dedupe_key=NULL, updated_at=? WHERE id=?""",
+                (now + jt.lease_seconds, self._worker_id, now, row["id"]),
+            )
+            conn.commit()
+            job = dict(row)
+            job["attempts"] += 1
+            job["locked_by"] = self._worker_id  # samen met attempts: wie deze claim heeft
+            return job
+        finally:
+            conn.close()
+
+    def _execute(self, jt: JobType, job: dict) -> None:
+        try:
+            payload = json.loads(job["payload"] or "{}")
+            jt.handler(payload)
+        except PermanentJobError as e:
+            self._finish_failed(jt, job, f"{type(e).__name__}: {e}", permanent=True)
+            return
+        except Exception as e:
+            log.exception("job %s (%s) poging %s faalde", job["id"], jt.name, job["attempts"])
+            self._finish_failed(jt, job, f"{type(e).__name__}: {e}", permanent=False)
+            return
+        conn = self._connect()
+        try:
+            cur = conn.execute("DELETE FROM jobs WHERE id = ? AND locked_by = ? AND attempts = ?",
+                               (job["id"], job["locked_by"], job["attempts"]))
+            conn.commit()
+        finally:
+            conn.close()
+        if not cur.rowcount:
+            self._lease_lost(jt, job)
+            return
+        self._bump(jt.name, "done")
+
+    def _lease_lost(self, jt: JobType, job: dict) -> None:
+        # De lease verliep tijdens de uitvoering en een andere worker heeft de
+        # job opnieuw geclaimd; die rij is nu van hem.
+        log.warning("job %s (%s) poging %s: lease kwijt, resultaat niet vastgelegd",
+                    job["id"], jt.name, job["attempts"])
+
+    def _finish_failed(self, jt: JobType, job: dict, error: str, permanent: bool) -> None:
+        now = time.time()
+        dead = permanent or job["attempts"] >= job["max_attempts"]
+        conn = self._connect()
+        try:
+            if dead:
+                cur = conn.execute(
+                    """UPDATE jobs SET status='dead', lease_until=NULL, locked_by=NULL,
+                                      last_error=?, updated_at=?
+                       WHERE id=? AND locked_by=? AND attempts=?""",
+                    (error[:1000], now, job["id"], job["locked_by"], job["attempts"]),
+                )
+            else:
+                delay = min(jt.backoff_max, jt.backoff_base * (2 ** (job["attempts"] - 1)))
+                delay *= random.uniform(0.8, 1.2)
+                cur = conn.execute(
+                    """UPDATE jobs SET status='queued', lease_until=NULL, locked_by=NULL,
+                                      run_after=?, last_error=?, updated_at=?
+                       WHERE id=? AND locked_by=? AND attempts=?""",
+                    (now + delay, error[:1000], now, job["id"], job["locked_by"], job["attempts"]),
+                )
+            conn.commit()
+        finally:
+            conn.close()
+        if not cur.rowcount:
+            self._lease_lost(jt, job)
+            return
+        if dead:
+            log.error("job %s (%s) opgegeven na %s poging(en): %s", job["id"], jt.name, job["attempts"], error)
+        self._bump(jt.name, "dead" if dead else "retried")
+
+    def _bump(self, name: str, key: str) -> None:
+        with self._counters_lock:
+            self._counters[name][key] += 1
+
+    # ---------- Observability ----------
+
+    def stats(self) -> dict:
+        """Per type: aantallen per status in de DB + tellers van dit proces."""
+        out = {name: {"queued": 0, "running": 0, "dead": 0, "oldest_queued_s": 0.0} for name in self._types}
+        now = time.time()
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                """SELECT type, status, COUNT(*) AS n, MIN(created_at) AS oldest
+                   FROM jobs GROUP BY type, status"""
+            ).fetchall()
+        finally:
+            conn.close()
+        for r in rows:
+            st = out.setdefault(r["type"], {"queued": 0, "running": 0, "dead": 0, "oldest_queued_s": 0.0})
+            st[r["status"]] = r["n"]
+            if r["status"] == "queued" and r["oldest"]:
+                st["oldest_queued_s"] = round(now - r["oldest"], 1)
+        with self._counters_lock:
+            for name, c in self._counters.items():
+                out[name]["process"] = dict(c)
+        return out
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+mailer.py
+---------
+SMTP-verzender met hergebruikte sessies.
+
+Voorheen opende send_email() per bericht een nieuwe verbinding (TCP + STARTTLS
++ AUTH, al snel 0,5–1s naar een externe provider). Bij een golf PayPal-
+webhooks of trial-aanmeldingen betekende dat evenzoveel handshakes.
+
+SMTPMailer houdt een kleine pool open sessies aan:
+  * Maximaal `pool_size` gelijktijdige sessies (semaphore); meer verzenders
+    wachten op een vrije sessie in plaats van extra verbindingen te openen.
+  * Een sessie die langer dan `noop_after` seconden idle was, wordt eerst
+    met NOOP gecontroleerd; na `idle_seconds` wordt hij gesloten (providers
+    verbreken idle verbindingen zelf ook na een paar minuten).
+  * Valt een hergebruikte sessie weg tijdens het versturen, dan volgt één
+    nieuwe poging op een verse verbinding.
+
+Alleen de standaardbibliotheek; lokaal testen kan met een SMTP-stand-in
+(bv. `python -m aiosmtpd -n -l 127.0.0.1:1025`) en SMTP_STARTTLS=0.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING
+
+# smtplib/email pas bij het eerste bericht importeren: scheelt ~30 ms bij het
+# opstarten van elke worker.
+if TYPE_CHECKING:
+    import smtplib
+    from email.message import EmailMessage
+
+log = logging.getLogger("mailer")
+
+
+class _Session:
+    __slots__ = ("smtp", "last_used")
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+
+
+class SMTPMailer:
+    def __init__(self, host: str | None, port: int, user: str | None, password: str | None,
+                 sender: str | None, *, starttls: bool = True, timeout: float = 20.0,
+                 pool_size: int = 2, idle_seconds: float = 120.0, noop_after: float = 15.0):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.sender = sender
+        self.starttls = starttls
+        self.timeout = timeout
+        self.idle_seconds = idle_seconds
+        self.noop_after = noop_after
+        self._slots = threading.BoundedSemaphore(max(1, pool_size))
+        self._idle: list[_Session] = []
+        self._lock = threading.Lock()
+        self._stats = {
+            "sent": 0, "failed": 0, "connects": 0, "reconnects": 0,
+            "noop_checks": 0, "stale_sessions": 0,
+            "total_ms": 0.0, "max_ms": 0.0,
+        }
+
+    # ---------- Verbinding ----------
+
+    def _connect(self) -> _Session:
+        import smtplib
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.starttls:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.user and self.password:
+                if smtp.has_extn("auth"):
+                    smtp.login(self.user, self.password)
+                else:
+                    log.warning("SMTP-server %s biedt geen AUTH aan; verstuur zonder login", self.host)
+        except Exception:
+            self._close(smtp)
+            raise
+        self._bump("connects")
+        return _Session(smtp)
+
+    @staticmethod
+    def _close(smtp: smtplib.SMTP) -> None:
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def _checkout(self) -> tuple[_Session, bool]:
+        """Geef (sessie, hergebruikt?). Caller heeft al een slot."""
+        import smtplib
+        while True:
+            with self._lock:
+                sess = self._idle.pop() if self._idle else None
+            if sess is None:
+                return self._connect(), False
+            idle = time.monotonic() - sess.last_used
+            if idle > self.idle_seconds:
+                self._close(sess.smtp)
+                continue
+            if idle > self.noop_after:
+                self._bump("noop_checks")
+                try:
+                    code, _ = sess.smtp.noop()
+                except (smtplib.SMTPException, OSError):
+                    code = 0
+                if code != 250:
+                    self._bump("stale_sessions")
+                    self._close(sess.smtp)
+                    continue
+            return sess, True
+
+    def _checkin(self, sess: _Session) -> None:
+        sess.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(sess)
+
+    def close(self) -> None:
+        """Sluit alle idle sessies (bv. bij shutdown of in tests)."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sess in idle:
+            self._close(sess.smtp)
+
+    # ---------- Versturen ----------
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.host and self.sender)
+
+    def send(self, msg: EmailMessage) -> None:
+        """Verstuur één bericht. Gooit smtplib/OSError-excepties door."""
+        import smtplib
+        if not msg["From"]:
+            msg["From"] = self.sender
+        started = time.perf_counter()
+        self._slots.acquire()
+        try:
+            sess, reused = self._checkout()
+            try:
+                sess.smtp.send_message(msg)
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # Server weigerde dit bericht (bv. ontvanger); sessie is nog
+                # bruikbaar na een RSET. Let op: vóór OSError afvangen, want
+                # SMTPException is een subklasse daarvan.
+                try:
+                    sess.smtp.rset()
+                    self._checkin(sess)
+                except Exception:
+                    self._close(sess.smtp)
+                raise
+            except OSError:
+                # Verbinding weg (SMTPServerDisconnected, reset, timeout).
+                self._close(sess.smtp)
+                if not reused:
+                    raise
+                # Hergebruikte sessie bleek dood (ondanks/tussen NOOP): één
+                # nieuwe poging op een verse verbinding.
+                self._bump("reconnects")
+                sess = self._connect()
+                try:
+                    sess.smtp.send_message(msg)
+                except Exception:
+                    self._close(sess.smtp)
+                    raise
+            except Exception:
+                self._close(sess.smtp)
+                raise
+            self._checkin(sess)
+        except Exception:
+            self._bump("failed")
+            raise
+        finally:
+            self._slots.release()
+        ms = (time.perf_counter() - started) * 1000.0
+        with self._lock:
+            self._stats["sent"] += 1
+            self._stats["total_ms"] += ms
+            if ms > self._stats["max_ms"]:
+                self._stats["max_ms"] = ms
+
+    # ---------- Observability ----------
+
+    def _bump(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["idle_sessions"] = len(self._idle)
+        out["avg_ms"] = round(out["total_ms"] / out["sent"], 2) if out["sent"] else 0.0
+        out["total_ms"] = round(out["total_ms"], 2)
+        out["max_ms"] = round(out["max_ms"], 2)
+        return out
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+metrics.py
+----------
+Minimale Prometheus-metrics (text exposition format 0.0.4), zonder externe
+dependencies, met aggregatie over gunicorn-workers.
+
+Elke worker houdt zijn eigen tellers in geheugen bij en schrijft die om de
+`flush_interval` seconden als JSON-snapshot naar `<directory>/<pid>.json`
+(atomair via rename). Bij een scrape schrijft de scrapende worker eerst zijn
+eigen snapshot en voegt daarna alle bestanden samen:
+
+  * Counters en histogrammen worden opgeteld, ook van workers die inmiddels
+    gestopt zijn (anders zouden totalen bij een worker-restart teruglopen).
+  * Gauges worden alleen opgeteld over workers die nog leven.
+
+Gauges van andere workers lopen dus maximaal `flush_interval` achter.
+
+Collectors (`add_collector`) leveren waarden die niet per proces zijn, zoals
+de job-queue in SQLite. Ze worden alleen bij een scrape berekend en niet
+geaggregeerd.
+
+De standaard-directory ligt in /tmp, onder het pid van de gunicorn-master.
+Na een herstart van de master begint alles opnieuw bij 0; Prometheus
+behandelt dat als een gewone counter-reset. Mappen van masters die niet
+meer bestaan worden bij de start opgeruimd.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "Registry", name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = registry._lock
+        self._values: dict = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: labels {sorted(labels)} != {list(self.labelnames)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _export(self) -> dict:
+        with self._lock:
+            samples = [[list(k), v] for k, v in self._values.items()]
+        return {"type": self.kind, "help": self.help, "labels": list(self.labelnames), "samples": samples}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            st = self._values.get(key)
+            if st is None:
+                # [tellers per bucket (niet cumulatief) + overflow, som]
+                st = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    st[0][i] += 1
+                    break
+            else:
+                st[0][-1] += 1
+            st[1] += value
+
+    def _export(self) -> dict:
+        out = super()._export()
+        out["buckets"] = list(self.buckets)
+        with self._lock:
+            out["samples"] = [[list(k), [list(v[0]), v[1]]] for k, v in self._values.items()]
+        return out
+
+
+class Registry:
+    def __init__(self, directory: str | os.PathLike | None = None, flush_interval: float = 5.0):
+        if directory is None:
+            base = os.path.join(tempfile.gettempdir(), "minitransfer-metrics")
+            directory = os.path.join(base, str(os.getppid()))
+            self._cleanup_stale(base)
+        self.directory = str(directory)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list = []
+        self._started_pid = None
+
+    @staticmethod
+    def _cleanup_stale(base: str) -> None:
+        try:
+            entries = os.listdir(base)
+        except FileNotFoundError:
+            return
+        for name in entries:
+            if name.isdigit() and not _pid_alive(int(name)):
+                shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+
+    # ---- Definitie ----
+
+    def _add(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric bestaat al: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._add(Counter(self, name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames=()) -> Gauge:
+        return self._add(Gauge(self, name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(self, name, help, labelnames, buckets))
+
+    def add_collector(self, fn) -> None:
+        """
+        fn() -> iterable van (name, type, help, [(labels_dict, value), ...]).
+        Wordt alleen bij een scrape aangeroepen; fouten worden genegeerd.
+        """
+        self._collectors.append(fn)
+
+    # ---- Snapshots ----
+
+    def flush(self) -> None:
+        data = {"pid": os.getpid(), "at": time.time(),
+                "metrics": {name: m._export() for name, m in list(self._metrics.items())}}
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def start(self) -> None:
+        """Start de flush-thread (idempotent per proces, ook na een fork)."""
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return
+        self._started_pid = pid
+
+        def loop():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+        threading.Thread(target=loop, name="metrics-flush", daemon=True).start()
+        atexit.register(self._flush_quietly)
+
+    def _flush_quietly(self) -> None:
+        try:
+            self.flush()
+        except OSError:
+            pass
+
+    def _merged(self) -> dict:
+        merged: dict = {}
+        try:
+            names = sorted(n for n in os.listdir(self.directory) if n.endswith(".json"))
+        except FileNotFoundError:
+            names = []
+        for fname in names:
+            try:
+                with open(os.path.join(self.directory, fname)) as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = snap.get("pid") == os.getpid() or _pid_alive(int(snap.get("pid") or 0))
+            for name, m in (snap.get("metrics") or {}).items():
+                if m["type"] == "gauge" and not alive:
+                    continue
+                tgt = merged.setdefault(name, {**m, "samples": {}})
+                for labels, value in m["samples"]:
+                    key = tuple(labels)
+                    if m["type"] == "histogram":
+                        cur = tgt["samples"].get(key)
+                        if cur is None or len(cur[0]) != len(value[0]):
+                            tgt["samples"][key] = [list(value[0]), value[1]]
+                        else:
+                            cur[0] = [a + b for a, b in zip(cur[0], value[0])]
+                            cur[1] += value[1]
+                    else:
+                        tgt["samples"][key] = tgt["samples"].get(key, 0.0) + value
+        return merged
+
+    # ---- Exposition ----
+
+    def render(self) -> str:
+        """Alle metrics (alle workers) plus collectors in Prometheus-tekstformaat."""
+        self._flush_quietly()
+        lines = []
+        for name, m in sorted(self._merged().items()):
+            lines.append(f"# HELP {name} {m['help']}")
+            lines.append(f"# TYPE {name} {m['type']}")
+            labelnames = m["labels"]
+            for key, value in sorted(m["samples"].items()):
+                if m["type"] == "histogram":
+                    counts, total = value
+                    cum = 0
+                    for bound, n in zip(list(m["buckets"]) + [math.inf], counts):
+                        cum += n
+                        le = 'le="%s"' % _fmt(bound)
+                        lines.append(f"{name}_bucket{_labels(labelnames, key, le)} {cum}")
+                    lines.append(f"{name}_sum{_labels(labelnames, key)} {_fmt(total)}")
+                    lines.append(f"{name}_count{_labels(labelnames, key)} {cum}")
+                else:
+                    lines.append(f"{name}{_labels(labelnames, key)} {_fmt(value)}")
+        for fn in self._collectors:
+            try:
+                families = list(fn())
+            except Exception:
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_fmt(value)}")
+        return "\n".join(lines) + "\n"
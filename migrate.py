@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+migrate.py
+----------
+Schema-migraties uitvoeren, één keer per deploy en vóór gunicorn start
+(zie startCommand in render.yaml). Daarna hoeven de workers bij het opstarten
+alleen nog de schemaversie te controleren.
+
+  python3 migrate.py              # openstaande migraties + admin-seed
+  python3 migrate.py --status     # versie en overzicht; exit 1 als er iets openstaat
+  python3 migrate.py --to 12      # alleen tot en met versie 12
+
+Gebruikt dezelfde environment als de webservice (DATA_DIR, AUTH_EMAIL, ...).
+De job-workers starten hier niet. Migraties zijn per versie idempotent en
+worden met een bestandslock tegen gelijktijdige runs beschermd.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+# Vóór de import van app: geen versiecheck/auto-migratie bij import, geen
+# job-workers, geen S3-warm-up en geen routes (blueprints) in dit proces.
+os.environ["SCHEMA_ON_START"] = "off"
+os.environ["JOBS_ENABLED"] = "0"
+os.environ["S3_WARMUP"] = "0"
+os.environ["BLUEPRINTS"] = "none"
+
+import app  # noqa: E402
+import migrations  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Voer de schema-migraties van MiniTransfer uit.")
+    ap.add_argument("--status", action="store_true", help="Alleen tonen, niets uitvoeren.")
+    ap.add_argument("--to", type=int, default=None, help="Migreer tot en met deze versie.")
+    return ap.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    conn = app.db()
+    try:
+        have = migrations.applied(conn)
+        version = migrations.current_version(conn)
+    finally:
+        conn.close()
+
+    if args.status:
+        print(f"Database: {app.DB_PATH}")
+        print(f"Schemaversie: {version} (code: {app.SCHEMA_VERSION})")
+        for m in app.SCHEMA_MIGRATIONS:
+            if m.version in have:
+                _, at, ms = have[m.version]
+                print(f"  ✅ {m.version:>3} {m.name:<45} {at[:19]}  {ms:.0f} ms")
+            else:
+                print(f"  ⏳ {m.version:>3} {m.name}")
+        sys.exit(1 if version < app.SCHEMA_VERSION else 0)
+
+    done = app.run_migrations(target=args.to)
+    for v, name, ms in done:
+        print(f"✅ {v:>3} {name} ({ms:.0f} ms)")
+    conn = app.db()
+    try:
+        version = migrations.current_version(conn)
+    finally:
+        conn.close()
+    print(f"Schemaversie: {version} (code: {app.SCHEMA_VERSION})" + ("" if done else " — niets te doen"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+migrations.py
+-------------
+Geversioneerde schema-migraties voor SQLite.
+
+Elke migratie heeft een oplopend versienummer. Uitgevoerde migraties komen in
+de tabel schema_version (versie, naam, tijdstip, duur). Een worker hoeft bij
+het starten dan alleen current_version() op te vragen. De migraties zelf
+draaien één keer per deploy via migrate.py, vóór gunicorn start.
+
+Een migratie is een functie zonder argumenten die zelf een connectie opent en
+commit (zoals de bestaande migrate_*-functies in app.py). Ze moeten idempotent
+blijven: een database van vóór schema_version begint op versie 0 en doorloopt
+alles één keer opnieuw.
+
+apply() neemt een bestandslock (flock) rond de hele run. Twee processen die
+tegelijk migreren (deploy plus een handmatige run, of twee workers met de
+auto-migrate-fallback) wachten zo op elkaar. Wie als tweede de lock krijgt,
+ziet de migraties als al uitgevoerd.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Callable, NamedTuple
+
+try:
+    import fcntl
+except ImportError:  # niet-POSIX: geen lock (alleen voor lokale ontwikkeling)
+    fcntl = None
+
+log = logging.getLogger("migrations")
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    fn: Callable[[], None]
+
+
+def ensure_table(conn) -> None:
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TEXT NOT NULL,
+        duration_ms REAL NOT NULL
+      )
+    """)
+
+
+def current_version(conn) -> int:
+    """Hoogste uitgevoerde versie; 0 als schema_version (nog) niet bestaat."""
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError as e:
+        if "no such table" in str(e):
+            return 0
+        raise
+    return row[0] or 0
+
+
+def applied(conn) -> dict:
+    """versie -> (naam, applied_at, duration_ms) van alle uitgevoerde migraties."""
+    if not current_version(conn):
+        return {}
+    return {r[0]: (r[1], r[2], r[3])
+            for r in conn.execute("SELECT version, name, applied_at, duration_ms FROM schema_version")}
+
+
+def latest_version(migrations) -> int:
+    return max((m.version for m in migrations), default=0)
+
+
+def check_order(migrations) -> None:
+    versions = [m.version for m in migrations]
+    if versions != sorted(set(versions)):
+        raise RuntimeError(f"Migratieversies niet uniek/oplopend: {versions}")
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    if fcntl is None or path is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def apply(connect, migrations, lock_path=None, target: int | None = None,
+          after: Callable[[], None] | None = None) -> list:
+    """
+    Voer alle nog niet uitgevoerde migraties uit (tot en met `target`).
+    `connect` levert een nieuwe connectie (app.db). Returnt [(versie, naam, ms)].
+    `after` (bv. de admin-seed) draait daarna nog binnen dezelfde lock.
+    Een mislukte migratie wordt niet geregistreerd; de exception gaat door.
+    """
+    check_order(migrations)
+    done = []
+    with _file_lock(lock_path):
+        conn = connect()
+        try:
+            ensure_table(conn)
+            conn.commit()
+            have = set(applied(conn))
+        finally:
+            conn.close()
+        for m in migrations:
+            if m.version in have or (target is not None and m.version > target):
+                continue
+            log.info("Migratie %d (%s)…", m.version, m.name)
+            t0 = time.perf_counter()
+            m.fn()
+            ms = round((time.perf_counter() - t0) * 1000, 1)
+            conn = connect()
+            try:
+                conn.execute("INSERT INTO schema_version(version, name, applied_at, duration_ms) VALUES(?,?,?,?)",
+                             (m.version, m.name, datetime.now(timezone.utc).isoformat(), ms))
+                conn.commit()
+            finally:
+                conn.close()
+            done.append((m.version, m.name, ms))
+        if after is not None:
+            after()
+    return done
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+mock_paypal.py
+--------------
+Minimale lokale nabootsing van de PayPal-API voor het testen van de
+webhook-flow (POST /webhook/paypal -> job 'paypal_webhook').
+
+Implementeert alleen wat app.py gebruikt:
+  POST /v1/oauth2/token                           -> access_token
+  POST /v1/notifications/verify-webhook-signature -> verification_status
+
+Gedrag instelbaar via env:
+  MOCK_PAYPAL_VERIFY   SUCCESS (default) of FAILURE
+  MOCK_PAYPAL_DELAY    seconden vertraging per call (trage PayPal nabootsen)
+  MOCK_PAYPAL_FAIL     aantal eerste verify-calls dat met 503 antwoordt
+
+Gebruik:
+  python mock_paypal.py --port 5099
+  # app starten met:
+  #   PAYPAL_API_BASE=http://127.0.0.1:5099 PAYPAL_CLIENT_ID=x \
+  #   PAYPAL_CLIENT_SECRET=y PAYPAL_WEBHOOK_ID=WH-TEST
+
+  # en een webhook afleveren (herhaal met dezelfde --transmission-id om de
+  # dedupe te zien):
+  python mock_paypal.py send --app http://127.0.0.1:5000 \
+      --event BILLING.SUBSCRIPTION.CANCELLED --sub I-TEST123
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_fail_left = int(os.environ.get("MOCK_PAYPAL_FAIL", "0"))
+_fail_lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    def _json(self, status: int, obj: dict) -> None:
+        data = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        global _fail_left
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        delay = float(os.environ.get("MOCK_PAYPAL_DELAY", "0") or 0)
+        if delay:
+            time.sleep(delay)
+
+        if self.path == "/v1/oauth2/token":
+            return self._json(200, {"access_token": "mock-" + uuid.uuid4().hex, "expires_in": 32400})
+
+        if self.path == "/v1/notifications/verify-webhook-signature":
+            with _fail_lock:
+                if _fail_left > 0:
+                    _fail_left -= 1
+                    return self._json(503, {"name": "SERVICE_UNAVAILABLE"})
+            try:
+                body = json.loads(raw or b"{}")
+            except ValueError:
+                return self._json(400, {"name": "INVALID_REQUEST"})
+            if not body.get("webhook_id") or not body.get("transmission_id"):
+                return self._json(400, {"name": "VALIDATION_ERROR"})
+            status = os.environ.get("MOCK_PAYPAL_VERIFY", "SUCCESS").upper()
+            return self._json(200, {"verification_status": status})
+
+        return self._json(404, {"name": "RESOURCE_NOT_FOUND"})
+
+    def log_message(self, fmt, *args):
+        sys.stderr.write("mock-paypal: " + (fmt % args) + "\n")
+
+
+def serve(port: int) -> None:
+    srv = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"mock PayPal op http://127.0.0.1:{port}")
+    srv.serve_forever()
+
+
+def send(app_url: str, event_type: str, sub_id: str, transmission_id: str | None) -> None:
+    event = {
+        "id": "WH-" + uuid.uuid4().hex[:17].upper(),
+        "event_type": event_type,
+        "resource": {"id": sub_id, "status": "ACTIVE"},
+    }
+    req = urllib.request.Request(app_url.rstrip("/") + "/webhook/paypal", method="POST",
+                                 data=json.dumps(event).encode())
+    req.add_header("Content-Type", "application/json")
+    req.add_header("Paypal-Transmission-Id", transmission_id or str(uuid.uuid4()))
+    req.add_header("Paypal-Transmission-Time", time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()))
+    req.add_header("Paypal-Cert-Url", "https://api.sandbox.paypal.com/v1/notifications/certs/mock")
+    req.add_header("Paypal-Auth-Algo", "SHA256withRSA")
+    req.add_header("Paypal-Transmission-Sig", "mock-signature")
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        print(resp.status, resp.read().decode())
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Lokale mock van de PayPal-API")
+    sub = ap.add_subparsers(dest="cmd")
+    ap.add_argument("--port", type=int, default=5099)
+    s = sub.add_parser("send", help="Lever een test-webhook af bij de app")
+    s.add_argument("--app", default="http://127.0.0.1:5000")
+    s.add_argument("--event", default="BILLING.SUBSCRIPTION.ACTIVATED")
+    s.add_argument("--sub", default="I-MOCK" + uuid.uuid4().hex[:8].upper())
+    s.add_argument("--transmission-id", default=None)
+    args = ap.parse_args()
+    if args.cmd == "send":
+        send(args.app, args.event, args.sub, args.transmission_id)
+    else:
+        serve(args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
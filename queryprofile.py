@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+queryprofile.py
+---------------
+Query-profiler voor SQLite: per genormaliseerd statement het aantal
+uitvoeringen, de totale/gemiddelde/maximale duur, het aantal rijen en de
+routes die het statement aanroepen. Rapport via /admin/queries.
+
+Normalisatie: witruimte wordt samengevoegd en variabele IN-lijsten
+('IN (?,?,?)') worden 'IN (?…)'. Zo telt dezelfde query met een andere
+lengte van de id-lijst als één statement. Parameters komen nooit in het
+rapport, alleen de SQL-tekst met placeholders.
+
+Net als metrics.py schrijft elke worker periodiek een JSON-snapshot naar
+`<directory>/<pid>.json`. report() voegt de snapshots van alle workers samen,
+ook van workers die inmiddels gestopt zijn.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+_WS_RE = re.compile(r"\s+")
+_IN_LIST_RE = re.compile(r"\b(IN\s*)\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+
+SORT_KEYS = ("total", "count", "avg", "max", "rows", "slow")
+
+
+def normalize(sql: str) -> str:
+    return _IN_LIST_RE.sub(r"\1(?…)", _WS_RE.sub(" ", sql).strip())
+
+
+class QueryProfiler:
+    def __init__(self, directory: str | os.PathLike | None = None, slow_ms: float = 200.0,
+                 max_queries: int = 500, explain_interval: float = 300.0, flush_interval: float = 5.0):
+        if directory is None:
+            directory = os.path.join(tempfile.gettempdir(), "minitransfer-queries", str(os.getppid()))
+        self.directory = str(directory)
+        self.slow_ms = slow_ms
+        self.max_queries = max_queries
+        self.explain_interval = explain_interval
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._stats: dict = {}      # key -> entry (zie _entry)
+        self._keys: dict = {}       # ruwe sql -> key (SQL-teksten zijn vrijwel altijd literals)
+        self._explained: dict = {}  # key -> monotonic tijd van laatste EXPLAIN
+        self._started_pid = None
+
+    @staticmethod
+    def _entry() -> dict:
+        return {"count": 0, "total": 0.0, "max": 0.0, "rows": 0, "slow": 0, "routes": {}, "plan": None}
+
+    def key(self, sql: str) -> str:
+        k = self._keys.get(sql)
+        if k is None:
+            k = normalize(sql)
+            if len(self._keys) < 4 * self.max_queries:
+                self._keys[sql] = k
+        return k
+
+    # ---- Registratie ----
+
+    def record(self, key: str, duration: float, route: str, rows: int = 0) -> bool:
+        """Registreer één uitvoering. Returnt True als die boven slow_ms zat."""
+        slow = duration * 1000 >= self.slow_ms
+        with self._lock:
+            st = self._stats.get(key)
+            if st is None:
+                if len(self._stats) >= self.max_queries:
+                    key = "<overige statements>"
+                st = self._stats.setdefault(key, self._entry())
+            st["count"] += 1
+            st["total"] += duration
+            if duration > st["max"]:
+                st["max"] = duration
+            st["rows"] += rows
+            routes = st["routes"]
+            if route in routes or len(routes) < 20:
+                routes[route] = routes.get(route, 0) + 1
+            if slow:
+                st["slow"] += 1
+        return slow
+
+    def add_rows(self, key: str, n: int) -> None:
+        with self._lock:
+            st = self._stats.get(key)
+            if st is not None:
+                st["rows"] += n
+
+    def want_explain(self, key: str) -> bool:
+        """Hooguit één EXPLAIN QUERY PLAN per statement per explain_interval."""
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained.get(key)
+            if last is not None and now - last < self.explain_interval:
+                return False
+            self._explained[key] = now
+            return True
+
+    def set_plan(self, key: str, plan: str) -> None:
+        with self._lock:
+            st = self._stats.get(key)
+            if st is not None:
+                st["plan"] = plan
+
+    # ---- Snapshots ----
+
+    def flush(self) -> None:
+        with self._lock:
+            data = {"pid": os.getpid(), "at": time.time(),
+                    "queries": {k: {**v, "routes": dict(v["routes"])} for k, v in self._stats.items()}}
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def _flush_quietly(self) -> None:
+        try:
+            self.flush()
+        except OSError:
+            pass
+
+    def start(self) -> None:
+        """Start de flush-thread (idempotent per proces, ook na een fork)."""
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return
+        self._started_pid = pid
+
+        def loop():
+            while True:
+                time.sleep(self.flush_interval)
+                self._flush_quietly()
+
+        threading.Thread(target=loop, name="queryprofile-flush", daemon=True).start()
+        atexit.register(self._flush_quietly)
+
+    # ---- Rapport ----
+
+    def report(self, sort: str = "total", limit: int = 20) -> dict:
+        """Top-`limit` statements over alle workers, gesorteerd op `sort` (zie SORT_KEYS)."""
+        self._flush_quietly()
+        merged: dict = {}
+        workers = 0
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".json")]
+        except FileNotFoundError:
+            names = []
+        for fname in names:
+            try:
+                with open(os.path.join(self.directory, fname)) as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue
+            workers += 1
+            for key, v in (snap.get("queries") or {}).items():
+                m = merged.setdefault(key, self._entry())
+                for field in ("count", "total", "rows", "slow"):
+                    m[field] += v[field]
+                m["max"] = max(m["max"], v["max"])
+                for route, n in v["routes"].items():
+                    m["routes"][route] = m["routes"].get(route, 0) + n
+                m["plan"] = v["plan"] or m["plan"]
+
+        out = []
+        for key, m in merged.items():
+            count = m["count"] or 1
+            out.append({
+                "sql": key,
+                "count": m["count"],
+                "total_ms": round(m["total"] * 1000, 2),
+                "avg_ms": round(m["total"] * 1000 / count, 3),
+                "max_ms": round(m["max"] * 1000, 2),
+                "rows": m["rows"],
+                "avg_rows": round(m["rows"] / count, 1),
+                "slow": m["slow"],
+                "routes": dict(sorted(m["routes"].items(), key=lambda kv: -kv[1])[:5]),
+                "plan": m["plan"],
+            })
+        field = {"total": "total_ms", "avg": "avg_ms", "max": "max_ms"}.get(sort, sort)
+        out.sort(key=lambda q: q[field], reverse=True)
+        return {"workers": workers, "slow_ms": self.slow_ms, "sort": sort,
+                "statements": len(out), "queries": out[:limit]}
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+reconcile_storage.py
+--------------------
+Ruimt wees-objecten in de bucket op: objecten onder uploads/ waar geen
+items-rij naar verwijst, en multipart-uploads die nooit zijn afgerond.
+
+Die ontstaan als een browser wel via de presigned PUT uploadt maar nooit
+/put-complete aanroept, als een create_multipart_upload nooit wordt afgerond
+of afgebroken, of als een S3-delete na het opruimen van een pakket faalt.
+
+Werkwijze (geheugengebruik onafhankelijk van het aantal objecten):
+  * list_objects_v2 over uploads/<tenant>/ levert keys op volgorde
+    (binaire UTF-8 volgorde).
+  * SELECT s3_key FROM items ... ORDER BY s3_key levert dezelfde volgorde
+    (SQLite BINARY-collatie = UTF-8 bytes = codepoint-volgorde, net als
+    Python's str-vergelijking) — via index idx_items_s3_key.
+  * Een sorted merge van beide stromen vindt S3-keys zonder DB-rij (wees) en
+    DB-rijen zonder S3-object (alleen gerapporteerd, nooit aangepast).
+  * Wezen ouder dan de grace-periode worden per 1000 verwijderd
+    (delete_objects); jongere objecten kunnen uploads in uitvoering zijn.
+  * list_multipart_uploads: uploads ouder dan de grace-periode worden
+    afgebroken (abort_multipart_upload).
+
+Standaard een DRY-RUN: er wordt alleen gerapporteerd. Pas met --apply wordt
+er echt verwijderd.
+
+Voorbeelden:
+  python3 reconcile_storage.py --verbose
+  python3 reconcile_storage.py --tenant oldehanter --grace-hours 48
+  python3 reconcile_storage.py --apply --json
+
+Environment variabelen: zie cleanup_expired.py (DATA_DIR, S3_BUCKET,
+S3_ENDPOINT_URL, S3_REGION, AWS-credentials).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from cleanup_expired import make_s3_client, open_db, resolve_data_dir
+
+DELETE_BATCH = 1000   # max keys per delete_objects
+SAMPLE_SIZE = 20      # aantal voorbeeld-keys per categorie in het rapport
+
+# ---------- Streams ----------
+
+def _iter_s3_objects(s3, bucket: str, prefix: str):
+    """Alle objecten onder prefix, in S3-volgorde (pagina voor pagina)."""
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents") or []:
+            yield obj
+
+
+def _iter_db_keys(conn, prefix: str):
+    """Alle items.s3_key onder prefix, oplopend en zonder duplicaten."""
+    # Bereik-query i.p.v. LIKE: bruikbaar voor de index en geen escaping nodig.
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    cur = conn.execute(
+        "SELECT DISTINCT s3_key FROM items WHERE s3_key >= ? AND s3_key < ? ORDER BY s3_key",
+        (prefix, upper),
+    )
+    for row in cur:
+        yield row[0]
+
+
+# ---------- Reconcile ----------
+
+def reconcile_storage(
+    conn,
+    s3,
+    bucket: str,
+    dry_run: bool = True,
+    only_tenant: str | None = None,
+    grace_hours: float = 24.0,
+    verbose: bool = False,
+) -> dict:
+    """
+    Vergelijk bucket en items-tabel; verwijder (tenzij dry_run) wezen ouder dan
+    grace_hours en breek oude multipart-uploads af. Returnt een rapport-dict.
+    """
+    prefix = f"uploads/{only_tenant}/" if only_tenant else "uploads/"
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=grace_hours)
+    report = {
+        "prefix": prefix, "dry_run": dry_run, "grace_hours": grace_hours,
+        "scanned": 0, "referenced": 0,
+        "orphans": 0, "orphan_bytes": 0, "young_skipped": 0,
+        "deleted": 0, "delete_errors": 0,
+        "missing": 0,
+        "mpu_scanned": 0, "mpu_stale": 0, "mpu_aborted": 0,
+        "samples": {"orphans": [], "missing": [], "mpu": []},
+    }
+    pending: list[str] = []
+
+    def flush():
+        if not pending:
+            return
+        if not dry_run:
+            resp = s3.delete_objects(
+                Bucket=bucket,
+                Delete={"Objects": [{"Key": k} for k in pending], "Quiet": True},
+            )
+            errors = resp.get("Errors") or []
+            report["delete_errors"] += len(errors)
+            report["deleted"] += len(pending) - len(errors)
+            if verbose:
+                print(f"[DEL] batch van {len(pending)} ({len(errors)} fouten)")
+        pending.clear()
+
+    def sample(kind: str, value) -> None:
+        if len(report["samples"][kind]) < SAMPLE_SIZE:
+            report["samples"][kind].append(value)
+
+    def missing(key: str) -> None:
+        report["missing"] += 1
+        sample("missing", key)
+
+    # Sorted merge van S3 (links) en DB (rechts).
+    db_iter = _iter_db_keys(conn, prefix)
+    db_key = next(db_iter, None)
+    for obj in _iter_s3_objects(s3, bucket, prefix):
+        key = obj["Key"]
+        report["scanned"] += 1
+        while db_key is not None and db_key < key:
+            missing(db_key)
+            db_key = next(db_iter, None)
+        if db_key is not None and db_key == key:
+            report["referenced"] += 1
+            db_key = next(db_iter, None)
+            continue
+        # Geen DB-rij: wees, tenzij nog binnen de grace-periode.
+        if obj["LastModified"] > cutoff:
+            report["young_skipped"] += 1
+            continue
+        report["orphans"] += 1
+        report["orphan_bytes"] += int(obj.get("Size") or 0)
+        sample("orphans", key)
+        if verbose:
+            print(f"[WEES] s3://{bucket}/{key} ({obj.get('Size')} bytes, {obj['LastModified']:%Y-%m-%d})")
+        pending.append(key)
+        if len(pending) >= DELETE_BATCH:
+            flush()
+    flush()
+    while db_key is not None:
+        missing(db_key)
+        db_key = next(db_iter, None)
+
+    # Multipart-uploads die nooit zijn afgerond.
+    paginator = s3.get_paginator("list_multipart_uploads")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for up in page.get("Uploads") or []:
+            report["mpu_scanned"] += 1
+            if up["Initiated"] > cutoff:
+                continue
+            report["mpu_stale"] += 1
+            sample("mpu", up["Key"])
+            if verbose:
+                print(f"[MPU] {up['Key']} (gestart {up['Initiated']:%Y-%m-%d %H:%M})")
+            if not dry_run:
+                try:
+                    s3.abort_multipart_upload(Bucket=bucket, Key=up["Key"], UploadId=up["UploadId"])
+                    report["mpu_aborted"] += 1
+                except Exception as e:
+                    print(f"  -> abort failed: {e}", file=sys.stderr)
+
+    return report
+
+
+def format_report(r: dict) -> str:
+    mode = "DRY-RUN" if r["dry_run"] else "APPLY"
+    lines = [
+        f"Reconcile {r['prefix']} [{mode}, grace {r['grace_hours']:g}u]",
+        f"  objecten gescand : {r['scanned']} (gekoppeld {r['referenced']})",
+        f"  wezen            : {r['orphans']} ({r['orphan_bytes'] / 1024**3:.2f} GB)"
+        + (f", verwijderd {r['deleted']}, fouten {r['delete_errors']}" if not r["dry_run"] else ""),
+        f"  te jong (grace)  : {r['young_skipped']}",
+        f"  DB zonder object : {r['missing']}",
+        f"  multipart        : {r['mpu_scanned']} open, {r['mpu_stale']} verouderd"
+        + (f", afgebroken {r['mpu_aborted']}" if not r["dry_run"] else ""),
+    ]
+    for kind, keys in r["samples"].items():
+        for k in keys:
+            lines.append(f"    {kind}: {k}")
+    return "\n".join(lines)
+
+# ---------- main ----------
+
+def main():
+    ap = argparse.ArgumentParser(description="Verwijder wees-objecten en verlaten multipart-uploads uit de bucket.")
+    ap.add_argument("--apply", action="store_true", help="Echt verwijderen (default: dry-run).")
+    ap.add_argument("--tenant", default=None, help="Alleen uploads/<tenant>/.")
+    ap.add_argument("--grace-hours", type=float, default=24.0,
+                    help="Objecten/uploads jonger dan dit blijven staan (default 24).")
+    ap.add_argument("--db", default=None, help="Volledig pad naar files_multi.db (override).")
+    ap.add_argument("--json", action="store_true", help="Rapport als JSON.")
+    ap.add_argument("--verbose", "-v", action="store_true", help="Extra logging.")
+    args = ap.parse_args()
+
+    if args.db:
+        db_path = Path(args.db).expanduser().resolve()
+    else:
+        db_path = (resolve_data_dir(verbose=args.verbose) / "files_multi.db").resolve()
+
+    try:
+        s3, bucket = make_s3_client()
+    except KeyError as e:
+        print(f"[FOUT] Ontbrekende env var: {e}", file=sys.stderr)
+        sys.exit(2)
+    conn = open_db(db_path, verbose=args.verbose)
+    try:
+        report = reconcile_storage(
+            conn, s3, bucket,
+            dry_run=not args.apply,
+            only_tenant=args.tenant,
+            grace_hours=args.grace_hours,
+            verbose=args.verbose,
+        )
+    finally:
+        conn.close()
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
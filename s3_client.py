@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+s3_client.py
+------------
+Eén gedeelde fabriek voor de boto3 S3-client. Wordt gebruikt door app.py
+(webservice) én cleanup_expired.py (local mode), zodat beide dezelfde
+connection-pool, retry- en timeout-instellingen krijgen.
+
+Standaard-boto3 geeft een pool van 10 connecties, 'legacy' retries en ruime
+timeouts. Met --threads=8 plus de zip-prefetch (8 threads per download)
+liepen we tegen die pool aan: requests wachtten op een vrije connectie en
+elke nieuwe connectie kost een TLS-handshake naar B2.
+
+Environment variabelen (allemaal optioneel):
+  S3_MAX_POOL_CONNECTIONS  Max. open connecties per client. Default: 50.
+  S3_CONNECT_TIMEOUT       Connect-timeout in seconden. Default: 5.
+  S3_READ_TIMEOUT          Read-timeout in seconden. Default: 60.
+  S3_MAX_ATTEMPTS          Totaal aantal pogingen (incl. eerste). Default: 5.
+  S3_RETRY_MODE            'adaptive' (default), 'standard' of 'legacy'.
+  S3_TCP_KEEPALIVE         1/0. Default: 1 (houdt idle pool-connecties levend).
+
+Opstarttijd:
+  boto3/botocore worden pas geïmporteerd als er een client gemaakt wordt
+  (samen ~300 ms: imports plus het laden van het S3-servicemodel).
+  lazy_s3_client() stelt ook dat uit tot het eerste gebruik. Zo kan een
+  worker al health-checks beantwoorden voordat S3 nodig is.
+
+Instrumentatie:
+  Elke S3-call (behalve presigning, dat is lokaal) wordt getimed via de
+  botocore event-hooks. Per operatie houden we calls, fouten, retries en
+  latency bij; opvragen via s3_stats(). Extra listeners (metrics, tracing)
+  kunnen zich aanmelden via add_s3_listener(fn); fn krijgt
+  (operation, duration_s, retries, error) en mag niets gooien.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # botocore pas laden bij de eerste client (zie boven)
+    from botocore.config import Config as BotoConfig
+
+# ---------- Config ----------
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, str(default)))
+    except ValueError:
+        return default
+
+
+def client_config(**overrides) -> BotoConfig:
+    """Bouw de BotoConfig uit env vars; overrides winnen (handig voor scripts)."""
+    from botocore.config import Config as BotoConfig
+
+    opts = {
+        "signature_version": "s3v4",
+        "s3": {"addressing_style": "path"},
+        "max_pool_connections": _env_int("S3_MAX_POOL_CONNECTIONS", 50),
+        "connect_timeout": _env_float("S3_CONNECT_TIMEOUT", 5),
+        "read_timeout": _env_float("S3_READ_TIMEOUT", 60),
+        "tcp_keepalive": os.environ.get("S3_TCP_KEEPALIVE", "1").lower() in ("1", "true", "yes"),
+        "retries": {
+            "mode": os.environ.get("S3_RETRY_MODE", "adaptive").strip() or "adaptive",
+            "total_max_attempts": _env_int("S3_MAX_ATTEMPTS", 5),
+        },
+    }
+    opts.update(overrides)
+    return BotoConfig(**opts)
+
+# ---------- Instrumentatie ----------
+
+_stats_lock = threading.Lock()
+_stats: dict[str, dict] = {}
+_listeners: list = []
+
+
+def add_s3_listener(fn) -> None:
+    """Registreer fn(operation, duration_s, retries, error) voor elke S3-call."""
+    if fn not in _listeners:
+        _listeners.append(fn)
+
+
+def _record(operation: str, duration: float, retries: int, error: str | None) -> None:
+    with _stats_lock:
+        st = _stats.get(operation)
+        if st is None:
+            st = _stats[operation] = {
+                "calls": 0, "errors": 0, "retries": 0,
+                "total_ms": 0.0, "max_ms": 0.0,
+            }
+        ms = duration * 1000.0
+        st["calls"] += 1
+        st["retries"] += retries
+        st["total_ms"] += ms
+        if ms > st["max_ms"]:
+            st["max_ms"] = ms
+        if error:
+            st["errors"] += 1
+    for fn in list(_listeners):
+        try:
+            fn(operation, duration, retries, error)
+        except Exception:
+            # Instrumentatie mag een S3-call nooit laten falen.
+            pass
+
+
+def s3_stats() -> dict:
+    """Snapshot per operatie: calls, errors, retries, avg_ms, max_ms."""
+    with _stats_lock:
+        out = {}
+        for op, st in _stats.items():
+            out[op] = dict(st)
+            out[op]["avg_ms"] = round(st["total_ms"] / st["calls"], 2) if st["calls"] else 0.0
+            out[op]["total_ms"] = round(st["total_ms"], 2)
+            out[op]["max_ms"] = round(st["max_ms"], 2)
+        return out
+
+
+def _on_before_call(model=None, context=None, **kwargs):
+    if context is not None:
+        context["_mt_started"] = time.perf_counter()
+
+
+def _on_after_call(http_response=None, parsed=None, model=None, context=None, **kwargs):
+    started = (context or {}).get("_mt_started")
+    if started is None:
+        return
+    meta = (parsed or {}).get("ResponseMetadata") or {}
+    status = getattr(http_response, "status_code", 0) or 0
+    error = None
+    if status >= 300:
+        error = ((parsed or {}).get("Error") or {}).get("Code") or str(status)
+    op = model.name if model is not None else "unknown"
+    _record(op, time.perf_counter() - started, int(meta.get("RetryAttempts") or 0), error)
+
+
+def _on_after_call_error(exception=None, context=None, event_name="", **kwargs):
+    started = (context or {}).get("_mt_started")
+    if started is None:
+        return
+    attempts = int(((context or {}).get("retries") or {}).get("attempt") or 1)
+    op = event_name.rsplit(".", 1)[-1] or "unknown"
+    _record(op, time.perf_counter() - started, max(0, attempts - 1), type(exception).__name__)
+
+# ---------- Fabriek ----------
+
+def make_s3_client(region: str | None = None, endpoint_url: str | None = None, **config_overrides):
+    """Maak een geïnstrumenteerde S3-client met de gedeelde config.
+
+    region/endpoint_url vallen terug op S3_REGION/S3_ENDPOINT_URL.
+    boto3-clients zijn thread-safe; maak er per proces één en deel die.
+    """
+    import boto3
+
+    client = boto3.client(
+        "s3",
+        region_name=region or os.environ.get("S3_REGION", "eu-central-003"),
+        endpoint_url=endpoint_url or os.environ.get("S3_ENDPOINT_URL"),
+        config=client_config(**config_overrides),
+    )
+    events = client.meta.events
+    events.register("before-call.s3", _on_before_call)
+    events.register("after-call.s3", _on_after_call)
+    events.register("after-call-error.s3", _on_after_call_error)
+    return client
+
+
+class LazyS3Client:
+    """
+    Proxy die de echte client pas bij het eerste attribuut maakt (thread-safe).
+    Daarna gaat elk attribuut rechtstreeks naar de client, dus `s3.get_object`
+    enz. werken ongewijzigd. warm() maakt de client alvast, bv. in een
+    achtergrondthread na het opstarten.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def warm(self):
+        client = self._client
+        if client is None:
+            with self._lock:
+                client = self._client
+                if client is None:
+                    client = self._client = self._factory()
+        return client
+
+    @property
+    def loaded(self) -> bool:
+        return self._client is not None
+
+    def __getattr__(self, name):
+        return getattr(self.warm(), name)
+
+
+def lazy_s3_client(region: str | None = None, endpoint_url: str | None = None, **config_overrides) -> LazyS3Client:
+    """Als make_s3_client, maar de client (en boto3) pas bij het eerste gebruik."""
+    return LazyS3Client(lambda: make_s3_client(region, endpoint_url, **config_overrides))
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+tracing.py
+----------
+Lichtgewicht request-tracing: spans (naam, start, duur, attributen) per
+request, zonder externe dependencies.
+
+De lopende trace zit in een contextvar. Spans worden dus aan de juiste request
+gekoppeld, ook met gunicorn --threads. Threads die je zelf start (zip-prefetch,
+ThreadPoolExecutor) erven contextvars niet. Geef daarom `wrap(fn)` mee in
+plaats van `fn`.
+
+Gebruik:
+    trace = tracing.start(request_id, route="/p/<token>")
+    with tracing.span("db", sql="SELECT ..."):
+        ...
+    tracing.add_span("s3.GetObject", duration_s)   # achteraf gemeten
+    trace.server_timing()                           # 'db;dur=3.1;desc="4x", ...'
+    tracing.finish(trace)                           # -> dict voor het JSON-log
+
+Per trace worden maximaal `max_spans` spans bewaard. De totalen per groep
+(het deel vóór de eerste '.') tellen altijd alle spans mee.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import threading
+import time
+
+_current: contextvars.ContextVar = contextvars.ContextVar("mt_trace", default=None)
+_parent: contextvars.ContextVar = contextvars.ContextVar("mt_span", default=None)
+
+
+class Trace:
+    def __init__(self, request_id: str, max_spans: int = 200, **attrs):
+        self.request_id = request_id
+        self.attrs = attrs
+        self.max_spans = max_spans
+        self.t0 = time.perf_counter()
+        self.spans: list = []
+        self.dropped = 0
+        self.totals: dict = {}          # groep -> [aantal, seconden]
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def next_id(self) -> int:
+        with self._lock:
+            self._seq += 1
+            return self._seq
+
+    def add(self, name: str, start: float, duration: float, attrs: dict,
+            parent: int | None = None, span_id: int | None = None) -> None:
+        group = name.split(".", 1)[0]
+        with self._lock:
+            if span_id is None:
+                self._seq += 1
+                span_id = self._seq
+            tot = self.totals.setdefault(group, [0, 0.0])
+            tot[0] += 1
+            tot[1] += duration
+            if len(self.spans) < self.max_spans:
+                span = {"id": span_id, "name": name,
+                        "start_ms": round((start - self.t0) * 1000, 2),
+                        "dur_ms": round(duration * 1000, 2)}
+                if parent:
+                    span["parent"] = parent
+                if attrs:
+                    span.update(attrs)
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.t0
+
+    def server_timing(self) -> str:
+        """Server-Timing-header met per groep de totale duur en het aantal spans."""
+        with self._lock:
+            parts = [f'{g};dur={t * 1000:.1f};desc="{n}x"' for g, (n, t) in sorted(self.totals.items())]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "request_id": self.request_id,
+                **self.attrs,
+                "total_ms": round(self.elapsed() * 1000, 2),
+                "totals": {g: {"count": n, "ms": round(t * 1000, 2)} for g, (n, t) in self.totals.items()},
+                "spans": list(self.spans),
+                "dropped_spans": self.dropped,
+            }
+
+
+def start(request_id: str, max_spans: int = 200, **attrs) -> Trace:
+    trace = Trace(request_id, max_spans=max_spans, **attrs)
+    _current.set(trace)
+    _parent.set(None)
+    return trace
+
+
+def current() -> Trace | None:
+    return _current.get()
+
+
+def finish(trace: Trace | None = None) -> dict | None:
+    """Sluit de trace af (en ontkoppel hem van deze context). Returnt to_dict()."""
+    trace = trace or _current.get()
+    if _current.get() is trace:
+        _current.set(None)
+    return trace.to_dict() if trace else None
+
+
+def add_span(name: str, duration: float, **attrs) -> None:
+    """Registreer een al gemeten span die nu eindigt (no-op zonder trace)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, time.perf_counter() - duration, duration, attrs, _parent.get())
+
+
+class span:
+    """Context manager voor een span; geneste spans krijgen deze als parent."""
+    __slots__ = ("name", "attrs", "_trace", "_t0", "_token", "id")
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self._trace = _current.get()
+        self._t0 = time.perf_counter()
+        self._token = None
+        self.id = None
+        if self._trace is not None:
+            self.id = self._trace.next_id()
+            self._token = _parent.set(self.id)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._trace is None:
+            return False
+        _parent.reset(self._token)
+        attrs = self.attrs
+        if exc_type is not None:
+            attrs = {**attrs, "error": exc_type.__name__}
+        self._trace.add(self.name, self._t0, time.perf_counter() - self._t0, attrs,
+                        parent=_parent.get(), span_id=self.id)
+        return False
+
+    def set(self, **attrs) -> None:
+        """Attributen toevoegen die pas binnen de span bekend worden."""
+        self.attrs = {**self.attrs, **attrs}
+
+
+def traced(name: str):
+    """Decorator: de hele functie-aanroep als één span."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return inner
+    return deco
+
+
+def wrap(fn):
+    """fn zo verpakken dat hij in een andere thread onder de huidige trace draait."""
+    trace, parent = _current.get(), _parent.get()
+    if trace is None:
+        return fn
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        t_tok, p_tok = _current.set(trace), _parent.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _parent.reset(p_tok)
+            _current.reset(t_tok)
+    return run
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+zip_pipeline.py
+---------------
+De ZIP-pipeline achter /zip, los van Flask en boto3 zodat hij apart te
+testen en te tunen is (zie bench/zip_bench.py).
+
+  source = S3ObjectSource(s3, bucket)          # of een eigen bron
+  entries = [ZipEntry("map/a.pdf", "uploads/t/tok/ab__a.pdf", crc32_of_none)]
+  for chunk in ZipPipeline(source, entries, prefetch_workers=8):
+      ...
+
+Een bron heeft één methode: open(key) -> (lengte | None, body). De body moet
+read() (alles) en iter_chunks(n) ondersteunen, net als botocore's
+StreamingBody.
+
+Werking:
+  * Een producer-thread haalt kleine objecten parallel op (prefetch_workers),
+    in een schuivend venster van maximaal prefetch_queue bestanden vooruit.
+    Klein = ZipEntry.size bekend en tot small_file_bytes; die worden in één
+    keer gelezen. Vooruit in het geheugen staat dus hooguit
+    prefetch_queue × small_file_bytes, ook bij 10.000 bestanden.
+  * Grote objecten en objecten zonder bekende grootte (of een 'klein' object
+    dat groter blijkt) worden pas geopend als ze aan de beurt zijn, en dan in
+    chunks gestreamd via één read-ahead-thread (8 chunks). Een open body houdt
+    een S3-connectie vast; vooruit geopend zou hij stil liggen zolang de
+    ontvanger nog met een eerder bestand bezig is, en de gedeelde pool leeg
+    trekken.
+  * De consumer voegt bestanden in volgorde toe en geeft de zip-bytes direct
+    door. De eerste byte gaat dus weg zodra het eerste bestand binnen is, niet
+    pas als alles is opgehaald.
+  * Met een verwachte CRC32 (items.crc32) wordt de inhoud gecontroleerd. Bij
+    een afwijking breekt de stream af met IOError, vóór de data-descriptor
+    van dat bestand. De ontvanger ziet dan een mislukte download in plaats van
+    een stil beschadigd bestand.
+  * Stopt de afnemer (client haakt af, generator.close()), dan stoppen de
+    producer en de read-ahead-threads ook.
+
+AsyncZipPipeline is dezelfde pipeline voor asyncio (asgi.py): dezelfde
+zip-uitvoer, hetzelfde venster en dezelfde CRC-controle. De fetches zijn
+taken op de event loop in plaats van threads; een trage ontvanger kost zo een
+coroutine en wat buffers, geen thread plus prefetch-pool. De bron is dan
+async: `await open(key)` -> (lengte | None, body) met `await body.read()`,
+`body.iter_chunks(n)` (async iterator) en `body.close()`.
+
+  async for chunk in AsyncZipPipeline(source, entries, prefetch_workers=8):
+      ...
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Full, Queue
+from typing import NamedTuple
+
+from zipstream import ZipStream  # zipstream-ng
+
+import tracing
+
+_SENTINEL = object()
+_POLL = 0.5  # s; hoe vaak geblokkeerde threads op annulering controleren
+
+# Sleutel in scope["extensions"] waarmee asgi.py de /zip-view vraagt het
+# streamen aan de server over te laten (zie blueprints/downloads.py).
+HANDOFF_EXTENSION = "minitransfer.zip_handoff"
+
+
+class ZipEntry(NamedTuple):
+    arcname: str
+    key: str
+    crc32: int | None = None  # verwachte CRC32, of None = niet controleren
+    size: int | None = None   # bekende grootte (items.size_bytes), of None
+
+
+class S3ObjectSource:
+    """Objecten uit een S3-bucket via een (gedeelde) boto3-client."""
+
+    def __init__(self, client, bucket: str):
+        self.client = client
+        self.bucket = bucket
+
+    def open(self, key: str):
+        obj = self.client.get_object(Bucket=self.bucket, Key=key)
+        return obj.get("ContentLength"), obj["Body"]
+
+
+class ZipPipeline:
+    def __init__(self, source, entries, *, prefetch_workers: int = 8, prefetch_queue: int = 16,
+                 small_file_bytes: int = 8 * 1024 * 1024, chunk_bytes: int = 1024 * 1024,
+                 verify_crc: bool = True):
+        self.source = source
+        self.entries = list(entries)
+        self.prefetch_workers = max(1, prefetch_workers)
+        self.prefetch_queue = max(1, prefetch_queue)
+        self.small_file_bytes = small_file_bytes
+        self.chunk_bytes = chunk_bytes
+        self.verify_crc = verify_crc
+        self._q: Queue = Queue(maxsize=1)
+        self._cancel = threading.Event()
+        self._error: BaseException | None = None
+
+    # ---- Producer ----
+
+    def _put(self, q: Queue, item) -> bool:
+        """Blokkerende put die afbreekt bij annulering. False = geannuleerd."""
+        while not self._cancel.is_set():
+            try:
+                q.put(item, timeout=_POLL)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _fetch(self, key: str, stream: bool):
+        """
+        Open `key`. Klein: ("bytes", inhoud). Groot: met stream=True
+        ("stream", chunks), anders ("open", None) zodat de consumer hem opent
+        als hij aan de beurt is.
+        """
+        with tracing.span("zip.fetch") as sp:
+            length, body = self.source.open(key)
+            sp.set(bytes=length)
+            if length is not None and length <= self.small_file_bytes:
+                # Klein bestand: 1 keer lezen en doorgeven als bytes.
+                return "bytes", body.read()
+            if not stream:
+                close = getattr(body, "close", None)
+                if close:
+                    close()
+                return "open", None
+        # Groot bestand: read-ahead via een interne chunk-queue, zodat de
+        # download doorloopt terwijl de chunks naar de ontvanger gaan.
+        chunk_q: Queue = Queue(maxsize=8)
+
+        def _read():
+            try:
+                for chunk in body.iter_chunks(self.chunk_bytes):
+                    if chunk and not self._put(chunk_q, chunk):
+                        return
+            except Exception as ex:
+                self._put(chunk_q, ("__ERR__", ex))
+            finally:
+                self._put(chunk_q, None)
+                close = getattr(body, "close", None)
+                if close:
+                    close()
+        threading.Thread(target=_read, daemon=True).start()
+
+        def _gen():
+            while True:
+                try:
+                    item = chunk_q.get(timeout=_POLL)
+                except Empty:
+                    if self._cancel.is_set():
+                        return
+                    continue
+                if item is None:
+                    return
+                if isinstance(item, tuple) and item and item[0] == "__ERR__":
+                    raise item[1]
+                yield item
+        return "stream", _gen()
+
+    def _producer(self):
+        try:
+            fetch = tracing.wrap(self._fetch)
+            with ThreadPoolExecutor(max_workers=self.prefetch_workers) as pool:
+                pending = iter(self.entries)
+                window: deque = deque()
+
+                def fill():
+                    while len(window) < self.prefetch_queue and not self._cancel.is_set():
+                        entry = next(pending, None)
+                        if entry is None:
+                            return
+                        small = entry.size is not None and entry.size <= self.small_file_bytes
+                        window.append((entry, pool.submit(fetch, entry.key, False) if small else None))
+
+                fill()
+                while window:
+                    entry, fut = window.popleft()
+                    kind, payload = fut.result() if fut is not None else ("open", None)
+                    if not self._put(self._q, (entry, kind, payload)):
+                        for _, f in window:
+                            if f is not None:
+                                f.cancel()
+                        return
+                    fill()
+        except Exception as ex:
+            self._error = ex
+        finally:
+            self._put(self._q, _SENTINEL)
+
+    # ---- Consumer ----
+
+    @staticmethod
+    def _crc_checked(arcname: str, expected: int, chunks):
+        crc = 0
+        for chunk in chunks:
+            crc = zlib.crc32(chunk, crc)
+            yield chunk
+        if crc != expected:
+            raise IOError(f"CRC32 van '{arcname}' klopt niet met de upload")
+
+    def __iter__(self):
+        z = ZipStream()
+        threading.Thread(target=tracing.wrap(self._producer), daemon=True).start()
+        try:
+            while True:
+                item = self._q.get()
+                if item is _SENTINEL:
+                    if self._error is not None:
+                        raise self._error
+                    break
+                entry, kind, payload = item
+                if kind == "open":
+                    # Groot of onbekend: nu pas openen, nu hij aan de beurt is.
+                    kind, payload = self._fetch(entry.key, stream=True)
+                expected = entry.crc32 if self.verify_crc else None
+                if expected is not None:
+                    if kind == "bytes":
+                        if zlib.crc32(payload) != expected:
+                            raise IOError(f"CRC32 van '{entry.arcname}' klopt niet met de upload")
+                    else:
+                        payload = self._crc_checked(entry.arcname, expected, payload)
+                z.add(payload, entry.arcname)
+                yield from z.all_files()
+            yield from z.finalize()
+        finally:
+            self._cancel.set()
+
+
+class AsyncZipPipeline:
+    def __init__(self, source, entries, *, prefetch_workers: int = 8, prefetch_queue: int = 16,
+                 small_file_bytes: int = 8 * 1024 * 1024, chunk_bytes: int = 1024 * 1024,
+                 verify_crc: bool = True):
+        self.source = source
+        self.entries = list(entries)
+        self.prefetch_workers = max(1, prefetch_workers)
+        self.prefetch_queue = max(1, prefetch_queue)
+        self.small_file_bytes = small_file_bytes
+        self.chunk_bytes = chunk_bytes
+        self.verify_crc = verify_crc
+
+    async def _fetch(self, sem: asyncio.Semaphore, key: str):
+        """Klein bestand vooruit ophalen. None als het toch groot blijkt."""
+        async with sem:
+            length, body = await self.source.open(key)
+            try:
+                if length is None or length > self.small_file_bytes:
+                    return None  # groter dan gedacht: open() opnieuw als hij aan de beurt is
+                return await body.read()
+            finally:
+                body.close()
+
+    async def _stream_entry(self, z: ZipStream, entry: ZipEntry, body, expected: int | None):
+        """
+        Groot bestand door de zipstream. ZipStream is synchroon en trekt zelf
+        aan zijn bron; in stored-modus leest hij precies één chunk per chunk
+        die hij teruggeeft. We voeren daarom telkens één chunk in de feed en
+        halen die er als zip-bytes weer uit, zonder ooit te blokkeren.
+        """
+        feed: deque = deque()
+
+        def data():
+            while True:
+                chunk = feed.popleft()
+                if chunk is None:
+                    return
+                yield chunk
+
+        z.add(data(), entry.arcname)
+        out = z.all_files()
+        try:
+            crc = 0
+            async for chunk in body.iter_chunks(self.chunk_bytes):
+                if not chunk:
+                    continue
+                crc = zlib.crc32(chunk, crc)
+                feed.append(chunk)
+                while feed:  # eerst de local header, dan de chunk zelf
+                    yield next(out)
+            if expected is not None and crc != expected:
+                raise IOError(f"CRC32 van '{entry.arcname}' klopt niet met de upload")
+            feed.append(None)
+            for x in out:  # data-descriptor
+                yield x
+        finally:
+            out.close()
+
+    async def _run(self):
+        z = ZipStream()
+        sem = asyncio.Semaphore(self.prefetch_workers)
+        pending = iter(self.entries)
+        window: deque = deque()
+
+        def fill():
+            while len(window) < self.prefetch_queue:
+                entry = next(pending, None)
+                if entry is None:
+                    return
+                small = entry.size is not None and entry.size <= self.small_file_bytes
+                window.append((entry, asyncio.ensure_future(self._fetch(sem, entry.key)) if small else None))
+
+        try:
+            fill()
+            while window:
+                entry, task = window[0]
+                data = await task if task is not None else None
+                window.popleft()
+                fill()
+                expected = entry.crc32 if self.verify_crc else None
+                if data is None:
+                    length, body = await self.source.open(entry.key)
+                    try:
+                        if length is not None and length <= self.small_file_bytes:
+                            data = await body.read()
+                        else:
+                            async for x in self._stream_entry(z, entry, body, expected):
+                                yield x
+                            continue
+                    finally:
+                        body.close()
+                if expected is not None and zlib.crc32(data) != expected:
+                    raise IOError(f"CRC32 van '{entry.arcname}' klopt niet met de upload")
+                z.add(data, entry.arcname)
+                for x in z.all_files():
+                    yield x
+            for x in z.finalize():
+                yield x
+        finally:
+            # Afgebroken (fout, client weg, aclose()): lopende fetches stoppen.
+            # Vooruit opgehaalde bodies zijn al dicht.
+            for _, task in window:
+                if task is not None:
+                    task.cancel()
+
+    def __aiter__(self):
+        return self._run()